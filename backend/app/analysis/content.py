@@ -1,8 +1,19 @@
 # content.py
 # GPT-/KI-Analyse 
+import asyncio
+import json
+import re
 import httpx
-from app.core.config import OPENROUTER_API_KEY, logger
-from typing import Optional, Dict, Any
+from app.core.config import (
+    OPENROUTER_API_KEY, OPENROUTER_MODEL, LLM_BATCH_MAX_EMAILS, LLM_BATCH_TOKEN_BUDGET, LLM_BATCH_WAIT_MS,
+    LLM_BATCH_MAX_OUTPUT_TOKENS, LLM_CONTEXT_TOKENS, LLM_CONTEXT_TOKENS_BY_MODEL, logger
+)
+from app.core.http import request_with_retry
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+# Bei jeder inhaltlichen Änderung an PROMPT oder build_context erhöhen:
+# gecachte KI-Bewertungen älterer Versionen werden dann verworfen.
+PROMPT_VERSION = "2"
 
 PROMPT = (
     "Du bist ein E-Mail-Sicherheitsanalyst. Analysiere die folgende E-Mail und gib eine Bewertung zurück, ob es sich um Phishing, Spam oder eine legitime Mail handelt. "
@@ -10,61 +21,287 @@ PROMPT = (
     "Gib die wichtigsten Gründe für deine Einschätzung an. Gib die Ausgabe in JSON zurück: {\"bewertung\": \"Phishing\" | \"Spam\" | \"Legitim\", \"risikostufe\": \"hoch\" | \"mittel\" | \"niedrig\", \"score\": 0–100, \"gruende\": [ ... ]}"
 )
 
-def build_context(email_text: str, headers: Optional[Dict[str, Any]] = None, links: Optional[Any] = None) -> str:
+# Zusatz für Sammelanfragen: eine Bewertung je E-Mail, zugeordnet über die Nummer
+BATCH_PROMPT = (
+    " Du erhältst mehrere E-Mails, jeweils eingeleitet durch \"### E-Mail <Nummer>\". Bewerte jede E-Mail einzeln "
+    "und gib ausschließlich ein JSON-Objekt zurück: {\"ergebnisse\": [{\"id\": <Nummer>, \"bewertung\": ..., "
+    "\"risikostufe\": ..., \"score\": ..., \"gruende\": [ ... ]}, ...]} mit genau einem Eintrag pro E-Mail."
+)
+
+# Antwortlänge je bewerteter E-Mail
+VERDICT_MAX_TOKENS = 512
+# So viele Bewertungen passen in eine Sammelantwort mit LLM_BATCH_MAX_OUTPUT_TOKENS
+BATCH_MAX_VERDICTS = max(1, LLM_BATCH_MAX_OUTPUT_TOKENS // VERDICT_MAX_TOKENS)
+
+_WHITESPACE_RE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+# Header-Felder, die für die Bewertung relevant sind (Reihenfolge = Reihenfolge im Kontext)
+CONTEXT_HEADER_FIELDS = (
+    "from_domain", "from_lookalike", "from_domain_listed", "spf", "dkim", "dmarc", "reply_path_warning",
+    "attachments", "dangerous_attachments", "encrypted_attachments", "recipient_warning",
+    "header_anomalies", "tracking_pixels",
+)
+# Anteil des Budgets, den Links höchstens belegen; der Rest bleibt für den Text
+LINKS_BUDGET_SHARE = 0.25
+# Bei gekürztem Text: Anteil des Textbudgets für den Anfang (der Rest für das Ende)
+BODY_HEAD_SHARE = 0.7
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Grobe Token-Schätzung (ca. 4 Zeichen pro Token), ausreichend für Budgets."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def context_budget(model: str = OPENROUTER_MODEL) -> int:
+    """Token-Budget des Kontexts für ein Modell (LLM_CONTEXT_TOKENS_BY_MODEL, sonst LLM_CONTEXT_TOKENS)."""
+    return LLM_CONTEXT_TOKENS_BY_MODEL.get(model, LLM_CONTEXT_TOKENS)
+
+def _header_summary(headers: Dict[str, Any]) -> str:
+    """Relevante Header-Felder als kompaktes JSON; leere Felder entfallen."""
+    relevant = {field: headers[field] for field in CONTEXT_HEADER_FIELDS if headers.get(field) not in (None, "", [])}
+    return json.dumps(relevant, ensure_ascii=False, separators=(",", ":"))
+
+def _link_lines(links: Any, budget_chars: int) -> List[str]:
+    """Eindeutige Links, auffälligste zuerst, eine Zeile je Link, bis das Zeichenbudget erreicht ist."""
+    seen = set()
+    entries = []
+    for link in links:
+        url = link.get("url", "") if isinstance(link, dict) else str(link)
+        if url and url not in seen:
+            seen.add(url)
+            entries.append(link if isinstance(link, dict) else {"url": url})
+    entries.sort(key=lambda link: -link.get("risk_score", 0))
+    lines: List[str] = []
+    used = 0
+    for link in entries:
+        notes = [f"Risiko {link['risk_score']}"] if link.get("risk_score") else []
+        if link.get("lookalike"):
+            notes.append(link["lookalike"])
+        if link.get("listed"):
+            notes.append(link["listed"])
+        line = f"- {link['url']}" + (f" ({'; '.join(notes)})" if notes else "")
+        if used + len(line) > budget_chars:
+            lines.append(f"- ... {len(entries) - len(lines)} weitere Links")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return lines
+
+def _truncate_body(text: str, budget_chars: int) -> str:
+    """Kürzt den Text auf Anfang und Ende, wo Anrede/Aufforderung bzw. Signatur/Footer stehen."""
+    if len(text) <= budget_chars:
+        return text
+    # Platz für den Kürzungshinweis freihalten, damit das Budget eingehalten wird
+    budget_chars = max(0, budget_chars - 40)
+    head = int(budget_chars * BODY_HEAD_SHARE)
+    tail = budget_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n[... {omitted} Zeichen gekürzt ...]\n{text[len(text) - tail:] if tail else ''}"
+
+def build_context(email_text: str, headers: Optional[Dict[str, Any]] = None, links: Optional[Any] = None,
+                  max_tokens: Optional[int] = None) -> str:
     """
-    Baut den Kontext für die KI-Analyse zusammen.
+    Baut den Kontext für die KI-Analyse innerhalb eines Token-Budgets (Standard: context_budget()):
+    relevante Header als kompaktes JSON, deduplizierte Links (auffälligste zuerst, höchstens ein
+    Viertel des Budgets) und der Text mit normalisierten Leerzeichen, bei Bedarf auf Anfang und
+    Ende gekürzt.
     """
-    context = email_text
+    budget_chars = (max_tokens or context_budget()) * CHARS_PER_TOKEN
+    parts = []
     if headers:
-        context += f"\n\nHeader-Infos: {headers}"
+        parts.append(f"Header: {_header_summary(headers)}")
     if links:
-        context += f"\n\nLinks: {links}"
-    return context
+        link_lines = _link_lines(links, int(budget_chars * LINKS_BUDGET_SHARE))
+        parts.append("Links:\n" + "\n".join(link_lines))
+    used = sum(len(part) + 2 for part in parts) + len("Text:\n")
+    body = _WHITESPACE_RE.sub(" ", _BLANK_LINES_RE.sub("\n\n", email_text or "")).strip()
+    parts.append("Text:\n" + _truncate_body(body, max(0, budget_chars - used)))
+    return "\n\n".join(parts)
 
-async def analyze_email_content(email_text: str, headers: Optional[Dict[str, Any]] = None, links: Optional[Any] = None) -> str:
+def _error_verdict(reason: str) -> str:
+    """Fallback-Bewertung (als JSON-Text) wenn die KI-Analyse nicht verfügbar ist."""
+    return json.dumps({"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": [reason]},
+                      ensure_ascii=False)
+
+async def _chat_completion(messages: List[Dict[str, str]], max_tokens: int) -> Tuple[Optional[str], Optional[str]]:
     """
-    Sendet den E-Mail-Text (inkl. Header- und Linkdaten) an das OpenRouter-GPT-Modell und gibt die Antwort zurück.
+    Sendet eine Chat-Completion an OpenRouter.
+    Gibt (Antworttext, None) oder bei Fehlern (None, Fallback-Bewertung als JSON-Text) zurück.
     """
     headers_ = {"Authorization": f"Bearer {OPENROUTER_API_KEY}"}
     payload = {
-        "model": "openai/gpt-3.5-turbo",  # oder ein anderes Modell
-        "messages": [
-            {"role": "system", "content": PROMPT},
-            {"role": "user", "content": build_context(email_text, headers, links)},
-        ],
-        "max_tokens": 512,
+        "model": OPENROUTER_MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens,
         "temperature": 0.2,
     }
     try:
-        async with httpx.AsyncClient(base_url="https://openrouter.ai/api/v1/") as client:
-            response = await client.post("chat/completions", json=payload, headers=headers_, timeout=30)
-            
-            # Spezielle Behandlung für verschiedene HTTP-Status-Codes
-            if response.status_code == 401:
-                logger.error("OpenRouter API-Key ist ungültig oder fehlt. Bitte überprüfen Sie die Konfiguration.")
-                return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: API-Key ungültig"]}'
-            elif response.status_code == 403:
-                logger.error("OpenRouter API-Zugriff verweigert. Möglicherweise fehlende Berechtigungen oder ungültiger API-Key.")
-                return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: Zugriff verweigert"]}'
-            elif response.status_code == 429:
-                logger.error("OpenRouter API Rate Limit erreicht. Zu viele Anfragen.")
-                return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: Rate Limit erreicht"]}'
-            elif response.status_code >= 500:
-                logger.error("OpenRouter API Server-Fehler: %s", response.status_code)
-                return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: Server-Fehler"]}'
-            
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            logger.info("KI-Analyse erfolgreich durchgeführt.")
-            return content
-            
+        # Gemeinsamer Client mit Keep-Alive; 429/5xx werden dort mit Backoff wiederholt
+        response = await request_with_retry("POST", "chat/completions", json=payload, headers=headers_, timeout=30)
+        
+        # Spezielle Behandlung für verschiedene HTTP-Status-Codes
+        if response.status_code == 401:
+            logger.error("OpenRouter API-Key ist ungültig oder fehlt. Bitte überprüfen Sie die Konfiguration.")
+            return None, _error_verdict("KI-Analyse nicht verfügbar: API-Key ungültig")
+        elif response.status_code == 403:
+            logger.error("OpenRouter API-Zugriff verweigert. Möglicherweise fehlende Berechtigungen oder ungültiger API-Key.")
+            return None, _error_verdict("KI-Analyse nicht verfügbar: Zugriff verweigert")
+        elif response.status_code == 429:
+            logger.error("OpenRouter API Rate Limit erreicht. Zu viele Anfragen.")
+            return None, _error_verdict("KI-Analyse nicht verfügbar: Rate Limit erreicht")
+        elif response.status_code >= 500:
+            logger.error("OpenRouter API Server-Fehler: %s", response.status_code)
+            return None, _error_verdict("KI-Analyse nicht verfügbar: Server-Fehler")
+        
+        response.raise_for_status()
+        result = response.json()
+        return result["choices"][0]["message"]["content"], None
+        
     except httpx.TimeoutException:
         logger.error("OpenRouter API Timeout - Anfrage dauerte zu lange.")
-        return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: Timeout"]}'
+        return None, _error_verdict("KI-Analyse nicht verfügbar: Timeout")
     except httpx.ConnectError:
         logger.error("OpenRouter API Verbindungsfehler - Netzwerk nicht erreichbar.")
-        return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse nicht verfügbar: Netzwerk-Fehler"]}'
+        return None, _error_verdict("KI-Analyse nicht verfügbar: Netzwerk-Fehler")
     except Exception as e:
         logger.error("Unerwarteter Fehler bei der KI-Analyse: %s", e)
-        return '{"bewertung": "unbekannt", "risikostufe": "mittel", "score": 50, "gruende": ["KI-Analyse fehlgeschlagen: Unerwarteter Fehler"]}' 
\ No newline at end of file
+        return None, _error_verdict("KI-Analyse fehlgeschlagen: Unerwarteter Fehler")
+
+async def analyze_context(context: str) -> str:
+    """Bewertet eine einzelne E-Mail anhand ihres fertigen Kontexts (siehe build_context)."""
+    content, error = await _chat_completion(
+        [{"role": "system", "content": PROMPT}, {"role": "user", "content": context}],
+        max_tokens=VERDICT_MAX_TOKENS,
+    )
+    if content is None:
+        return error
+    logger.info("KI-Analyse erfolgreich durchgeführt.")
+    return content
+
+async def analyze_email_content(email_text: str, headers: Optional[Dict[str, Any]] = None, links: Optional[Any] = None) -> str:
+    """
+    Sendet den E-Mail-Text (inkl. Header- und Linkdaten) an das OpenRouter-GPT-Modell und gibt die Antwort zurück.
+    """
+    return await analyze_context(build_context(email_text, headers, links))
+
+def _parse_batch_response(content: str, count: int) -> List[Optional[str]]:
+    """
+    Ordnet die Bewertungen einer Sammelantwort über ihre "id" den E-Mails zu.
+    Fehlende oder unvollständige Bewertungen ergeben None.
+    """
+    text = content.strip()
+    if text.startswith("```"):
+        # Antwort in einem Markdown-Codeblock
+        text = text.strip("`").split("\n", 1)[-1]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [None] * count
+    items = data.get("ergebnisse") if isinstance(data, dict) else data
+    results: List[Optional[str]] = [None] * count
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or "bewertung" not in item or "score" not in item:
+            continue
+        try:
+            index = int(item.pop("id")) - 1
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < count:
+            results[index] = json.dumps(item, ensure_ascii=False)
+    return results
+
+async def analyze_email_batch(contexts: List[str]) -> List[Optional[str]]:
+    """
+    Bewertet mehrere E-Mails mit einer einzigen Anfrage (System-Prompt nur einmal).
+    Gibt je E-Mail den Bewertungs-JSON-Text zurück; None, wenn die Antwort für diese E-Mail
+    nicht verwertbar war (der Aufrufer fragt sie dann einzeln an). Bei HTTP-/Netzwerkfehlern
+    erhalten alle E-Mails die Fallback-Bewertung, statt die Last durch Einzelanfragen zu vervielfachen.
+    Mehr E-Mails, als in LLM_BATCH_MAX_OUTPUT_TOKENS passen, werden auf mehrere Anfragen verteilt.
+    """
+    if len(contexts) > BATCH_MAX_VERDICTS:
+        parts = await asyncio.gather(*(
+            analyze_email_batch(contexts[i:i + BATCH_MAX_VERDICTS])
+            for i in range(0, len(contexts), BATCH_MAX_VERDICTS)
+        ))
+        return [result for part in parts for result in part]
+    user = "\n\n".join(f"### E-Mail {i}\n{context}" for i, context in enumerate(contexts, start=1))
+    content, error = await _chat_completion(
+        [{"role": "system", "content": PROMPT + BATCH_PROMPT}, {"role": "user", "content": user}],
+        max_tokens=min(VERDICT_MAX_TOKENS * len(contexts), LLM_BATCH_MAX_OUTPUT_TOKENS),
+    )
+    if content is None:
+        return [error] * len(contexts)
+    results = _parse_batch_response(content, len(contexts))
+    logger.info("KI-Sammelanalyse: %d von %d Bewertungen verwertbar.", sum(r is not None for r in results), len(contexts))
+    return results
+
+
+class VerdictBatcher:
+    """
+    Sammelt gleichzeitig anstehende KI-Bewertungen und schickt sie gebündelt in einer Anfrage:
+    höchstens LLM_BATCH_MAX_EMAILS E-Mails bzw. LLM_BATCH_TOKEN_BUDGET Token je Anfrage, und
+    eine E-Mail wartet höchstens LLM_BATCH_WAIT_MS auf weitere. Mit LLM_BATCH_MAX_EMAILS <= 1
+    geht jede E-Mail wie bisher einzeln an die KI. Die Sammelgröße ist zusätzlich durch
+    BATCH_MAX_VERDICTS (Antwortlänge) und ANALYSIS_CONCURRENCY (gleichzeitige Analysen) begrenzt.
+    """
+
+    def __init__(self, max_emails: int = LLM_BATCH_MAX_EMAILS, token_budget: int = LLM_BATCH_TOKEN_BUDGET,
+                 wait_ms: int = LLM_BATCH_WAIT_MS):
+        self.max_emails = min(max_emails, BATCH_MAX_VERDICTS)
+        self.token_budget = token_budget
+        self.wait = wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, context: str) -> str:
+        """Bewertet eine E-Mail (Kontext aus build_context) und gibt den Bewertungs-JSON-Text zurück."""
+        tokens = estimate_tokens(context)
+        if self.max_emails <= 1 or tokens >= self.token_budget:
+            return await analyze_context(context)
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((context, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_emails:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            if len(batch) == 1:
+                results: List[Optional[str]] = [await analyze_context(batch[0][0])]
+            else:
+                results = await analyze_email_batch([context for context, _ in batch])
+            # Nicht verwertbare Einzelergebnisse einzeln nachfragen
+            retry = [i for i, result in enumerate(results) if result is None]
+            if retry:
+                logger.warning("%d Bewertungen der Sammelanfrage werden einzeln angefragt.", len(retry))
+                singles = await asyncio.gather(*(analyze_context(batch[i][0]) for i in retry))
+                for i, result in zip(retry, singles):
+                    results[i] = result
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+# Globale Instanz für alle KI-Bewertungen
+verdict_batcher = VerdictBatcher()
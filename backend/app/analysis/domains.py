@@ -0,0 +1,83 @@
+# domains.py
+# Gemeinsame Domain-Bewertung (Lookalike, Block-/Allowlist, Struktur) für Absender und Links
+from functools import lru_cache
+from typing import NamedTuple, Set
+from app.analysis.lookalike import LookalikeIndex, lookalike_index
+from app.core.config import DOMAIN_ALLOWLIST_FILE, DOMAIN_BLOCKLIST_FILE, DOMAIN_CACHE_SIZE, logger
+
+
+class DomainVerdict(NamedTuple):
+    domain: str
+    is_punycode: bool
+    # Begründung der Lookalike-Erkennung, "" wenn unauffällig
+    lookalike: str
+    # Art des Lookalike-Treffers (siehe lookalike.py, KIND_*), "" wenn unauffällig
+    lookalike_kind: str
+    # "blocklist", "allowlist" oder ""
+    listed: str
+    # 0-100, nur aus der Domain abgeleitet
+    risk_score: int
+    # 0-100, wie risk_score, aber ohne den Lookalike-Befund (für eingebettete Ressourcen)
+    structural_score: int
+
+
+def load_domain_list(path: str) -> Set[str]:
+    """Lädt eine Domainliste (eine Domain pro Zeile, # = Kommentar); ohne Pfad eine leere Menge."""
+    if not path:
+        return set()
+    with open(path, encoding="utf-8") as f:
+        domains = {line.split("#", 1)[0].strip().lower().rstrip(".") for line in f} - {""}
+    logger.info("%d Domains aus %s geladen.", len(domains), path)
+    return domains
+
+
+def _listed(domain: str, entries: Set[str]) -> bool:
+    """Die Domain oder eine ihrer übergeordneten Domains steht in der Liste."""
+    labels = domain.split(".")
+    return any(".".join(labels[i:]) in entries for i in range(len(labels)))
+
+
+class DomainIntel:
+    """
+    Bewertet Domains einheitlich für Absender und Links. Das Ergebnis hängt nur von der
+    Domain ab und wird je Prozess memoisiert (LRU): Domains wiederholen sich innerhalb
+    einer Mail und über einen ganzen Batch stark, jede wird nur einmal bewertet.
+    """
+
+    def __init__(self, lookalikes: LookalikeIndex, allowlist: Set[str], blocklist: Set[str],
+                 cache_size: int = DOMAIN_CACHE_SIZE):
+        self.lookalikes = lookalikes
+        self.allowlist = allowlist
+        self.blocklist = blocklist
+        self.verdict = lru_cache(maxsize=max(1, cache_size))(self._evaluate)
+
+    def _evaluate(self, domain: str) -> DomainVerdict:
+        domain = (domain or "").strip().lower().rstrip(".")
+        is_punycode = any(label.startswith("xn--") for label in domain.split("."))
+        if domain and _listed(domain, self.blocklist):
+            return DomainVerdict(domain, is_punycode, "", "", "blocklist", 100, 100)
+        if domain and _listed(domain, self.allowlist):
+            return DomainVerdict(domain, is_punycode, "", "", "allowlist", 0, 0)
+
+        kind, reason = self.lookalikes.classify(domain)
+        risk_score = 0
+        if is_punycode:
+            risk_score += 50
+        if not domain:
+            risk_score += 30
+        if len(domain) > 50:  # Sehr lange Domains sind verdächtig
+            risk_score += 20
+        if domain.count('.') > 3:  # Viele Subdomains
+            risk_score += 15
+        structural_score = min(100, risk_score)
+        if kind:
+            risk_score += 60
+        return DomainVerdict(domain, is_punycode, reason, kind, "", min(100, risk_score), structural_score)
+
+
+# Globale Instanz über den Lookalike-Index und die optionalen Block-/Allowlists
+domain_intel = DomainIntel(
+    lookalike_index,
+    allowlist=load_domain_list(DOMAIN_ALLOWLIST_FILE),
+    blocklist=load_domain_list(DOMAIN_BLOCKLIST_FILE),
+)
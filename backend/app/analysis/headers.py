@@ -5,6 +5,8 @@ import re
 from email.utils import parsedate_to_datetime
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Tuple
+from app.analysis.domains import domain_intel
+from app.analysis.parsed import ParsedMessage
 from app.core.config import DANGEROUS_EXTENSIONS, MAX_RECIPIENTS, HEADER_ANOMALY_DAYS, logger
 
 def extract_domain(email_addr: str) -> str:
@@ -17,33 +19,19 @@ def extract_addr(addr: str) -> str:
     match = re.search(r'<?([\w\.-]+@[\w\.-]+)>?', addr or "")
     return match.group(1).lower() if match else (addr or "").lower()
 
-KNOWN_BRANDS = [
-    "paypal.com", "amazon.de", "amazon.com", "sparkasse.de", "postbank.de", "deutsche-bank.de",
-    "apple.com", "microsoft.com", "google.com", "dhl.de", "ups.com", "t-online.de"
-]
-
-def is_lookalike(domain: str) -> Tuple[bool, str]:
-    for brand in KNOWN_BRANDS:
-        if domain.startswith("xn--"):
-            return True, f"Punycode-Domain: {domain}"
-        if brand.replace('.', '') in domain.replace('.', '') and domain != brand:
-            return True, f"Lookalike zu {brand}: {domain}"
-    return False, ""
-
-def analyze_attachments(msg) -> Dict[str, List[str]]:
+def analyze_attachments(msg: ParsedMessage) -> Dict[str, List[str]]:
     """Analysiert Anhänge auf gefährliche und verschlüsselte Dateien."""
     attachments = []
     dangerous = []
     encrypted = []
-    for part in msg.walk():
-        if part.get_content_disposition() == 'attachment':
-            filename = part.get_filename() or ""
-            attachments.append(filename)
-            ext = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
-            if ext in DANGEROUS_EXTENSIONS:
-                dangerous.append(filename)
-            if 'encrypted' in filename.lower() or 'passwort' in filename.lower() or 'password' in filename.lower():
-                encrypted.append(filename)
+    for attachment in msg.attachments:
+        filename = attachment.filename
+        attachments.append(filename)
+        ext = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
+        if ext in DANGEROUS_EXTENSIONS:
+            dangerous.append(filename)
+        if 'encrypted' in filename.lower() or 'passwort' in filename.lower() or 'password' in filename.lower():
+            encrypted.append(filename)
     return {
         "attachments": attachments,
         "dangerous_attachments": dangerous,
@@ -55,7 +43,7 @@ def count_addresses(header_val: str) -> int:
         return 0
     return len([addr for addr in re.split(r',|;', header_val) if '@' in addr])
 
-def analyze_headers(msg) -> Dict[str, Any]:
+def analyze_headers(msg: ParsedMessage) -> Dict[str, Any]:
     """
     Führt alle Header-basierten Analysen durch und gibt ein dict mit den Ergebnissen zurück.
     """
@@ -81,9 +69,11 @@ def analyze_headers(msg) -> Dict[str, Any]:
         # Absender-Domain-Check
         from_addr = msg.get("from", "")
         domain = extract_domain(from_addr)
-        lookalike, reason = is_lookalike(domain)
+        verdict = domain_intel.verdict(domain)
         results["from_domain"] = domain
-        results["from_lookalike"] = reason if lookalike else "ok"
+        results["from_lookalike"] = verdict.lookalike or "ok"
+        results["from_lookalike_kind"] = verdict.lookalike_kind
+        results["from_domain_listed"] = verdict.listed
         # Reply-To/Return-Path-Check
         reply_to = msg.get("reply-to", "")
         return_path = msg.get("return-path", "")
@@ -143,15 +133,13 @@ def analyze_headers(msg) -> Dict[str, Any]:
         logger.error("Fehler bei der Header-Analyse: %s", e)
     return results
 
-def analyze_external_images(msg) -> Tuple[List[str], List[str]]:
+def analyze_external_images(msg: ParsedMessage) -> Tuple[List[str], List[str]]:
     external_images = []
     tracking_pixels = []
-    for part in msg.walk():
-        if part.get_content_type() == 'text/html':
-            html = part.get_payload(decode=True).decode(errors="ignore")
-            for match in re.findall(r'<img[^>]+src=["\\\']([^"\\\']+)["\\\']', html, re.IGNORECASE):
-                if match.startswith('http'):
-                    external_images.append(match)
-            for match in re.findall(r'<img[^>]+width=["\\\']1["\\\'][^>]+height=["\\\']1["\\\'][^>]*src=["\\\']([^"\\\']+)["\\\']', html, re.IGNORECASE):
-                tracking_pixels.append(match)
+    for html in msg.html_parts:
+        for match in re.findall(r'<img[^>]+src=["\\\']([^"\\\']+)["\\\']', html, re.IGNORECASE):
+            if match.startswith('http'):
+                external_images.append(match)
+        for match in re.findall(r'<img[^>]+width=["\\\']1["\\\'][^>]+height=["\\\']1["\\\'][^>]*src=["\\\']([^"\\\']+)["\\\']', html, re.IGNORECASE):
+            tracking_pixels.append(match)
     return external_images, tracking_pixels 
\ No newline at end of file
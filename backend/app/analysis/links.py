@@ -1,48 +1,142 @@
+import html
 import re
-from urllib.parse import urlparse
-from typing import List, Dict
-from app.core.config import logger
+from urllib.parse import urlparse, urlsplit, urlunsplit
+from typing import AbstractSet, Iterable, Iterator, List, Dict, Set, Tuple
+from app.analysis.domains import domain_intel
+from app.core.config import MAX_LINKS_PER_MESSAGE, MAX_URL_LENGTH, logger
 
-def extract_links(email_text: str) -> List[str]:
+# Vorkompilierte Muster mit festem Literal am Anfang ("//" bzw. "www."): der Regex-Engine
+# sucht Kandidaten so per schneller Literalsuche statt an jeder Textposition; ohne
+# verschachtelte Quantoren und mit begrenzter URL-Länge bleibt die Laufzeit linear.
+_SLASHES_RE = re.compile(r"""//[^\s"'<>]{1,%d}""" % MAX_URL_LENGTH)
+_WWW_RE = re.compile(r"""www\.[^\s"'<>]{1,%d}""" % MAX_URL_LENGTH)
+# Satzzeichen am Ende gehören im Fließtext meist nicht zur URL
+_TRAILING_PUNCTUATION = ".,;:!?'\")]}>"
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+# Attribute, deren URL der Client selbst lädt (Bilder, Fonts, Skripte) statt sie anzuklicken
+_RESOURCE_ATTR_RE = re.compile(r"""\b(?:src|srcset|background|poster|data)\s*=\s*["']?$""", re.IGNORECASE)
+
+def normalize_url(url: str) -> str:
     """
-    Extrahiert alle URLs aus dem E-Mail-Text.
+    Normalisiert eine URL für Deduplizierung und Analyse: Schema und Host klein, Standard-Port
+    und Fragment entfernt, protokollrelative und www.-URLs mit Schema. Ungültige URLs ergeben "".
     """
-    url_regex = r"https?://[\w\.-/?&=%#]+"
+    url = url.rstrip(_TRAILING_PUNCTUATION)
+    if url.startswith("//"):
+        url = "https:" + url
+    elif url[:4].lower() == "www.":
+        url = "http://" + url
     try:
-        links = re.findall(url_regex, email_text)
-        return links
+        parts = urlsplit(url)
+    except ValueError:
+        return ""
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if not netloc:
+        return ""
+    default_port = _DEFAULT_PORTS.get(scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+def _is_resource(body: str, start: int) -> bool:
+    """Die URL ab `start` ist der Wert eines src-/background-/...-Attributs."""
+    return _RESOURCE_ATTR_RE.search(body[max(0, start - 24):start]) is not None
+
+def _candidates(body: str, from_html: bool) -> Iterator[Tuple[str, bool]]:
+    """
+    URLs mit http(s)-Schema, www.-URLs und (nur in HTML) protokollrelative href/src-Werte,
+    jeweils mit der Angabe, ob es sich um eine eingebettete Ressource handelt.
+    """
+    for match in _SLASHES_RE.finditer(body):
+        start = match.start()
+        before = body[max(0, start - 6):start].lower()
+        if before.endswith("https:"):
+            yield "https:" + match.group(), from_html and _is_resource(body, start - 6)
+        elif before.endswith("http:"):
+            yield "http:" + match.group(), from_html and _is_resource(body, start - 5)
+        elif from_html and before[-1:] in ("=", '"', "'"):
+            yield match.group(), _is_resource(body, start)
+    for match in _WWW_RE.finditer(body):
+        start = match.start()
+        # Nur freistehend, nicht als Teil einer bereits gefundenen URL oder Domain
+        if start == 0 or not (body[start - 1].isalnum() or body[start - 1] in "./-@"):
+            yield match.group(), from_html and _is_resource(body, start)
+
+def _scan(body: str, from_html: bool, seen: Set[str], links: List[str], resources: Set[str]) -> bool:
+    """Sammelt neue Links aus einem Text; False, sobald MAX_LINKS_PER_MESSAGE erreicht ist."""
+    candidates: Set[Tuple[str, bool]] = set()
+    for raw, is_resource in _candidates(body, from_html):
+        # Wiederholte Vorkommen derselben URL (z.B. in Newslettern) nur einmal normalisieren
+        if (raw, is_resource) in candidates:
+            continue
+        candidates.add((raw, is_resource))
+        if from_html and "&" in raw:
+            raw = html.unescape(raw)
+        url = normalize_url(raw)
+        if not url:
+            continue
+        if url in seen:
+            # Auch anklickbar verlinkt: keine reine Ressource
+            if not is_resource:
+                resources.discard(url)
+            continue
+        seen.add(url)
+        links.append(url)
+        if is_resource:
+            resources.add(url)
+        if len(links) >= MAX_LINKS_PER_MESSAGE:
+            return False
+    return True
+
+def extract_link_targets(email_text: str, html_parts: Iterable[str] = ()) -> Tuple[List[str], Set[str]]:
+    """
+    Extrahiert alle URLs aus dem E-Mail-Text und den HTML-Teilen (inkl. href/src-Attributen),
+    normalisiert und dedupliziert, höchstens MAX_LINKS_PER_MESSAGE. Liefert zusätzlich die
+    URLs, die nur als eingebettete Ressource (src, background, ...) vorkommen.
+    """
+    links: List[str] = []
+    seen: Set[str] = set()
+    resources: Set[str] = set()
+    html_parts = list(html_parts)
+    try:
+        # Bei einteiligen HTML-Mails ist der Text das HTML selbst: nur einmal (als HTML) scannen
+        if email_text in html_parts or _scan(email_text, False, seen, links, resources):
+            for body in html_parts:
+                if not _scan(body, True, seen, links, resources):
+                    break
+        if len(links) >= MAX_LINKS_PER_MESSAGE:
+            logger.info("Link-Extraktion nach %d Links abgebrochen.", len(links))
     except Exception as e:
         logger.error("Fehler beim Extrahieren von Links: %s", e)
-        return []
+    return links, resources
+
+def extract_links(email_text: str, html_parts: Iterable[str] = ()) -> List[str]:
+    """Wie extract_link_targets, nur die URLs."""
+    return extract_link_targets(email_text, html_parts)[0]
 
-def analyze_links(links: List[str]) -> List[Dict[str, object]]:
+def analyze_links(links: List[str], resources: AbstractSet[str] = frozenset()) -> List[Dict[str, object]]:
     """
-    Analysiert Links auf Punycode und gibt eine Liste von Link-Infos zurück.
+    Bewertet jeden Link über die Domain-Bewertung (Punycode, Lookalike, Block-/Allowlist,
+    Struktur) und gibt eine Liste von Link-Infos zurück. Für eingebettete Ressourcen
+    (`resources`, z.B. Fonts oder CDN-Bilder) zählt der Lookalike-Befund nicht, da der
+    Empfänger sie nicht anklickt.
     """
     results = []
     for link in links:
         try:
-            parsed = urlparse(link)
-            domain = parsed.hostname or ""
-            is_punycode = domain.startswith('xn--')
-            
-            # Berechne Risk Score basierend auf verschiedenen Faktoren
-            risk_score = 0
-            if is_punycode:
-                risk_score += 50
-            if not domain:
-                risk_score += 30
-            if len(domain) > 50:  # Sehr lange Domains sind verdächtig
-                risk_score += 20
-            if domain.count('.') > 3:  # Viele Subdomains
-                risk_score += 15
-                
+            verdict = domain_intel.verdict(urlparse(link).hostname or "")
+            resource = link in resources
             results.append({
                 "url": link,
-                "domain": domain,
-                "is_punycode": is_punycode,
-                "risk_score": min(100, risk_score)
+                "domain": verdict.domain,
+                "is_punycode": verdict.is_punycode,
+                "lookalike": "" if resource else verdict.lookalike,
+                "lookalike_kind": "" if resource else verdict.lookalike_kind,
+                "listed": verdict.listed,
+                "risk_score": verdict.structural_score if resource else verdict.risk_score,
+                "resource": resource
             })
         except Exception as e:
             logger.warning("Fehler bei der Link-Analyse für %s: %s", link, e)
-    return results 
\ No newline at end of file
+    return results
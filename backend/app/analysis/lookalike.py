@@ -0,0 +1,260 @@
+# lookalike.py
+# Erkennung von Lookalike-Domains geschützter Marken über vorberechnete Indizes
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import BRAND_DOMAINS_FILE, logger
+
+KNOWN_BRANDS = [
+    "paypal.com", "amazon.de", "amazon.com", "sparkasse.de", "postbank.de", "deutsche-bank.de",
+    "apple.com", "microsoft.com", "google.com", "dhl.de", "ups.com", "t-online.de"
+]
+
+# Domains, die den Marken selbst gehören (CDNs, APIs, Login-Dienste, Länderdomains); gelten
+# als legitim, liefern aber keine eigenen Markennamen für die Suche
+BRAND_OWNED_DOMAINS = [
+    "googleapis.com", "gstatic.com", "googleusercontent.com", "googlemail.com", "gmail.com",
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "youtube.com",
+    "amazonaws.com", "cloudfront.net", "media-amazon.com", "ssl-images-amazon.com", "amazon.co.uk",
+    "paypalobjects.com", "paypal.me",
+    "microsoftonline.com", "office.com", "office365.com", "outlook.com", "live.com", "sharepoint.com",
+    "azureedge.net", "msauth.net",
+    "icloud.com", "mzstatic.com", "cdn-apple.com",
+    "dhl.com", "deutschepost.de",
+]
+
+# Kürzere Markennamen (z.B. "dhl") nur als Teil der registrierbaren Domain bzw. als komplette
+# Marken-Domain und ohne Tippfehler-Suche, sonst träfen sie zu viele unbeteiligte Domains
+MIN_TOKEN_LENGTH = 4
+# Tippfehler-Suche nur für Markennamen ab dieser Länge: bei kurzen Namen ist fast jede Variante
+# mit Distanz 1 ein eigenständiges Wort bzw. eine echte Domain ("apply.com", "ample.com" zu "apple")
+MIN_TYPO_LENGTH = 6
+
+# Arten von Treffern; Homoglyph-, Punycode- und Tippfehler-Domains gelten als eindeutig,
+# eingebettete Markennamen ("paypal-login.net") nur als Hinweis
+KIND_HOMOGLYPH = "homoglyph"
+KIND_PUNYCODE = "punycode"
+KIND_TYPO = "typo"
+KIND_EMBEDDED = "embedded"
+HIGH_CONFIDENCE_KINDS = (KIND_HOMOGLYPH, KIND_PUNYCODE, KIND_TYPO)
+
+# Verwechselbare Zeichen -> lateinisches Grundzeichen (Auswahl nach Unicode confusables.txt)
+CONFUSABLES = {
+    # Ziffern
+    "0": "o", "1": "l", "3": "e", "5": "s", "7": "t",
+    # Kyrillisch
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i", "ј": "j", "ԁ": "d",
+    "ӏ": "l", "ԛ": "q", "ԝ": "w", "ь": "b", "һ": "h",
+    # Griechisch
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ω": "w",
+    # Sonstige
+    "ı": "i", "ł": "l", "ø": "o", "ß": "ss",
+}
+# Mehrzeichen-Verwechslungen, angewendet nach der Einzelzeichen-Abbildung
+MULTI_CONFUSABLES = (("rn", "m"), ("vv", "w"))
+
+
+def skeleton(text: str) -> str:
+    """
+    Vergleichsform einer Domain: Kleinschreibung, Diakritika entfernt, verwechselbare
+    Zeichen auf ihr lateinisches Gegenstück abgebildet ("pаypa1" -> "paypal").
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    result = "".join(CONFUSABLES.get(ch, ch) for ch in decomposed if not unicodedata.combining(ch))
+    for source, target in MULTI_CONFUSABLES:
+        result = result.replace(source, target)
+    return result
+
+
+def to_unicode(domain: str) -> str:
+    """Dekodiert Punycode-Labels (xn--) einer Domain; ungültige Labels bleiben unverändert."""
+    labels = []
+    for label in domain.split("."):
+        if label.startswith("xn--"):
+            try:
+                label = label.encode("ascii").decode("idna")
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return ".".join(labels)
+
+
+def registrable_part(domain: str) -> str:
+    """Näherung der registrierbaren Domain ohne Public-Suffix-Liste (z.B. "a.b.co.uk" -> "b.co.uk")."""
+    labels = domain.split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in ("co", "com", "org", "net", "gov", "ac"):
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def osa_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein-Distanz (optimal string alignment), abgebrochen ab `limit` + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class LookalikeIndex:
+    """
+    Vorberechnete Indizes über die geschützten Domains; eine Abfrage kostet nur
+    Hash-Lookups über die Labels der Domain, unabhängig von der Zahl der Marken:
+      - Menge der Domains (und ihrer Subdomains) als legitim, inkl. BRAND_OWNED_DOMAINS,
+      - Skeleton-Tabellen für Homoglyph-/Ziffern-Varianten ("paypa1.com", kyrillisches "а"),
+      - Markennamen als ganze Labels bzw. durch Bindestriche getrennte Teile ("paypal-login.net",
+        "paypal.com.evil.de"), nicht als beliebige Teilzeichenkette ("pineapple.com"),
+      - SymSpell-Löschvarianten für Tippfehler mit Distanz 1 im Namen bei gleicher Endung
+        ("paypall.com", "micorsoft.com"), nur für Markennamen ab MIN_TYPO_LENGTH Zeichen.
+    Der Markenname selbst unter einer anderen Endung ("google.de", "amazon.fr") ist kein Lookalike.
+    """
+
+    def __init__(self, domains: Iterable[str], owned: Iterable[str] = ()):
+        self.domains: Set[str] = set()
+        self._skeletons: Dict[str, str] = {}
+        self._names: Set[str] = set()
+        self._name_skeletons: Dict[str, str] = {}
+        self._deletes: Dict[str, List[str]] = {}
+        self._tokens: Dict[str, str] = {}
+        self._short_tokens: Dict[str, str] = {}
+        self._max_span = 1
+        for domain in domains:
+            domain = domain.strip().lower().rstrip(".")
+            if not domain or domain in self.domains:
+                continue
+            self.domains.add(domain)
+            registrable = registrable_part(domain)
+            reg_skeleton = skeleton(registrable)
+            self._skeletons.setdefault(reg_skeleton, domain)
+            self._names.add(registrable.split(".")[0])
+            name = reg_skeleton.split(".")[0]
+            self._name_skeletons.setdefault(name, domain)
+            self._max_span = max(self._max_span, name.count("-") + 1)
+            if len(name) < MIN_TOKEN_LENGTH:
+                self._short_tokens.setdefault(name, domain)
+                continue
+            self._tokens.setdefault(name, domain)
+            if "-" in name:
+                self._tokens.setdefault(name.replace("-", ""), domain)
+            if len(name) < MIN_TYPO_LENGTH:
+                continue
+            for variant in self._delete_variants(reg_skeleton):
+                self._deletes.setdefault(variant, []).append(reg_skeleton)
+        self.domains.update(domain.strip().lower().rstrip(".") for domain in owned)
+
+    @staticmethod
+    def _delete_variants(text: str) -> Set[str]:
+        return {text} | {text[:i] + text[i + 1:] for i in range(len(text))}
+
+    @classmethod
+    def from_file(cls, path: str) -> "LookalikeIndex":
+        """Lädt die Domains aus einer Datei (eine pro Zeile); ohne Pfad die eingebaute Liste."""
+        if not path:
+            return cls(KNOWN_BRANDS, BRAND_OWNED_DOMAINS)
+        with open(path, encoding="utf-8") as f:
+            index = cls((line.split("#", 1)[0] for line in f), BRAND_OWNED_DOMAINS)
+        logger.info("Lookalike-Index mit %d geschützten Domains aus %s geladen.", len(index.domains), path)
+        return index
+
+    def is_protected(self, domain: str) -> bool:
+        """Die Domain ist selbst geschützt oder eine Subdomain einer geschützten Domain."""
+        labels = domain.split(".")
+        return any(".".join(labels[i:]) in self.domains for i in range(len(labels) - 1))
+
+    def _typo_of(self, reg_skeleton: str) -> Optional[str]:
+        candidates: Set[str] = set()
+        for variant in self._delete_variants(reg_skeleton):
+            candidates.update(self._deletes.get(variant, ()))
+        suffix = reg_skeleton.partition(".")[2]
+        for candidate in sorted(candidates):
+            # Nur Abweichungen im Namen, nicht in der Endung ("paypal.co" ist keine Tippfehler-Domain)
+            if candidate == reg_skeleton or candidate.partition(".")[2] != suffix:
+                continue
+            if osa_distance(reg_skeleton, candidate, 1) <= 1:
+                return self._skeletons[candidate]
+        return None
+
+    def _token_of(self, label: str, short: bool) -> Optional[str]:
+        """Marke, deren Name das Label ganz oder als Folge bindestrich-getrennter Teile enthält."""
+        parts = label.split("-")
+        for width in range(1, min(self._max_span, len(parts)) + 1):
+            for i in range(len(parts) - width + 1):
+                span = parts[i:i + width]
+                for token in {"-".join(span), "".join(span)}:
+                    if token in self._tokens:
+                        return self._tokens[token]
+                    if short and token in self._short_tokens:
+                        return self._short_tokens[token]
+        return None
+
+    def _embedded_brand(self, labels: List[str], reg_labels: int) -> Optional[str]:
+        # Registrierbarer Name mit Marke als Teil ("paypal-login.net", "dhl-paket.de")
+        brand = self._token_of(labels[-reg_labels], short=True)
+        if brand is not None:
+            return brand
+        subdomain = labels[:-reg_labels]
+        for i in range(len(subdomain)):
+            # Komplette Marken-Domain als Subdomain ("paypal.com.evil.de", "ups.com.example.net")
+            for width in (2, 3):
+                if i + width <= len(subdomain) and ".".join(subdomain[i:i + width]) in self._skeletons:
+                    return self._skeletons[".".join(subdomain[i:i + width])]
+            # Längere Markennamen auch als Subdomain-Label ("paypal-secure.evil.de")
+            brand = self._token_of(subdomain[i], short=False)
+            if brand is not None:
+                return brand
+        return None
+
+    def classify(self, domain: str) -> Tuple[str, str]:
+        """
+        Gibt (Art, Begründung) zurück, wenn die Domain eine geschützte Marke imitiert, sonst ("", "").
+        Art ist KIND_HOMOGLYPH, KIND_PUNYCODE, KIND_TYPO oder KIND_EMBEDDED.
+        """
+        domain = (domain or "").strip().lower().rstrip(".")
+        if not domain or self.is_protected(domain):
+            return "", ""
+        punycode = any(label.startswith("xn--") for label in domain.split("."))
+        unicode_domain = to_unicode(domain) if punycode else domain
+        registrable = registrable_part(unicode_domain)
+        reg_skeleton = skeleton(registrable)
+        raw_name, name = registrable.split(".")[0], reg_skeleton.split(".")[0]
+
+        # Markenname unter anderer Endung: gehört in aller Regel der Marke selbst
+        if raw_name in self._names:
+            return "", ""
+        brand = self._skeletons.get(reg_skeleton) or self._name_skeletons.get(name)
+        if brand is not None:
+            if punycode:
+                return KIND_HOMOGLYPH, f"Homoglyph-Domain zu {brand}: {domain} ({unicode_domain})"
+            return KIND_HOMOGLYPH, f"Lookalike zu {brand}: {domain}"
+        if punycode:
+            return KIND_PUNYCODE, f"Punycode-Domain: {domain}"
+
+        labels = skeleton(unicode_domain).split(".")
+        brand = self._embedded_brand(labels, len(registrable.split(".")))
+        if brand is not None:
+            return KIND_EMBEDDED, f"Lookalike zu {brand}: {domain}"
+
+        brand = self._typo_of(reg_skeleton)
+        if brand is not None:
+            return KIND_TYPO, f"Tippfehler-Domain zu {brand}: {domain}"
+        return "", ""
+
+    def check(self, domain: str) -> Tuple[bool, str]:
+        """Gibt (True, Begründung) zurück, wenn die Domain eine geschützte Marke imitiert."""
+        kind, reason = self.classify(domain)
+        return bool(kind), reason
+
+
+# Globaler Index über BRAND_DOMAINS_FILE bzw. die eingebaute Markenliste
+lookalike_index = LookalikeIndex.from_file(BRAND_DOMAINS_FILE)
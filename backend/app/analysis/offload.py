@@ -0,0 +1,84 @@
+# offload.py
+# Deterministische Analyse (MIME, Header, Links) in einem Prozess-Pool statt im Event-Loop
+import asyncio
+import email
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+from app.analysis.headers import analyze_headers
+from app.analysis.links import extract_link_targets, analyze_links
+from app.analysis.parsed import parse_message
+from app.core.config import PARSE_WORKERS, logger
+from app.imap.lazy import LazyMessage
+
+# Wird erst bei der ersten Analyse gestartet
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def message_payload(msg) -> Dict[str, Any]:
+    """
+    Serialisierbare Form einer Nachricht für analyze_static(): Rohbytes einer vollständigen
+    Nachricht bzw. der Snapshot einer LazyMessage (Header, BODYSTRUCTURE, Textteile).
+    """
+    if isinstance(msg, LazyMessage):
+        return {"lazy": msg.snapshot()}
+    raw = getattr(msg, "raw_bytes", None)
+    return {"raw": raw if raw is not None else msg.as_bytes()}
+
+
+def _message_from_payload(payload: Dict[str, Any]):
+    if "lazy" in payload:
+        return LazyMessage.from_snapshot(payload["lazy"])
+    return email.message_from_bytes(payload["raw"])
+
+
+def analyze_static(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deterministische Analysestufe: Parsen, Header-Analyse, Textextraktion und Link-Analyse.
+    Läuft in einem Worker-Prozess; Ein- und Ausgabe sind daher reine Bytes bzw. dicts.
+    """
+    parsed = parse_message(_message_from_payload(payload))
+    return {
+        "subject": parsed.subject,
+        "from_addr": parsed.from_addr,
+        "date": parsed.date,
+        "headers": analyze_headers(parsed),
+        "text": parsed.text,
+        "links": analyze_links(*extract_link_targets(parsed.text, parsed.html_parts)),
+    }
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and PARSE_WORKERS > 0:
+        # "spawn": die Worker erben weder IMAP-Sockets noch Threads des Servers
+        _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        logger.info("Prozess-Pool für die Analyse mit %d Workern gestartet.", PARSE_WORKERS)
+    return _pool
+
+
+async def run_static_analysis(msg) -> Dict[str, Any]:
+    """
+    Führt analyze_static() für eine Nachricht im Prozess-Pool aus (bei PARSE_WORKERS=0 oder
+    defektem Pool im Thread-Pool), damit große HTML-Mails den Event-Loop nicht blockieren.
+    Eine LazyMessage muss ihre Textteile bereits geladen haben (load_content_sections()).
+    """
+    global _pool
+    payload = message_payload(msg)
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, analyze_static, payload)
+        except BrokenProcessPool as e:
+            logger.error("Analyse-Prozess-Pool ausgefallen, wird neu gestartet: %s", e)
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+    return await asyncio.to_thread(analyze_static, payload)
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
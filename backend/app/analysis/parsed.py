@@ -0,0 +1,148 @@
+# parsed.py
+# Einmal durchlaufene Nachricht: dekodierte Header, Text, HTML und Anhangs-Metadaten
+import html
+import re
+from datetime import timezone
+from email.header import decode_header
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, NamedTuple, Tuple
+from app.core.config import logger
+
+
+class AttachmentInfo(NamedTuple):
+    filename: str
+    content_type: str
+    # Größe des (transferkodierten) Inhalts in Bytes
+    size: int
+
+
+def parse_date(value: str) -> str:
+    """Date-Header als ISO-8601-Zeitstempel in UTC, "" wenn er fehlt oder nicht lesbar ist."""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return ""
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+class ParsedMessage:
+    """
+    Ergebnis eines einzigen Durchlaufs über eine Nachricht (email.message.Message oder
+    LazyMessage). Jeder Text-/HTML-Teil wird genau einmal transferdekodiert; alle Analysen
+    in app/analysis lesen nur noch aus dieser Sicht. Enthält nur einfache Typen und ist
+    daher auch zwischen Prozessen übertragbar.
+    """
+
+    def __init__(self, headers: List[Tuple[str, str]], text: str, html_parts: List[str],
+                 attachments: List[AttachmentInfo]):
+        self.headers = headers
+        self.text = text
+        self.html_parts = html_parts
+        self.attachments = attachments
+        self._index: Dict[str, List[str]] = {}
+        for name, value in headers:
+            self._index.setdefault(name.lower(), []).append(value)
+        self.subject = decode_mime_header(self.get("subject", ""))
+        self.from_addr = clean_email_address(self.get("from", ""))
+        self.date = parse_date(self.get("date", ""))
+
+    def get(self, name: str, failobj: Any = None) -> Any:
+        """Erster Rohwert eines Headers (wie email.message.Message.get)."""
+        values = self._index.get(name.lower())
+        return values[0] if values else failobj
+
+    def get_all(self, name: str, failobj: Any = None) -> Any:
+        return list(self._index.get(name.lower(), [])) or failobj
+
+
+def _decoded(part) -> str:
+    payload = part.get_payload(decode=True)
+    return payload.decode(errors="ignore") if payload else ""
+
+
+def _encoded_size(part) -> int:
+    size = getattr(part, "size", None)
+    if size is not None:
+        # LazyPart: Größe aus BODYSTRUCTURE, ohne den Inhalt zu laden
+        return size
+    payload = part.get_payload()
+    return len(payload) if isinstance(payload, (str, bytes)) else 0
+
+
+def parse_message(msg) -> ParsedMessage:
+    """Durchläuft die Nachricht einmal und dekodiert dabei jeden Text-/HTML-Teil genau einmal."""
+    text_parts: List[str] = []
+    html_parts: List[str] = []
+    attachments: List[AttachmentInfo] = []
+    multipart = msg.is_multipart()
+    for part in msg.walk():
+        content_type = part.get_content_type()
+        if part.get_content_disposition() == "attachment":
+            attachments.append(AttachmentInfo(part.get_filename() or "", content_type, _encoded_size(part)))
+        if part.is_multipart():
+            continue
+        if content_type == "text/plain":
+            text_parts.append(_decoded(part))
+        elif content_type == "text/html":
+            html_parts.append(_decoded(part))
+            if not multipart:
+                # Einteilige Nachricht: der Inhalt ist zugleich der Text
+                text_parts.append(html_parts[-1])
+        elif not multipart:
+            text_parts.append(_decoded(part))
+    headers = [(name, str(value)) for name, value in msg.items()]
+    return ParsedMessage(headers, "".join(text_parts), html_parts, attachments)
+
+
+def decode_mime_header(header_value: str) -> str:
+    """Dekodiert MIME-kodierte Header-Werte (z.B. Betreffzeilen)."""
+    if not header_value:
+        return ""
+    try:
+        decoded_parts = decode_header(header_value)
+        decoded_string = ""
+        for part, encoding in decoded_parts:
+            if isinstance(part, bytes):
+                if encoding:
+                    decoded_string += part.decode(encoding)
+                else:
+                    decoded_string += part.decode('utf-8', errors='ignore')
+            else:
+                decoded_string += part
+        return decoded_string
+    except Exception as e:
+        logger.warning("Fehler beim Dekodieren des Headers '%s': %s", header_value, e)
+        return header_value
+
+
+def clean_email_address(email_addr: str) -> str:
+    """Bereinigt E-Mail-Adressen von HTML-Entities und Unicode-Escape-Sequenzen."""
+    if not email_addr:
+        return ""
+    try:
+        # Dekodiere HTML-Entities
+        cleaned = html.unescape(email_addr)
+        # Dekodiere Unicode-Escape-Sequenzen
+        cleaned = cleaned.encode().decode('unicode_escape')
+
+        # Extrahiere E-Mail aus "Name <email@domain.com>" Format
+        email_match = re.search(r'<([^>]+)>', cleaned)
+        if email_match:
+            return email_match.group(1).strip()
+
+        # Fallback: Entferne überflüssige Anführungszeichen und Klammern
+        cleaned = re.sub(r'^["\']+|["\']+$', '', cleaned)  # Anführungszeichen am Anfang/Ende
+        cleaned = re.sub(r'^<+|>+$', '', cleaned)  # Spitze Klammern am Anfang/Ende
+
+        # Suche nach E-Mail-Pattern
+        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+        match = re.search(email_pattern, cleaned)
+        if match:
+            return match.group(0)
+
+        return cleaned.strip()
+    except Exception as e:
+        logger.warning("Fehler beim Bereinigen der E-Mail-Adresse '%s': %s", email_addr, e)
+        return email_addr
@@ -0,0 +1,140 @@
+# pipeline.py
+# Analyse-Pipeline: Header, Links und KI-Bewertung je E-Mail
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.analysis.content import build_context, verdict_batcher, PROMPT_VERSION
+from app.analysis.result import parse_analysis_result, combine_results
+from app.analysis.offload import run_static_analysis
+from app.analysis.triage import triage
+from app.imap.executor import run_imap
+from app.imap.lazy import LazyMessage
+from app.imap.keys import MessageKey
+from app.storage.verdicts import verdict_cache, verdict_key
+from app.core.cache import LRUCache, SingleFlight
+from app.core.config import (
+    ANALYSIS_CONCURRENCY, ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_MAX_BYTES,
+    OPENROUTER_MODEL, logger
+)
+
+# Begrenzt gleichzeitig laufende Analysen (und damit parallele KI-Anfragen) prozessweit
+_analysis_semaphore = asyncio.Semaphore(max(1, ANALYSIS_CONCURRENCY))
+
+# Laufende KI-Anfragen je Verdict-Schlüssel
+_pending_verdicts: SingleFlight[Dict[str, Any]] = SingleFlight()
+
+def _estimate_size(analysis_data: Dict[str, Any]) -> int:
+    """Grobe Größenschätzung eines Cache-Eintrags (Länge der JSON-Darstellung)."""
+    return len(json.dumps(analysis_data, default=str))
+
+# Cache für E-Mail-Analysen ((Konto, Postfach, UIDVALIDITY, UID) -> Analyse), LRU mit TTL.
+# Sequenznummern verschieben sich bei jedem EXPUNGE, UIDs innerhalb einer UIDVALIDITY nicht.
+analysis_cache: LRUCache[Dict[str, Any]] = LRUCache(
+    max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANALYSIS_CACHE_TTL,
+    max_bytes=ANALYSIS_CACHE_MAX_BYTES,
+    sizeof=_estimate_size if ANALYSIS_CACHE_MAX_BYTES else None,
+)
+
+async def get_ai_verdict(text: str, header_result: Dict[str, Any], link_result: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    KI-Bewertung aus dem persistenten Verdict-Cache oder per OpenRouter.
+    Inhaltsgleiche Mails (z.B. derselben Kampagne) lösen so nur einen KI-Aufruf aus.
+    """
+    context = build_context(text, header_result, link_result)
+    key = verdict_key(context)
+    cached = verdict_cache.get(key, OPENROUTER_MODEL, PROMPT_VERSION)
+    if cached is not None:
+        logger.info("KI-Bewertung aus persistentem Cache (%s)", key[:12])
+        return cached
+    
+    async def request_verdict() -> Dict[str, Any]:
+        # Gleichzeitig anstehende Bewertungen werden zu Sammelanfragen gebündelt
+        gpt_response = await verdict_batcher.submit(context)
+        result = parse_analysis_result(gpt_response)
+        # Fehler- und Fallback-Bewertungen nicht dauerhaft speichern
+        if "error" not in result and result.get("bewertung") != "unbekannt":
+            verdict_cache.put(key, result, OPENROUTER_MODEL, PROMPT_VERSION)
+        return result
+    
+    # Gleichzeitige Analysen desselben Inhalts teilen sich einen KI-Aufruf
+    return await _pending_verdicts.run(key, request_verdict)
+
+async def get_cached_analysis(key: MessageKey, msg) -> Dict[str, Any]:
+    """
+    Holt gecachte Analyse oder führt neue durch.
+    Gleichzeitige Anfragen für dieselbe Nachricht teilen sich eine Analyse;
+    neue Analysen laufen höchstens ANALYSIS_CONCURRENCY-fach parallel.
+    """
+    async def compute() -> Dict[str, Any]:
+        async with _analysis_semaphore:
+            return await _run_analysis(key, msg)
+    
+    return await analysis_cache.get_or_compute(key, compute)
+
+async def _run_analysis(key: MessageKey, msg) -> Dict[str, Any]:
+    # Führe neue Analyse durch
+    logger.info("Neue Analyse für UID %s", key)
+    
+    # Nicht vorab geholte Textteile (z.B. Text-Anhänge) im IMAP-Thread-Pool nachladen;
+    # die Worker-Prozesse haben keinen IMAP-Zugriff
+    if isinstance(msg, LazyMessage) and msg.missing_content_sections():
+        await run_imap(msg.load_content_sections)
+    
+    # Parsen (inkl. Betreff/Absender), Header- und Link-Analyse im Prozess-Pool statt im Event-Loop
+    static = await run_static_analysis(msg)
+    subject, from_addr = static["subject"], static["from_addr"]
+    header_result, text, link_result = static["headers"], static["text"], static["links"]
+    # Eindeutige Fälle ohne KI-Aufruf entscheiden
+    result = triage(header_result, link_result)
+    if result is None:
+        result = await get_ai_verdict(text, header_result, link_result)
+    combined = combine_results(header_result, link_result, result)
+    
+    # Cache das Ergebnis
+    analysis_data = {
+        "uid": str(key.uid),
+        "account": key.account,
+        "mailbox": key.mailbox,
+        "uidvalidity": key.uidvalidity,
+        "subject": subject,
+        "from_addr": from_addr,
+        "date": static["date"],
+        "score": combined["score"],
+        "risk_level": combined["risikostufe"],
+        "header_score": combined.get("header_score", 0),
+        "link_score": combined.get("link_score", 0),
+        "ai_score": combined.get("ai_score", 0),
+        "headers": header_result,
+        "links": link_result,
+        "analysis": result
+    }
+    
+    return analysis_data
+
+# Wird für jede fertige Analyse sofort aufgerufen (None = fehlgeschlagen), z.B. zum Streamen
+ResultCallback = Callable[[MessageKey, Optional[Dict[str, Any]]], Awaitable[None]]
+
+async def _analyze_one(key: MessageKey, msg, on_result: Optional[ResultCallback]) -> Optional[Dict[str, Any]]:
+    try:
+        analysis_data: Optional[Dict[str, Any]] = await get_cached_analysis(key, msg)
+    except Exception as e:
+        logger.error("Analyse für UID %s fehlgeschlagen: %s", key, e)
+        analysis_data = None
+    if on_result is not None:
+        try:
+            await on_result(key, analysis_data)
+        except Exception as e:
+            logger.error("Fehler im Ergebnis-Callback für UID %s: %s", key, e)
+    return analysis_data
+
+async def analyze_messages(emails: List[Tuple[MessageKey, Any]],
+                           on_result: Optional[ResultCallback] = None) -> List[Tuple[MessageKey, Optional[Dict[str, Any]]]]:
+    """
+    Analysiert mehrere E-Mails nebenläufig (begrenzt durch ANALYSIS_CONCURRENCY).
+    Gibt (Schlüssel, Analyse) in der Reihenfolge der Eingabe zurück; schlägt eine einzelne
+    Analyse fehl, wird sie protokolliert und als None geliefert, ohne die anderen abzubrechen.
+    `on_result` erhält jede Analyse bereits, sobald sie fertig ist (gecachte sofort).
+    """
+    outcomes = await asyncio.gather(*(_analyze_one(key, msg, on_result) for key, msg in emails))
+    return [(key, outcome) for (key, _), outcome in zip(emails, outcomes)]
@@ -2,6 +2,11 @@
 # Risikobewertung & Scoring 
 import json
 
+# Abzug je Link mit hohem Risiko und Obergrenze je Nachricht, damit viele (z.B. gleichartige)
+# Links allein eine Mail nicht auf "hoch" drücken
+RISKY_LINK_PENALTY = 15
+MAX_RISKY_LINK_PENALTY = 45
+
 def parse_analysis_result(gpt_response: str):
     try:
         result = json.loads(gpt_response)
@@ -34,10 +39,9 @@ def combine_results(header_result, link_result, ai_result):
         link_score -= 10
     if len(link_result) > 3:
         link_score -= 5
-    # Zusätzliche Link-Risiken
-    for link in link_result:
-        if link.get("risk_score", 0) > 50:
-            link_score -= 15
+    # Zusätzliche Link-Risiken, gedeckelt je Nachricht
+    risky_links = sum(1 for link in link_result if link.get("risk_score", 0) > 50)
+    link_score -= min(MAX_RISKY_LINK_PENALTY, RISKY_LINK_PENALTY * risky_links)
     # Zusätzliche Checks
     penalty = 0
     # Gefährliche Anhänge
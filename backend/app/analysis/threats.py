@@ -0,0 +1,68 @@
+# threats.py
+# Bedrohungskategorien einer Analyse (für die Statistik), aus Header-Befunden, Links und KI-Gründen
+import re
+from typing import Any, Dict, List
+
+# Ab diesem Link-Risiko zählt ein Link als gefährlich
+DANGEROUS_LINK_SCORE = 50
+
+# Kategorien aus den Begründungen der KI; nur für E-Mails mit erhöhtem Risiko, da auch
+# Entwarnungen Stichworte enthalten ("Keine verdächtigen Links oder Anhänge")
+REASON_PATTERNS = [
+    (re.compile(r"phishing", re.IGNORECASE), "Phishing"),
+    (re.compile(r"spam", re.IGNORECASE), "Spam"),
+    (re.compile(r"malware|schadsoftware|trojaner", re.IGNORECASE), "Malware"),
+    (re.compile(r"ransomware", re.IGNORECASE), "Ransomware"),
+    (re.compile(r"betrug", re.IGNORECASE), "Betrug"),
+    (re.compile(r"datenklau|zugangsdaten|passwort", re.IGNORECASE), "Datenklau"),
+    (re.compile(r"social engineering", re.IGNORECASE), "Social Engineering"),
+    (re.compile(r"lookalike|imitiert", re.IGNORECASE), "Lookalike Domain"),
+    (re.compile(r"anhang", re.IGNORECASE), "Gefährlicher Anhang"),
+    (re.compile(r"link", re.IGNORECASE), "Gefährlicher Link"),
+    (re.compile(r"geld|zahlung|überweisung", re.IGNORECASE), "Geldanfrage"),
+    (re.compile(r"druck|dringend|dringlichkeit", re.IGNORECASE), "Druckausübung"),
+]
+
+
+def _header_threats(headers: Dict[str, Any]) -> List[str]:
+    threats = []
+    if headers.get("from_lookalike", "ok") not in ("ok", ""):
+        threats.append("Lookalike Domain")
+    if headers.get("from_domain_listed") == "blocklist":
+        threats.append("Blocklist-Domain")
+    if str(headers.get("spf", "")).lower().startswith(("fail", "softfail")):
+        threats.append("SPF Fehler")
+    if headers.get("dmarc") == "fail":
+        threats.append("DMARC Fehler")
+    if headers.get("reply_path_warning", "ok") not in ("ok", ""):
+        threats.append("Abweichende Antwortadresse")
+    if headers.get("dangerous_attachments"):
+        threats.append("Gefährlicher Anhang")
+    if headers.get("encrypted_attachments"):
+        threats.append("Verschlüsselter Anhang")
+    if headers.get("recipient_warning", "ok") not in ("ok", ""):
+        threats.append("Viele Empfänger")
+    if headers.get("header_anomalies"):
+        threats.append("Header-Anomalie")
+    if headers.get("tracking_pixels"):
+        threats.append("Tracking-Pixel")
+    return threats
+
+
+def threats_of(analysis_data: Dict[str, Any]) -> List[str]:
+    """
+    Bedrohungskategorien einer gespeicherten Analyse, jede höchstens einmal: Header-Befunde,
+    gefährliche Links und (bei Risiko "mittel"/"hoch") die Begründungen der KI.
+    """
+    threats = _header_threats(analysis_data.get("headers") or {})
+    for link in analysis_data.get("links") or []:
+        if link.get("lookalike") or link.get("listed") == "blocklist" or link.get("risk_score", 0) >= DANGEROUS_LINK_SCORE:
+            threats.append("Gefährlicher Link")
+            break
+    if analysis_data.get("risk_level") in ("mittel", "hoch"):
+        verdict = analysis_data.get("analysis") or {}
+        for reason in [verdict.get("bewertung", "")] + list(verdict.get("gruende") or []):
+            for pattern, threat in REASON_PATTERNS:
+                if pattern.search(str(reason)):
+                    threats.append(threat)
+    return list(dict.fromkeys(threats))
@@ -0,0 +1,88 @@
+# triage.py
+# Regelbasierte Vorab-Bewertung: eindeutige Fälle ohne KI-Aufruf entscheiden
+from typing import Any, Dict, List, Optional, Tuple
+from app.analysis.lookalike import HIGH_CONFIDENCE_KINDS
+from app.core.config import (
+    TRIAGE_ENABLED, TRIAGE_MALICIOUS_THRESHOLD, TRIAGE_BENIGN_MAX_LINK_RISK, TRIAGE_BENIGN_REQUIRE_DMARC
+)
+
+# Punkte je Warnsignal; ab TRIAGE_MALICIOUS_THRESHOLD gilt die Mail ohne KI als Phishing
+WEIGHTS = {
+    "sender_blocklisted": 100,
+    "link_blocklisted": 100,
+    "dangerous_attachment": 50,
+    "sender_lookalike": 50,
+    "link_lookalike": 40,
+    "dmarc_fail": 30,
+    "punycode_link": 20,
+    "encrypted_attachment": 20,
+}
+
+
+def _signals(header_result: Dict[str, Any], link_result: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Gefundene Warnsignale als (Signal, Begründung)."""
+    signals: List[Tuple[str, str]] = []
+    if header_result.get("from_domain_listed") == "blocklist":
+        signals.append(("sender_blocklisted", f"Absender-Domain auf der Blocklist: {header_result.get('from_domain')}"))
+    # Wie bei Links zählen nur eindeutige Lookalikes, nicht eingebettete Markennamen
+    if header_result.get("from_lookalike_kind") in HIGH_CONFIDENCE_KINDS:
+        signals.append(("sender_lookalike", f"Absender-Domain imitiert eine Marke ({header_result['from_lookalike']})"))
+    if header_result.get("dmarc") == "fail":
+        signals.append(("dmarc_fail", "DMARC-Prüfung fehlgeschlagen"))
+    for filename in header_result.get("dangerous_attachments") or []:
+        signals.append(("dangerous_attachment", f"Gefährlicher Anhang: {filename}"))
+    for filename in header_result.get("encrypted_attachments") or []:
+        signals.append(("encrypted_attachment", f"Verschlüsselter Anhang: {filename}"))
+    # Je Link-Signal höchstens einmal zählen, sonst entscheidet die Zahl der Links
+    blocklisted = [link for link in link_result if link.get("listed") == "blocklist"]
+    # Nur eindeutige Lookalikes (Homoglyph, Punycode, Tippfehler); eingebettete Markennamen
+    # ("paypal-login.net") sind ein Hinweis für die KI, aber kein Beleg
+    lookalikes = [link for link in link_result if link.get("lookalike_kind") in HIGH_CONFIDENCE_KINDS]
+    punycode = [link for link in link_result if link.get("is_punycode")]
+    if blocklisted:
+        signals.append(("link_blocklisted", f"Link auf Blocklist-Domain: {blocklisted[0].get('domain')}"))
+    if lookalikes:
+        signals.append(("link_lookalike", f"Link auf Lookalike-Domain ({lookalikes[0]['lookalike']})"))
+    if punycode:
+        signals.append(("punycode_link", f"Link auf Punycode-Domain: {punycode[0].get('domain')}"))
+    return signals
+
+
+def triage(header_result: Dict[str, Any], link_result: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Entscheidet eindeutige Fälle deterministisch und gibt dann eine zu AIAnalysis kompatible
+    Bewertung mit "quelle": "triage" zurück; in allen anderen Fällen None (KI-Analyse nötig).
+      - Phishing: Summe der Signal-Gewichte >= TRIAGE_MALICIOUS_THRESHOLD
+      - Legitim: Absender auf der Allowlist, DMARC pass (abschaltbar), keine Warnsignale
+        und kein Link über TRIAGE_BENIGN_MAX_LINK_RISK
+    """
+    if not TRIAGE_ENABLED:
+        return None
+    signals = _signals(header_result, link_result)
+    # Jede Signalart zählt einmal, z.B. zwei .exe-Anhänge nicht doppelt
+    points = sum(WEIGHTS[signal] for signal in {signal for signal, _ in signals})
+    if TRIAGE_MALICIOUS_THRESHOLD > 0 and points >= TRIAGE_MALICIOUS_THRESHOLD:
+        return {
+            "bewertung": "Phishing",
+            "risikostufe": "hoch",
+            "score": min(100, points),
+            "gruende": [reason for _, reason in signals],
+            "quelle": "triage",
+        }
+
+    trusted_sender = header_result.get("from_domain_listed") == "allowlist"
+    authenticated = header_result.get("dmarc") == "pass" or not TRIAGE_BENIGN_REQUIRE_DMARC
+    links_ok = all(link.get("risk_score", 0) <= TRIAGE_BENIGN_MAX_LINK_RISK for link in link_result)
+    if trusted_sender and authenticated and not signals and links_ok:
+        reasons = [f"Absender-Domain auf der Allowlist: {header_result.get('from_domain')}"]
+        if header_result.get("dmarc") == "pass":
+            reasons.append("DMARC-Prüfung bestanden")
+        reasons.append("Keine verdächtigen Links oder Anhänge")
+        return {
+            "bewertung": "Legitim",
+            "risikostufe": "niedrig",
+            "score": 0,
+            "gruende": reasons,
+            "quelle": "triage",
+        }
+    return None
@@ -28,6 +28,13 @@ def log_subject_modification(uid: str, old_subject: str, new_subject: str, risk_
         uid, old_subject, new_subject, risk_level
     )
 
+def log_risk_tag(uid: str, tag: str, risk_level: str):
+    """Loggt eine Risiko-Markierung per Schlüsselwort oder Ordner."""
+    audit_logger.info(
+        "RISK_TAGGED uid=%s tag='%s' risk=%s",
+        uid, tag, risk_level
+    )
+
 def log_api_access(endpoint: str, method: str, status_code: int, user_agent: str = None):
     """Loggt API-Zugriffe."""
     audit_logger.info(
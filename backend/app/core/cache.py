@@ -0,0 +1,173 @@
+# cache.py
+# LRU-/TTL-Cache mit Single-Flight für asynchrone Berechnungen
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[V]):
+    """
+    Bündelt gleichzeitige Berechnungen für denselben Schlüssel: nur der erste Aufrufer
+    rechnet, alle weiteren warten auf dessen Ergebnis (oder dessen Exception).
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, "asyncio.Future[V]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[V]]) -> V:
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future: "asyncio.Future[V]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except BaseException as e:
+            future.set_exception(e)
+            # Exception gilt als abgerufen, auch wenn niemand auf das Future wartet
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+class LRUCache(Generic[V]):
+    """
+    LRU-Cache mit fester TTL je Eintrag, Obergrenze für Einträge und optional für
+    die geschätzte Größe (sizeof). Alle Operationen sind O(1) (amortisiert).
+    Nicht thread-sicher: nur aus dem asyncio-Event-Loop verwenden.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float,
+                 max_bytes: int = 0, sizeof: Optional[Callable[[V], int]] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> (Wert, Ablaufzeitpunkt, Größe); Reihenfolge = zuletzt benutzt am Ende
+        self._data: "OrderedDict[Hashable, Tuple[V, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._flight: SingleFlight[V] = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            if count:
+                self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            if count:
+                self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        if key in self._data:
+            self._remove(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        self._data[key] = (value, time.monotonic() + self.ttl_seconds, size)
+        self._bytes += size
+        self._evict()
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Abgelaufene Einträge am Anfang (am längsten unbenutzt) entfernen. Da get() Einträge ans
+        # Ende verschiebt, liegen nicht alle abgelaufenen vorn; die übrigen erkennt get() beim
+        # nächsten Zugriff bzw. purge_expired(), bis dahin zählen sie zu den Obergrenzen.
+        while self._data:
+            key, (_, expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+        while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Entfernt alle abgelaufenen Einträge (O(n), für gelegentliche Aufräumläufe)."""
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def values(self) -> Iterator[V]:
+        """Iteriert über alle nicht abgelaufenen Werte, ohne die LRU-Reihenfolge zu ändern."""
+        now = time.monotonic()
+        for value, expires_at, _ in list(self._data.values()):
+            if expires_at > now:
+                yield value
+
+    async def get_or_compute(self, key: Hashable, factory: Callable[[], Awaitable[V]]) -> V:
+        """
+        Liefert den gecachten Wert oder berechnet ihn. Laufen mehrere Anfragen für
+        denselben Schlüssel gleichzeitig, wird nur einmal berechnet.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def compute() -> V:
+            result = await factory()
+            self.set(key, result)
+            return result
+
+        return await self._flight.run(key, compute)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "inflight": len(self._flight),
+        }
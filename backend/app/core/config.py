@@ -1,7 +1,7 @@
 import os
 import logging
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List
 
 load_dotenv()
 
@@ -21,10 +21,111 @@ IMAP_PORT = int(os.getenv('IMAP_PORT', 993))
 IMAP_USER = os.getenv('IMAP_USER')
 IMAP_PASSWORD = os.getenv('IMAP_PASSWORD')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
+OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
+# Sammelanfragen an die KI: max. E-Mails je Anfrage (1 = einzeln), Token-Budget der
+# E-Mail-Kontexte je Anfrage, max. Wartezeit auf weitere E-Mails (Millisekunden) und
+# Obergrenze für max_tokens der Antwort. Praktisch begrenzt auch ANALYSIS_CONCURRENCY die
+# Sammelgröße, da nie mehr E-Mails gleichzeitig auf eine Bewertung warten.
+LLM_BATCH_MAX_EMAILS: int = int(os.getenv('LLM_BATCH_MAX_EMAILS', 4))
+LLM_BATCH_TOKEN_BUDGET: int = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', 6000))
+LLM_BATCH_WAIT_MS: int = int(os.getenv('LLM_BATCH_WAIT_MS', 50))
+LLM_BATCH_MAX_OUTPUT_TOKENS: int = int(os.getenv('LLM_BATCH_MAX_OUTPUT_TOKENS', 2048))
+# Token-Budget des Kontexts je E-Mail; modellspezifisch z.B. "openai/gpt-4o=6000,openai/gpt-3.5-turbo=2000"
+LLM_CONTEXT_TOKENS: int = int(os.getenv('LLM_CONTEXT_TOKENS', 2000))
+LLM_CONTEXT_TOKENS_BY_MODEL: Dict[str, int] = {
+    model.strip(): int(tokens)
+    for model, _, tokens in (entry.partition('=') for entry in os.getenv('LLM_CONTEXT_TOKENS_BY_MODEL', '').split(','))
+    if model.strip() and tokens.strip()
+}
+
+# Lokale Datenablage (SQLite-Dateien)
+DATA_DIR = os.getenv('DATA_DIR', '.')
+# Persistenter Cache für KI-Bewertungen, Schlüssel = Hash des normalisierten Kontexts
+VERDICT_CACHE_PATH = os.getenv('VERDICT_CACHE_PATH', os.path.join(DATA_DIR, 'verdicts.db'))
+VERDICT_CACHE_TTL_DAYS: int = int(os.getenv('VERDICT_CACHE_TTL_DAYS', 30))
+# Lokaler Speicher für Sync-Stand und Analyseergebnisse je Postfach
+MAIL_STORE_PATH = os.getenv('MAIL_STORE_PATH', os.path.join(DATA_DIR, 'mailstore.db'))
+# Wie viele der neuesten Nachrichten beim ersten Sync (oder nach UIDVALIDITY-Wechsel) analysiert werden
+SYNC_INITIAL_LIMIT: int = int(os.getenv('SYNC_INITIAL_LIMIT', 50))
+# Statistik (/stats): Anzahl Tage im Risikotrend und Anzahl der häufigsten Bedrohungen
+STATS_TREND_DAYS: int = int(os.getenv('STATS_TREND_DAYS', 7))
+STATS_TOP_THREATS: int = int(os.getenv('STATS_TOP_THREATS', 10))
+
+# Gemeinsamer HTTP-Client für OpenRouter
+HTTP_MAX_CONNECTIONS: int = int(os.getenv('HTTP_MAX_CONNECTIONS', 20))
+HTTP_MAX_KEEPALIVE: int = int(os.getenv('HTTP_MAX_KEEPALIVE', 10))
+HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 60))
+HTTP_MAX_RETRIES: int = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_RETRY_BACKOFF: float = float(os.getenv('HTTP_RETRY_BACKOFF', 1.0))
+HTTP_RETRY_MAX_DELAY: float = float(os.getenv('HTTP_RETRY_MAX_DELAY', 30))
+
+# Mehrere Konten/Postfächer: JSON-Datei mit Kontenliste (siehe app/imap/accounts.py).
+# Ohne Datei gilt das Konto aus IMAP_HOST/IMAP_USER mit den Postfächern aus IMAP_MAILBOXES.
+IMAP_ACCOUNTS_FILE = os.getenv('IMAP_ACCOUNTS_FILE', '')
+IMAP_MAILBOXES: List[str] = [m.strip() for m in os.getenv('IMAP_MAILBOXES', 'INBOX').split(',') if m.strip()]
+
+# IMAP-Verbindungspool (Standardgröße je Konto)
+IMAP_POOL_SIZE: int = int(os.getenv('IMAP_POOL_SIZE', 4))
+IMAP_KEEPALIVE_SECONDS: int = int(os.getenv('IMAP_KEEPALIVE_SECONDS', 120))
+IMAP_CONNECT_TIMEOUT: int = int(os.getenv('IMAP_CONNECT_TIMEOUT', 30))
+# Thread-Pool für blockierende imaplib-Aufrufe und Zeitlimit je Operation (Sekunden)
+# 0 = Summe der Verbindungslimits aller Konten
+IMAP_EXECUTOR_WORKERS: int = int(os.getenv('IMAP_EXECUTOR_WORKERS', 0))
+IMAP_OPERATION_TIMEOUT: int = int(os.getenv('IMAP_OPERATION_TIMEOUT', 60))
+# "partial": nur Header, BODYSTRUCTURE und Textteile laden; "full": komplette Nachricht
+IMAP_FETCH_MODE: str = os.getenv('IMAP_FETCH_MODE', 'partial').lower()
+# IDLE-Watcher: IDLE spätestens nach IMAP_IDLE_TIMEOUT Sekunden erneuern (RFC 2177: < 29 min),
+# Polling-Intervall für Server ohne IDLE-Unterstützung
+IMAP_IDLE_TIMEOUT: int = int(os.getenv('IMAP_IDLE_TIMEOUT', 1500))
+IMAP_POLL_INTERVAL: int = int(os.getenv('IMAP_POLL_INTERVAL', 30))
+# Betreff-Markierung: UIDs je FETCH/APPEND/EXPUNGE-Runde und max. UIDs je Sammelanfrage
+IMAP_TAG_BATCH_SIZE: int = int(os.getenv('IMAP_TAG_BATCH_SIZE', 100))
+MODIFY_SUBJECT_MAX_UIDS: int = int(os.getenv('MODIFY_SUBJECT_MAX_UIDS', 1000))
+# Art der Risiko-Markierung: "subject" (Betreff-Präfix, Nachricht wird neu abgelegt),
+# "keyword" (IMAP-Schlüsselwort wie $SecureMailHigh) oder "move" (UID MOVE in einen Risiko-Ordner)
+TAGGING_MODE: str = os.getenv('TAGGING_MODE', 'subject').lower()
+# Zielordner je Risikostufe für TAGGING_MODE=move ("stufe=Ordner,..."); Stufen ohne Ordner bleiben liegen
+RISK_FOLDERS: Dict[str, str] = {
+    risk.strip(): folder.strip()
+    for risk, _, folder in (entry.partition('=') for entry in os.getenv(
+        'RISK_FOLDERS', 'hoch=SecureMail/Hochrisiko,mittel=SecureMail/Warnung').split(','))
+    if risk.strip() and folder.strip()
+}
+
+# Maximale Anzahl gleichzeitig laufender E-Mail-Analysen (inkl. KI-Anfragen)
+ANALYSIS_CONCURRENCY: int = int(os.getenv('ANALYSIS_CONCURRENCY', 5))
+# Regelbasierte Vorab-Bewertung ohne KI: Punkteschwelle für Phishing (0 = nie), max. Link-Risiko
+# für "Legitim" und ob dafür DMARC pass nötig ist (Absender muss auf der Allowlist stehen)
+TRIAGE_ENABLED: bool = os.getenv('TRIAGE_ENABLED', 'true').lower() == 'true'
+TRIAGE_MALICIOUS_THRESHOLD: int = int(os.getenv('TRIAGE_MALICIOUS_THRESHOLD', 100))
+TRIAGE_BENIGN_MAX_LINK_RISK: int = int(os.getenv('TRIAGE_BENIGN_MAX_LINK_RISK', 20))
+TRIAGE_BENIGN_REQUIRE_DMARC: bool = os.getenv('TRIAGE_BENIGN_REQUIRE_DMARC', 'true').lower() == 'true'
+# Prozesse für die CPU-lastige deterministische Analyse (MIME, Header, Links, HTML);
+# 0 = ohne Prozess-Pool im Thread-Pool ausführen
+PARSE_WORKERS: int = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+# Hintergrund-Sync aller konfigurierten Postfächer: Intervall in Sekunden (0 = aus)
+# und Anzahl asynchroner Sync-Worker über alle Konten
+SYNC_INTERVAL: int = int(os.getenv('SYNC_INTERVAL', 0))
+SYNC_WORKERS: int = int(os.getenv('SYNC_WORKERS', 8))
+# In-Memory-Cache für Analysen: TTL (Sekunden), max. Einträge, optional max. Größe (Bytes, 0 = aus)
+ANALYSIS_CACHE_TTL: int = int(os.getenv('ANALYSIS_CACHE_TTL', 300))
+ANALYSIS_CACHE_MAX_ENTRIES: int = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 20000))
+ANALYSIS_CACHE_MAX_BYTES: int = int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', 0))
 
 # Konfigurierbare Schwellenwerte
 DANGEROUS_EXTENSIONS: List[str] = [
     '.exe', '.js', '.scr', '.bat', '.cmd', '.vbs', '.jar', '.zip', '.rar', '.ace', '.msi', '.ps1'
 ]
 MAX_RECIPIENTS: int = int(os.getenv('MAX_RECIPIENTS', 5))
-HEADER_ANOMALY_DAYS: int = int(os.getenv('HEADER_ANOMALY_DAYS', 60)) 
\ No newline at end of file
+# Link-Extraktion: max. eindeutige Links je Nachricht und max. Länge einer URL
+MAX_LINKS_PER_MESSAGE: int = int(os.getenv('MAX_LINKS_PER_MESSAGE', 200))
+MAX_URL_LENGTH: int = int(os.getenv('MAX_URL_LENGTH', 2048))
+HEADER_ANOMALY_DAYS: int = int(os.getenv('HEADER_ANOMALY_DAYS', 60))
+# Geschützte Marken-Domains für die Lookalike-Erkennung (eine Domain pro Zeile, # = Kommentar);
+# leer = eingebaute Liste
+BRAND_DOMAINS_FILE: str = os.getenv('BRAND_DOMAINS_FILE', '')
+# Optionale lokale Block-/Allowlist (Format wie BRAND_DOMAINS_FILE, gilt auch für Subdomains)
+# und Größe des Caches für Domain-Bewertungen je Prozess
+DOMAIN_BLOCKLIST_FILE: str = os.getenv('DOMAIN_BLOCKLIST_FILE', '')
+DOMAIN_ALLOWLIST_FILE: str = os.getenv('DOMAIN_ALLOWLIST_FILE', '')
+DOMAIN_CACHE_SIZE: int = int(os.getenv('DOMAIN_CACHE_SIZE', 50000)) 
\ No newline at end of file
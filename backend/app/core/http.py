@@ -0,0 +1,114 @@
+# http.py
+# Gemeinsamer, gepoolter HTTP-Client für OpenRouter
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+import httpx
+from app.core.config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, HTTP_RETRY_MAX_DELAY, logger
+)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/"
+
+# Statuscodes, bei denen ein erneuter Versuch sinnvoll ist
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+try:
+    import h2  # noqa: F401 -- optional, nur für HTTP/2 benötigt
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _create_client() -> httpx.AsyncClient:
+    if not HTTP2_AVAILABLE:
+        logger.info("Paket 'h2' nicht installiert, OpenRouter-Client nutzt HTTP/1.1.")
+    return httpx.AsyncClient(
+        base_url=OPENROUTER_BASE_URL,
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(30, connect=10),
+    )
+
+
+async def start_http_client() -> None:
+    """Erstellt den anwendungsweiten Client (Lifespan-Start)."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+
+async def close_http_client() -> None:
+    """Schließt den Client und alle offenen Verbindungen (Lifespan-Ende)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Gibt den gemeinsamen Client zurück; außerhalb des Lifespans wird er bei Bedarf erstellt."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Liest den Retry-After-Header (Sekunden oder HTTP-Datum)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt: int) -> float:
+    delay = HTTP_RETRY_BACKOFF * (2 ** attempt)
+    return delay + random.uniform(0, delay / 2)
+
+
+async def request_with_retry(method: str, url: str, retries: int = HTTP_MAX_RETRIES, **kwargs: Any) -> httpx.Response:
+    """
+    Sendet eine Anfrage über den gemeinsamen Client.
+    Bei 429/5xx und Verbindungsfehlern wird mit exponentiellem Backoff erneut versucht,
+    ein Retry-After-Header des Servers hat dabei Vorrang. Timeouts werden nicht wiederholt.
+    """
+    client = get_http_client()
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+            if attempt >= retries:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning("HTTP-Verbindungsfehler (%s), neuer Versuch in %.1fs", e, delay)
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return response
+            retry_after = _retry_after_seconds(response)
+            delay = retry_after if retry_after is not None else _backoff_delay(attempt)
+            if delay > HTTP_RETRY_MAX_DELAY:
+                logger.warning("Retry-After von %.0fs überschreitet das Limit, kein neuer Versuch.", delay)
+                return response
+            logger.warning("HTTP %s von %s, neuer Versuch in %.1fs", response.status_code, url, delay)
+            await response.aclose()
+        attempt += 1
+        await asyncio.sleep(min(delay, HTTP_RETRY_MAX_DELAY))
@@ -0,0 +1,53 @@
+# events.py
+# Verteilt Echtzeit-Ereignisse an die SSE-Abonnenten des jeweiligen Postfachs
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import logger
+
+
+class EventBroadcaster:
+    """
+    In-Process-Broadcast: jeder Abonnent erhält eine eigene Queue und nur die Ereignisse
+    seines Kontos/Postfachs (None = alle). Langsame Abonnenten verlieren bei voller Queue
+    die ältesten Ereignisse.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        # Queue -> (Konto, Postfach) des Abonnenten
+        self._subscribers: Dict[asyncio.Queue, Tuple[Optional[str], Optional[str]]] = {}
+
+    def subscribe(self, account: Optional[str] = None, mailbox: Optional[str] = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers[queue] = (account, mailbox)
+        logger.info("SSE-Abonnent verbunden (%d aktiv).", len(self._subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+        logger.info("SSE-Abonnent getrennt (%d aktiv).", len(self._subscribers))
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: Dict[str, Any], account: Optional[str] = None, mailbox: Optional[str] = None) -> None:
+        """
+        Verteilt ein Ereignis ({"event": ..., "data": ...}) an die Abonnenten von account/mailbox;
+        ohne Angabe an alle.
+        """
+        for queue, (sub_account, sub_mailbox) in list(self._subscribers.items()):
+            if account is not None and sub_account is not None and sub_account != account:
+                continue
+            if mailbox is not None and sub_mailbox is not None and sub_mailbox != mailbox:
+                continue
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+
+# Globale Broadcaster-Instanz
+broadcaster = EventBroadcaster()
@@ -0,0 +1,86 @@
+# accounts.py
+# Konfiguration der überwachten IMAP-Konten und Postfächer
+import json
+import os
+from typing import Dict, List, NamedTuple
+from app.core.config import (
+    IMAP_ACCOUNTS_FILE, IMAP_HOST, IMAP_PORT, IMAP_USER, IMAP_PASSWORD,
+    IMAP_MAILBOXES, IMAP_POOL_SIZE, logger
+)
+
+DEFAULT_ACCOUNT_NAME = "default"
+
+
+class Account(NamedTuple):
+    """Ein IMAP-Konto mit den zu überwachenden Postfächern und seinem Verbindungslimit."""
+    name: str
+    host: str
+    port: int
+    user: str
+    password: str
+    mailboxes: List[str]
+    max_connections: int
+
+
+def _account_from_dict(entry: Dict) -> Account:
+    # Passwörter bevorzugt per Umgebungsvariable, damit die Datei keine Geheimnisse enthält
+    password = os.getenv(entry["password_env"]) if entry.get("password_env") else entry.get("password")
+    return Account(
+        name=str(entry["name"]),
+        host=entry.get("host", IMAP_HOST),
+        port=int(entry.get("port", IMAP_PORT)),
+        user=entry["user"],
+        password=password or "",
+        mailboxes=list(entry.get("mailboxes") or ["INBOX"]),
+        max_connections=max(1, int(entry.get("max_connections", IMAP_POOL_SIZE))),
+    )
+
+
+def load_accounts() -> Dict[str, Account]:
+    """
+    Lädt die Konten aus IMAP_ACCOUNTS_FILE (JSON-Liste), z.B.:
+      [{"name": "support", "host": "imap.example.com", "user": "support@example.com",
+        "password_env": "SUPPORT_IMAP_PASSWORD", "mailboxes": ["INBOX", "Spam"], "max_connections": 2}]
+    Ohne Datei wird wie bisher das Konto aus IMAP_HOST/IMAP_USER/IMAP_PASSWORD verwendet.
+    """
+    if IMAP_ACCOUNTS_FILE:
+        with open(IMAP_ACCOUNTS_FILE, encoding="utf-8") as f:
+            entries = json.load(f)
+        result: Dict[str, Account] = {}
+        for entry in entries:
+            account = _account_from_dict(entry)
+            if account.name in result:
+                raise ValueError(f"Konto '{account.name}' ist in {IMAP_ACCOUNTS_FILE} doppelt konfiguriert")
+            result[account.name] = account
+        if not result:
+            raise ValueError(f"{IMAP_ACCOUNTS_FILE} enthält keine Konten")
+        logger.info("%d IMAP-Konten mit %d Postfächern konfiguriert.",
+                    len(result), sum(len(a.mailboxes) for a in result.values()))
+        return result
+    return {
+        DEFAULT_ACCOUNT_NAME: Account(
+            name=DEFAULT_ACCOUNT_NAME,
+            host=IMAP_HOST,
+            port=IMAP_PORT,
+            user=IMAP_USER,
+            password=IMAP_PASSWORD,
+            mailboxes=IMAP_MAILBOXES,
+            max_connections=max(1, IMAP_POOL_SIZE),
+        )
+    }
+
+
+# Alle konfigurierten Konten; das erste ist Standard für Anfragen ohne Kontoangabe
+accounts: Dict[str, Account] = load_accounts()
+default_account: str = next(iter(accounts))
+
+
+def get_account(name: str) -> Account:
+    """Gibt das Konto zurück oder wirft KeyError, wenn es nicht konfiguriert ist."""
+    if name not in accounts:
+        raise KeyError(f"Unbekanntes Konto: {name}")
+    return accounts[name]
+
+
+def is_monitored(account: str, mailbox: str) -> bool:
+    return account in accounts and mailbox in accounts[account].mailboxes
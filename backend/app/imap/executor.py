@@ -0,0 +1,36 @@
+# executor.py
+# Führt blockierende imaplib-Aufrufe außerhalb des asyncio-Event-Loops aus
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from app.core.config import IMAP_EXECUTOR_WORKERS, IMAP_OPERATION_TIMEOUT, logger
+from app.imap.accounts import accounts
+
+T = TypeVar("T")
+
+# Begrenzter, dedizierter Thread-Pool: mehr gleichzeitige IMAP-Operationen als
+# Sitzungen in allen Pools würden ohnehin nur auf eine freie Sitzung warten.
+_workers = IMAP_EXECUTOR_WORKERS or sum(account.max_connections for account in accounts.values())
+_executor = ThreadPoolExecutor(max_workers=max(1, _workers), thread_name_prefix="imap")
+
+
+async def run_imap(func: Callable[..., T], *args: Any,
+                   timeout: Optional[float] = IMAP_OPERATION_TIMEOUT, **kwargs: Any) -> T:
+    """
+    Führt eine blockierende IMAP-Funktion im IMAP-Thread-Pool aus.
+    Nach `timeout` Sekunden wird asyncio.TimeoutError ausgelöst; der Thread selbst
+    endet spätestens mit dem Socket-Timeout der Sitzung (IMAP_CONNECT_TIMEOUT).
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        logger.error("IMAP-Operation %s nach %ss abgebrochen.", getattr(func, "__name__", func), timeout)
+        raise
+
+
+def shutdown_executor() -> None:
+    """Beendet den Thread-Pool, ohne auf hängende Operationen zu warten."""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,37 +1,303 @@
 # fetcher.py
 # Holt E-Mails via IMAP 
-import imaplib
 import email
-from email.header import decode_header
-from typing import List, Tuple
-from app.core.config import IMAP_HOST, IMAP_PORT, IMAP_USER, IMAP_PASSWORD, logger
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from app.core.config import IMAP_FETCH_MODE, SYNC_INITIAL_LIMIT, logger
+from app.imap.pool import imap_pools, PooledIMAPConnection
+from app.imap.parser import parse_fetch_response
+from app.imap.lazy import LazyMessage
+from app.imap.keys import MessageKey, UidValidityError, check_uidvalidity
 
+MessageLike = Union[email.message.Message, LazyMessage]
 
-def fetch_latest_emails(limit: int = 5) -> List[Tuple[bytes, email.message.Message]]:
+
+def _body_items(sections: List[str]) -> str:
+    # BODY.PEEK setzt im Gegensatz zu RFC822/BODY[] kein \Seen-Flag
+    return " ".join(f"BODY.PEEK[{section}]" for section in sections)
+
+
+def load_sections(uid: bytes, sections: List[str], mailbox: str = 'INBOX', uidvalidity: int = 0,
+                  account: Optional[str] = None) -> Dict[str, bytes]:
     """
-    Holt die letzten N E-Mails aus dem Posteingang per IMAP.
-    Gibt eine Liste von (UID, Message) zurück.
+    Lädt einzelne Abschnitte einer Nachricht (z.B. "1", "2.1", "" für alles) per UID FETCH.
+    Mit uidvalidity wird geprüft, dass die UID noch dieselbe Nachricht bezeichnet.
     """
-    emails = []
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT)
-        mail.login(IMAP_USER, IMAP_PASSWORD)
-        mail.select('INBOX')
-        result, data = mail.search(None, 'ALL')
+    def op(conn: PooledIMAPConnection) -> Dict[str, bytes]:
+        mail = conn.select(mailbox)
+        check_uidvalidity(mailbox, uidvalidity, conn.uidvalidity)
+        result, data = mail.uid('fetch', uid, f"({_body_items(sections)})")
         if result != 'OK':
-            logger.warning("IMAP search failed: %s", result)
-            mail.logout()
-            return []
-        mail_ids = data[0].split()
-        latest_ids = mail_ids[-limit:]
-        for num in latest_ids:
-            result, msg_data = mail.fetch(num, '(RFC822)')
-            if result != 'OK':
-                logger.warning("IMAP fetch failed for UID %s: %s", num, result)
+            raise LookupError(f"UID FETCH für {uid!r} fehlgeschlagen: {result}")
+        loaded: Dict[str, bytes] = {}
+        for _, items in parse_fetch_response(data):
+            for section in sections:
+                value = items.get(f"BODY[{section}]")
+                if isinstance(value, bytes):
+                    loaded[section] = value
+        return loaded
+
+    return imap_pools.run(account, op)
+
+
+def _prefetch_text_parts(mail, messages: List[LazyMessage]) -> None:
+    """
+    Lädt die Text-/HTML-Teile aller Nachrichten vorab, je ein UID FETCH pro
+    gleicher Abschnittsliste. Anhänge werden nie übertragen.
+    """
+    groups: Dict[Tuple[str, ...], List[LazyMessage]] = defaultdict(list)
+    for msg in messages:
+        sections = tuple(msg.text_sections())
+        if sections:
+            groups[sections].append(msg)
+
+    for sections, group in groups.items():
+        by_uid = {msg.uid.decode(): msg for msg in group}
+        uid_set = ",".join(by_uid)
+        result, data = mail.uid('fetch', uid_set, f"({_body_items(list(sections))})")
+        if result != 'OK':
+            logger.warning("IMAP-Vorabruf der Textteile fehlgeschlagen: %s", result)
+            continue
+        for _, items in parse_fetch_response(data):
+            msg = by_uid.get(items.get("UID"))
+            if msg is None:
                 continue
-            msg = email.message_from_bytes(msg_data[0][1])
-            emails.append((num, msg))
-        mail.logout()
+            msg.set_sections({
+                section: items[f"BODY[{section}]"]
+                for section in sections
+                if isinstance(items.get(f"BODY[{section}]"), bytes)
+            })
+
+
+def _fetch_items(mail, message_set: str, items: str, by_uid: bool):
+    if by_uid:
+        return mail.uid('fetch', message_set, items)
+    return mail.fetch(message_set, items)
+
+
+def _fetch_full(mail, message_set: str, by_uid: bool = False) -> List[Tuple[bytes, MessageLike]]:
+    result, data = _fetch_items(mail, message_set, '(UID BODY.PEEK[])', by_uid)
+    if result != 'OK':
+        logger.warning("IMAP fetch failed for %s: %s", message_set, result)
+        return []
+    emails = []
+    for _, items in parse_fetch_response(data):
+        uid = items.get("UID")
+        raw = items.get("BODY[]")
+        if uid is None or not isinstance(raw, bytes):
+            continue
+        msg = email.message_from_bytes(raw)
+        # Originalbytes für die Analyse im Prozess-Pool (as_bytes() normalisiert Zeilenenden)
+        msg.raw_bytes = raw
+        emails.append((uid.encode(), msg))
+    return emails
+
+
+def _fetch_partial(conn: PooledIMAPConnection, message_set: str, mailbox: str,
+                   by_uid: bool = False) -> List[Tuple[bytes, MessageLike]]:
+    mail, account, uidvalidity = conn.mail, conn.account, conn.uidvalidity
+    result, data = _fetch_items(mail, message_set, '(UID BODYSTRUCTURE BODY.PEEK[HEADER])', by_uid)
+    if result != 'OK':
+        logger.warning("IMAP fetch failed for %s: %s", message_set, result)
+        return []
+    emails = []
+    for _, items in parse_fetch_response(data):
+        uid = items.get("UID")
+        header = items.get("BODY[HEADER]")
+        structure = items.get("BODYSTRUCTURE")
+        if uid is None or not isinstance(header, bytes) or not isinstance(structure, list):
+            continue
+        uid_bytes = uid.encode()
+        loader = lambda sections, uid_bytes=uid_bytes: load_sections(uid_bytes, sections, mailbox, uidvalidity, account)
+        emails.append((uid_bytes, LazyMessage(uid_bytes, header, structure, loader)))
+    _prefetch_text_parts(mail, [msg for _, msg in emails])
+    return emails
+
+
+def _fetch(conn: PooledIMAPConnection, limit: int, mailbox: str) -> List[Tuple[MessageKey, MessageLike]]:
+    # SELECT immer neu senden, damit EXISTS/UIDNEXT aktuell sind
+    mail = conn.select(mailbox, refresh=True)
+    if conn.exists == 0 or limit <= 0:
+        return []
+    # Die letzten N Nachrichten über den Sequenzbereich aus EXISTS in einem einzigen FETCH;
+    # die UIDs werden mitgeliefert, ein SEARCH ALL über das ganze Postfach entfällt.
+    # Sequenznummern dienen nur der Auswahl, nach außen gehen ausschließlich UIDs.
+    first = max(1, conn.exists - limit + 1)
+    return _fetch_set(conn, f"{first}:{conn.exists}", mailbox, by_uid=False)
+
+
+def _fetch_set(conn: PooledIMAPConnection, message_set: str, mailbox: str,
+               by_uid: bool) -> List[Tuple[MessageKey, MessageLike]]:
+    if IMAP_FETCH_MODE == 'full':
+        emails = _fetch_full(conn.mail, message_set, by_uid)
+    else:
+        emails = _fetch_partial(conn, message_set, mailbox, by_uid)
+    # Reihenfolge wie bisher: aufsteigend, neueste E-Mail zuletzt
+    keyed = [(MessageKey(conn.account, mailbox, conn.uidvalidity, int(uid)), msg) for uid, msg in emails]
+    keyed.sort(key=lambda item: item[0].uid)
+    return keyed
+
+
+def fetch_latest_emails(limit: int = 5, mailbox: str = 'INBOX',
+                        account: Optional[str] = None) -> List[Tuple[MessageKey, MessageLike]]:
+    """
+    Holt die letzten N E-Mails eines Postfachs per IMAP.
+    Gibt eine Liste von (MessageKey, Message) zurück; im Modus "partial" sind die Nachrichten
+    LazyMessage-Objekte, die Anhänge erst bei Bedarf nachladen.
+    """
+    try:
+        return imap_pools.run(account, lambda conn: _fetch(conn, limit, mailbox))
     except Exception as e:
         logger.error("Fehler beim Abrufen der E-Mails: %s", e)
-    return emails 
\ No newline at end of file
+        return []
+
+
+def fetch_emails_by_uid(uids: List[bytes], mailbox: str = 'INBOX', uidvalidity: int = 0,
+                        account: Optional[str] = None) -> List[Tuple[MessageKey, MessageLike]]:
+    """
+    Holt bestimmte Nachrichten per UID in einem einzigen UID FETCH.
+    Stammen die UIDs aus einer anderen UIDVALIDITY-Epoche, wird nichts geladen.
+    """
+    if not uids:
+        return []
+    uid_set = ",".join(uid.decode() if isinstance(uid, bytes) else str(uid) for uid in uids)
+
+    def op(conn: PooledIMAPConnection) -> List[Tuple[MessageKey, MessageLike]]:
+        # Neu gemeldete Nachrichten sind einer bereits ausgewählten Sitzung evtl. noch unbekannt
+        conn.select(mailbox, refresh=True)
+        check_uidvalidity(mailbox, uidvalidity, conn.uidvalidity)
+        return _fetch_set(conn, uid_set, mailbox, by_uid=True)
+
+    try:
+        return imap_pools.run(account, op)
+    except Exception as e:
+        logger.error("Fehler beim Abrufen der E-Mails %s: %s", uid_set, e)
+        return []
+
+
+def _uids_from_fetch(data) -> Set[int]:
+    return {
+        int(items["UID"]) for _, items in parse_fetch_response(data)
+        if str(items.get("UID", "")).isdigit()
+    }
+
+
+def _changed_since(mail, first_uid: int, modseq: int) -> Optional[Tuple[Set[int], Set[int]]]:
+    """
+    CONDSTORE: UIDs ab `first_uid`, die sich seit `modseq` geändert haben (neu oder geänderte
+    Flags), und davon die als \\Deleted markierten; None, wenn der Server die Abfrage ablehnt.
+    """
+    result, data = mail.uid('fetch', f"{first_uid}:*", f"(UID FLAGS) (CHANGEDSINCE {modseq})")
+    if result != 'OK':
+        return None
+    changed: Set[int] = set()
+    deleted: Set[int] = set()
+    for _, items in parse_fetch_response(data):
+        if not str(items.get("UID", "")).isdigit():
+            continue
+        uid = int(items["UID"])
+        changed.add(uid)
+        flags = items.get("FLAGS") or []
+        if any(str(flag).lower() == "\\deleted" for flag in (flags if isinstance(flags, list) else [flags])):
+            deleted.add(uid)
+    return changed, deleted
+
+
+def _fetch_changes(conn: PooledIMAPConnection, mailbox: str, state: Optional[Dict[str, int]],
+                   known: Set[int], want: int) -> Dict[str, Any]:
+    mail = conn.select(mailbox, refresh=True)
+    reset = state is None or state["uidvalidity"] != conn.uidvalidity
+    last_uid = 0 if reset else state["last_uid"]
+    if reset:
+        known = set()
+        want = max(want, SYNC_INITIAL_LIMIT)
+    changes: Dict[str, Any] = {
+        "reset": reset,
+        "uidvalidity": conn.uidvalidity,
+        "uidnext": conn.uidnext,
+        "exists": conn.exists,
+        "highestmodseq": conn.highestmodseq,
+        "last_uid": last_uid,
+        "messages": [],
+        "removed": [],
+    }
+    # Nichts geändert: gleiche UIDNEXT/EXISTS (und HIGHESTMODSEQ bei CONDSTORE), genug Nachrichten bekannt
+    unchanged = (not reset and conn.uidnext == state["uidnext"] and conn.exists == state["exists"]
+                 and conn.highestmodseq == state["highestmodseq"])
+    if conn.exists == 0 or (unchanged and len(known) >= min(want, conn.exists)):
+        return changes
+
+    candidates: Set[int] = set()
+    deleted: Set[int] = set()
+    new_count = 0
+    # Mit CONDSTORE nur die seit dem letzten HIGHESTMODSEQ geänderten Nachrichten abfragen: neue
+    # UIDs und Flag-Änderungen (\Deleted) der bekannten, ohne das Postfach erneut zu durchsuchen
+    changed = None
+    if not reset and conn.highestmodseq and state["highestmodseq"] and conn.highestmodseq != state["highestmodseq"]:
+        changed = _changed_since(mail, min(known) if known else last_uid + 1, state["highestmodseq"])
+    if changed is not None:
+        new_uids = {uid for uid in changed[0] if uid > last_uid}
+        new_count = len(new_uids)
+        candidates |= new_uids
+        deleted = changed[1] & known
+    # Neue Nachrichten oberhalb der Hochwassermarke
+    elif not reset and conn.uidnext > last_uid + 1:
+        result, data = mail.uid('fetch', f"{last_uid + 1}:*", '(UID)')
+        if result == 'OK':
+            # "n:*" liefert immer mindestens die letzte Nachricht, auch wenn ihre UID kleiner ist
+            new_uids = {uid for uid in _uids_from_fetch(data) if uid > last_uid}
+            new_count = len(new_uids)
+            candidates |= new_uids
+    # Die neuesten `want` Nachrichten sollen analysiert vorliegen (Erst-Sync oder größeres Limit)
+    if want > 0 and len(known) < min(want, conn.exists):
+        first = max(1, conn.exists - want + 1)
+        result, data = mail.fetch(f"{first}:{conn.exists}", '(UID)')
+        if result == 'OK':
+            candidates |= _uids_from_fetch(data)
+    if candidates:
+        changes["last_uid"] = max(last_uid, max(candidates))
+
+    # Weniger Nachrichten als erwartet: gelöschte UIDs unter den bekannten ermitteln (Expunges
+    # meldet CHANGEDSINCE ohne QRESYNC nicht)
+    if not reset and known and conn.exists < state["exists"] + new_count:
+        result, data = mail.uid('search', None, f"UID {min(known)}:{max(known)}")
+        if result == 'OK':
+            present = {int(uid) for uid in b" ".join(d for d in data if d).split()}
+            deleted |= known - present
+    changes["removed"] = [MessageKey(conn.account, mailbox, conn.uidvalidity, uid) for uid in sorted(deleted)]
+
+    missing = sorted(candidates - known)
+    if missing:
+        changes["messages"] = _fetch_set(conn, ",".join(map(str, missing)), mailbox, by_uid=True)
+    return changes
+
+
+def fetch_changes(mailbox: str, state: Optional[Dict[str, int]], known: Set[int],
+                  want: int = 0, account: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ermittelt die Änderungen eines Postfachs seit dem gespeicherten Sync-Stand.
+    Geladen werden nur Nachrichten, deren UID noch nicht bekannt ist: neue UIDs oberhalb
+    der Hochwassermarke und – falls weniger als `want` bekannt sind – die neuesten `want`.
+    Unterstützt der Server CONDSTORE, werden neue und als \\Deleted markierte Nachrichten per
+    UID FETCH (CHANGEDSINCE <HIGHESTMODSEQ des letzten Syncs>) ermittelt.
+    Bei neuer UIDVALIDITY (reset=True) beginnt der Sync mit den neuesten SYNC_INITIAL_LIMIT Nachrichten.
+    """
+    return imap_pools.run(account, lambda conn: _fetch_changes(conn, mailbox, state, known, want))
+
+
+def fetch_header(uid: bytes, mailbox: str = 'INBOX', uidvalidity: int = 0,
+                 account: Optional[str] = None) -> Optional[email.message.Message]:
+    """
+    Holt nur den Header einer Nachricht per UID (ohne \\Seen zu setzen).
+    Wirft UidValidityError, wenn die UID zu einer veralteten UIDVALIDITY gehört.
+    """
+    try:
+        sections = load_sections(uid, ["HEADER"], mailbox, uidvalidity, account)
+    except UidValidityError:
+        raise
+    except LookupError as e:
+        logger.warning("%s", e)
+        return None
+    if "HEADER" not in sections:
+        return None
+    return email.message_from_bytes(sections["HEADER"])
@@ -0,0 +1,212 @@
+# idle.py
+# Überwacht ein Postfach per IMAP IDLE (Fallback: NOOP-Polling)
+import imaplib
+import re
+import select
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.core.config import IMAP_CONNECT_TIMEOUT, IMAP_IDLE_TIMEOUT, IMAP_POLL_INTERVAL, logger
+from app.imap.accounts import Account
+from app.imap.pool import PooledIMAPConnection, connection_for
+from app.imap.parser import parse_fetch_response
+
+_UNTAGGED_RE = re.compile(rb"^\* (\d+) (EXISTS|EXPUNGE)", re.IGNORECASE)
+
+# Wie oft (Sekunden) während IDLE auf das Stop-Signal geprüft wird
+_STOP_CHECK_SECONDS = 1.0
+
+
+def _readline(mail: imaplib.IMAP4, timeout: float) -> Optional[bytes]:
+    """
+    Liest die nächste Antwortzeile über imaplib (mail._get_line), damit bereits gepufferte
+    Antworten nicht verloren gehen und nach IDLE nichts im Socket zurückbleibt. Ein Timeout
+    auf der gepufferten Datei würde sie unbrauchbar machen; daher wird erst geprüft, ob
+    Daten vorliegen (imaplib-Puffer, dann select auf den Socket). None = nichts innerhalb
+    von `timeout` Sekunden.
+    """
+    sock = mail.sock
+    sock.settimeout(0)
+    try:
+        # peek liest ohne zu blockieren: gepufferte Bytes oder sofort verfügbare Daten
+        ready = bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        ready = False
+    finally:
+        sock.settimeout(IMAP_CONNECT_TIMEOUT)
+    if not ready and not select.select([sock], [], [], timeout)[0]:
+        return None
+    return mail._get_line()
+
+
+class IdleWatcher:
+    """
+    Hält eine eigene IMAP-Sitzung auf einem Postfach und meldet Änderungen über on_event
+    (jedes Ereignis enthält zusätzlich "account" und "mailbox"):
+      {"type": "new", "uidvalidity", "uids": [b"..."], "exists"} bei neuen Nachrichten,
+      {"type": "expunge", "exists"} bei gelöschten Nachrichten,
+      {"type": "error", "error"} bei Verbindungsproblemen.
+    Der Callback wird im Watcher-Thread aufgerufen.
+    """
+
+    def __init__(self, account: Account, mailbox: str, on_event: Callable[[Dict[str, Any]], None],
+                 idle_timeout: int = IMAP_IDLE_TIMEOUT, poll_interval: int = IMAP_POLL_INTERVAL):
+        self.account = account
+        self.mailbox = mailbox
+        self.on_event = on_event
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.last_uid = 0
+        self.uidvalidity = 0
+        self.exists = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"imap-idle-{self.account.name}-{self.mailbox}", daemon=True)
+        self._thread.start()
+        logger.info("IDLE-Watcher für %s/%s gestartet.", self.account.name, self.mailbox)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        event["account"] = self.account.name
+        event["mailbox"] = self.mailbox
+        try:
+            self.on_event(event)
+        except Exception as e:
+            logger.error("Fehler im IDLE-Event-Callback: %s", e)
+
+    def _run(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            conn = connection_for(self.account)
+            try:
+                conn.connect()
+                backoff = 1
+                self._watch(conn)
+            except Exception as e:
+                logger.warning("IDLE-Watcher für %s/%s unterbrochen: %s", self.account.name, self.mailbox, e)
+                self._emit({"type": "error", "error": str(e)})
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 300)
+            finally:
+                conn.close()
+
+    def _watch(self, conn: PooledIMAPConnection) -> None:
+        conn.select(self.mailbox, readonly=True)
+        if conn.uidvalidity != self.uidvalidity:
+            # Erster Start oder UIDVALIDITY gewechselt: ab jetzt neue UIDs melden
+            self.uidvalidity = conn.uidvalidity
+            self.last_uid = max(0, conn.uidnext - 1)
+        else:
+            # Nach einem Reconnect verpasste Nachrichten nachholen
+            self._check_new(conn)
+        self.exists = conn.exists
+        supports_idle = "IDLE" in conn.mail.capabilities
+
+        while not self._stop.is_set():
+            if supports_idle:
+                exists, expunged = self._idle(conn.mail)
+            else:
+                exists, expunged = self._poll(conn)
+            if expunged:
+                self.exists = exists if exists is not None else max(0, self.exists - expunged)
+                self._emit({"type": "expunge", "exists": self.exists})
+            if exists is not None:
+                self.exists = exists
+                self._check_new(conn)
+
+    def _check_new(self, conn: PooledIMAPConnection) -> None:
+        """Ermittelt UIDs oberhalb der zuletzt gesehenen UID mit einem UID FETCH."""
+        result, data = conn.mail.uid('fetch', f"{self.last_uid + 1}:*", '(UID)')
+        if result != 'OK':
+            logger.warning("UID FETCH nach neuen Nachrichten fehlgeschlagen: %s", result)
+            return
+        # "n:*" liefert immer mindestens die letzte Nachricht, auch wenn ihre UID kleiner ist
+        uids = sorted(
+            int(items["UID"]) for _, items in parse_fetch_response(data)
+            if str(items.get("UID", "")).isdigit() and int(items["UID"]) > self.last_uid
+        )
+        if not uids:
+            return
+        self.last_uid = uids[-1]
+        self._emit({
+            "type": "new",
+            "uidvalidity": self.uidvalidity,
+            "uids": [str(uid).encode() for uid in uids],
+            "exists": self.exists
+        })
+
+    def _poll(self, conn: PooledIMAPConnection) -> Tuple[Optional[int], int]:
+        self._stop.wait(self.poll_interval)
+        conn.mail.noop()
+        _, exists = conn.mail.response('EXISTS')
+        _, expunged = conn.mail.response('EXPUNGE')
+        latest = int(exists[-1]) if exists and exists[-1] is not None else None
+        return latest, len([e for e in expunged or [] if e is not None])
+
+    def _idle(self, mail: imaplib.IMAP4) -> Tuple[Optional[int], int]:
+        """
+        Sendet IDLE und wartet auf EXISTS/EXPUNGE, das Stop-Signal oder den IDLE-Timeout.
+        Gibt (letzter EXISTS-Wert oder None, Anzahl EXPUNGE) zurück.
+        """
+        # Von imaplib bei früheren Befehlen bereits gelesene Meldungen zuerst auswerten
+        _, pending_exists = mail.response('EXISTS')
+        _, pending_expunged = mail.response('EXPUNGE')
+        pending_exists = [e for e in pending_exists or [] if e is not None]
+        pending_expunged = [e for e in pending_expunged or [] if e is not None]
+        if pending_exists or pending_expunged:
+            return (int(pending_exists[-1]) if pending_exists else None), len(pending_expunged)
+
+        original_timeout = mail.sock.gettimeout()
+        tag = mail._new_tag()
+        exists: Optional[int] = None
+        expunged = 0
+
+        def record(line: bytes) -> None:
+            nonlocal exists, expunged
+            match = _UNTAGGED_RE.match(line)
+            if match:
+                if match.group(2).upper() == b"EXISTS":
+                    exists = int(match.group(1))
+                else:
+                    expunged += 1
+            elif line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort(line.decode(errors="replace"))
+
+        try:
+            mail.send(tag + b" IDLE\r\n")
+            line = _readline(mail, IMAP_CONNECT_TIMEOUT)
+            # Vor der Fortsetzungsanfrage können bereits ungetaggte Antworten kommen
+            while line is not None and line.startswith(b"* "):
+                record(line)
+                line = _readline(mail, IMAP_CONNECT_TIMEOUT)
+            if line is None or not line.startswith(b"+"):
+                raise imaplib.IMAP4.error(f"IDLE abgelehnt: {line!r}")
+
+            deadline = time.monotonic() + self.idle_timeout
+            while not self._stop.is_set() and time.monotonic() < deadline and exists is None and not expunged:
+                line = _readline(mail, _STOP_CHECK_SECONDS)
+                if line is not None:
+                    record(line)
+
+            mail.send(b"DONE\r\n")
+            while True:
+                line = _readline(mail, IMAP_CONNECT_TIMEOUT)
+                if line is None:
+                    raise imaplib.IMAP4.abort("Keine Antwort auf DONE")
+                if line.startswith(tag):
+                    if b" OK" not in line[:len(tag) + 4]:
+                        raise imaplib.IMAP4.error(line.decode(errors="replace"))
+                    break
+                record(line)
+        finally:
+            mail.tagged_commands.pop(tag, None)
+            mail.sock.settimeout(original_timeout)
+        return exists, expunged
@@ -0,0 +1,38 @@
+# keys.py
+# Stabile Nachrichtenschlüssel (Konto, Postfach, UIDVALIDITY, UID)
+from typing import NamedTuple
+
+
+class MessageKey(NamedTuple):
+    """
+    Identifiziert eine Nachricht dauerhaft. Anders als Sequenznummern bleibt eine UID
+    nach EXPUNGE gültig; ändert der Server die UIDVALIDITY, sind alle alten Schlüssel
+    des Postfachs ungültig.
+    """
+    account: str
+    mailbox: str
+    uidvalidity: int
+    uid: int
+
+    def __str__(self) -> str:
+        return f"{self.account}:{self.mailbox}/{self.uidvalidity}/{self.uid}"
+
+    @property
+    def uid_bytes(self) -> bytes:
+        return str(self.uid).encode()
+
+
+class UidValidityError(LookupError):
+    """Die UIDVALIDITY des Postfachs passt nicht (mehr) zur angefragten UID."""
+
+    def __init__(self, mailbox: str, expected: int, actual: int):
+        super().__init__(f"UIDVALIDITY von {mailbox} ist {actual}, erwartet {expected}")
+        self.mailbox = mailbox
+        self.expected = expected
+        self.actual = actual
+
+
+def check_uidvalidity(mailbox: str, expected: int, actual: int) -> None:
+    """Wirft UidValidityError bei Abweichung; expected=0 bedeutet keine Prüfung."""
+    if expected and actual and expected != actual:
+        raise UidValidityError(mailbox, expected, actual)
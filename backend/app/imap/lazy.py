@@ -0,0 +1,260 @@
+# lazy.py
+# Nachrichten, deren Inhalte erst bei Bedarf per IMAP nachgeladen werden
+import binascii
+import email
+import quopri
+from email.message import Message
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import unquote
+
+# Lädt Abschnitte (z.B. "1", "2.1" oder "" für die ganze Nachricht) einer Nachricht nach
+SectionLoader = Callable[[List[str]], Dict[str, bytes]]
+
+TEXT_SUBTYPES = ("plain", "html")
+
+
+def _s(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _param_dict(params: Any) -> Dict[str, str]:
+    """Wandelt eine BODYSTRUCTURE-Parameterliste ("NAME" "wert" ...) in ein dict."""
+    result: Dict[str, str] = {}
+    if not isinstance(params, list):
+        return result
+    for i in range(0, len(params) - 1, 2):
+        key = _s(params[i]).lower()
+        value = _s(params[i + 1])
+        if key.endswith("*"):
+            # RFC 2231: charset'sprache'prozent-kodierter-wert
+            charset, _, rest = value.partition("'")
+            _, _, encoded = rest.partition("'")
+            key = key[:-1]
+            value = unquote(encoded or value, encoding=charset or "utf-8", errors="replace")
+        result[key] = value
+    return result
+
+
+def decode_transfer_encoding(raw: bytes, encoding: str) -> bytes:
+    """Dekodiert base64/quoted-printable wie Message.get_payload(decode=True)."""
+    encoding = (encoding or "").lower()
+    if encoding == "base64":
+        try:
+            return binascii.a2b_base64(raw)
+        except binascii.Error:
+            return raw
+    if encoding == "quoted-printable":
+        return quopri.decodestring(raw)
+    return raw
+
+
+class LazyPart:
+    """
+    Ein MIME-Teil, beschrieben durch BODYSTRUCTURE.
+    Bietet die von den Analysen genutzte Teilmenge der email.message.Message-API;
+    der Inhalt wird erst beim ersten get_payload() geladen.
+    """
+
+    def __init__(self, message: "LazyMessage", section: str, maintype: str, subtype: str,
+                 params: Dict[str, str], encoding: str = "", size: int = 0,
+                 disposition: Optional[str] = None, disposition_params: Optional[Dict[str, str]] = None,
+                 subparts: Optional[List["LazyPart"]] = None):
+        self._message = message
+        self.section = section
+        self.maintype = maintype
+        self.subtype = subtype
+        self.params = params
+        self.encoding = encoding
+        self.size = size
+        self.disposition = disposition
+        self.disposition_params = disposition_params or {}
+        self.subparts = subparts
+
+    def is_multipart(self) -> bool:
+        return self.subparts is not None and self.maintype == "multipart"
+
+    def get_content_type(self) -> str:
+        return f"{self.maintype}/{self.subtype}"
+
+    def get_content_maintype(self) -> str:
+        return self.maintype
+
+    def get_content_subtype(self) -> str:
+        return self.subtype
+
+    def get_content_charset(self, failobj: Any = None) -> Any:
+        return self.params.get("charset", failobj)
+
+    def get_content_disposition(self) -> Optional[str]:
+        return self.disposition
+
+    def get_filename(self, failobj: Any = None) -> Any:
+        return self.disposition_params.get("filename") or self.params.get("name") or failobj
+
+    def get_payload(self, decode: bool = False) -> Any:
+        if self.subparts is not None:
+            return None if decode else list(self.subparts)
+        raw = self._message.load_section(self.section)
+        if decode:
+            return decode_transfer_encoding(raw, self.encoding)
+        return raw.decode("ascii", errors="surrogateescape")
+
+    def walk(self) -> Iterator["LazyPart"]:
+        yield self
+        for part in self.subparts or []:
+            yield from part.walk()
+
+    def is_text_body(self) -> bool:
+        """Text- oder HTML-Teil, der kein Anhang ist."""
+        return (self.maintype == "text" and self.subtype in TEXT_SUBTYPES
+                and self.disposition != "attachment" and self.subparts is None)
+
+
+def _build_part(message: "LazyMessage", structure: List[Any], section: str, child_prefix: str) -> LazyPart:
+    if structure and isinstance(structure[0], list):
+        # multipart: (teil)(teil)... "SUBTYPE" (params) (disposition) ...
+        children = []
+        i = 0
+        while i < len(structure) and isinstance(structure[i], list):
+            number = f"{child_prefix}{i + 1}"
+            children.append(_build_part(message, structure[i], number, f"{number}."))
+            i += 1
+        ext = structure[i:]
+        subtype = _s(ext[0]).lower() if ext else "mixed"
+        params = _param_dict(ext[1]) if len(ext) > 1 else {}
+        disposition = ext[2] if len(ext) > 2 else None
+        return LazyPart(message, section, "multipart", subtype, params,
+                        disposition=_s(disposition[0]).lower() if isinstance(disposition, list) else None,
+                        disposition_params=_param_dict(disposition[1]) if isinstance(disposition, list) and len(disposition) > 1 else None,
+                        subparts=children)
+
+    maintype = _s(structure[0]).lower()
+    subtype = _s(structure[1]).lower()
+    params = _param_dict(structure[2])
+    encoding = _s(structure[5]).lower()
+    try:
+        size = int(structure[6])
+    except (TypeError, ValueError, IndexError):
+        size = 0
+    subparts = None
+    if maintype == "text":
+        ext = structure[8:]
+    elif maintype == "message" and subtype == "rfc822" and len(structure) > 8 and isinstance(structure[8], list):
+        subparts = [_build_part(message, structure[8], f"{section}.1", f"{section}.")]
+        ext = structure[10:]
+    else:
+        ext = structure[7:]
+    disposition = ext[1] if len(ext) > 1 else None
+    return LazyPart(message, section, maintype, subtype, params, encoding, size,
+                    disposition=_s(disposition[0]).lower() if isinstance(disposition, list) else None,
+                    disposition_params=_param_dict(disposition[1]) if isinstance(disposition, list) and len(disposition) > 1 else None,
+                    subparts=subparts)
+
+
+class LazyMessage:
+    """
+    E-Mail aus Header (BODY.PEEK[HEADER]) und BODYSTRUCTURE.
+    Verhält sich für die Analysen wie eine email.message.Message: Header stehen sofort bereit,
+    Teile werden erst bei Bedarf geladen und die vollständige Nachricht nur über as_message().
+    """
+
+    def __init__(self, uid: bytes, header: bytes, bodystructure: List[Any], loader: Optional[SectionLoader]):
+        self.uid = uid
+        self._header = header
+        self._structure = bodystructure
+        self._headers = email.message_from_bytes(header)
+        self._loader = loader
+        self._sections: Dict[str, bytes] = {}
+        self._full: Optional[Message] = None
+        self._root = _build_part(self, bodystructure, "1", "")
+
+    # Header-Zugriff wie bei email.message.Message
+    def get(self, name: str, failobj: Any = None) -> Any:
+        return self._headers.get(name, failobj)
+
+    def get_all(self, name: str, failobj: Any = None) -> Any:
+        return self._headers.get_all(name, failobj)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._headers[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._headers
+
+    def keys(self) -> List[str]:
+        return self._headers.keys()
+
+    def items(self) -> List[Any]:
+        return self._headers.items()
+
+    # Struktur-Zugriff über den Wurzelteil
+    def is_multipart(self) -> bool:
+        return self._root.is_multipart()
+
+    def walk(self) -> Iterator[LazyPart]:
+        return self._root.walk()
+
+    def get_payload(self, decode: bool = False) -> Any:
+        return self._root.get_payload(decode=decode)
+
+    def get_content_type(self) -> str:
+        return self._root.get_content_type()
+
+    def get_content_disposition(self) -> Optional[str]:
+        return self._root.get_content_disposition()
+
+    def get_filename(self, failobj: Any = None) -> Any:
+        return self._root.get_filename(failobj)
+
+    def text_sections(self) -> List[str]:
+        """Abschnittsnummern aller Text-/HTML-Teile, die keine Anhänge sind."""
+        return [part.section for part in self.walk() if part.is_text_body()]
+
+    def content_sections(self) -> List[str]:
+        """Abschnittsnummern aller Text-/HTML-Teile, die die Analysen lesen (auch Text-Anhänge)."""
+        return [part.section for part in self.walk()
+                if part.maintype == "text" and part.subtype in TEXT_SUBTYPES and part.subparts is None]
+
+    def missing_content_sections(self) -> List[str]:
+        return [section for section in self.content_sections() if section not in self._sections]
+
+    def load_content_sections(self) -> None:
+        """Lädt alle noch fehlenden Text-/HTML-Teile mit einem einzigen Aufruf des Loaders."""
+        missing = self.missing_content_sections()
+        if missing and self._loader is not None:
+            self._sections.update(self._loader(missing))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Serialisierbarer Stand (Header-Bytes, BODYSTRUCTURE, geladene Abschnitte) ohne Loader,
+        z.B. für die Übergabe an einen anderen Prozess; Gegenstück ist from_snapshot().
+        """
+        return {"uid": self.uid, "header": self._header, "bodystructure": self._structure,
+                "sections": dict(self._sections)}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "LazyMessage":
+        msg = cls(snapshot["uid"], snapshot["header"], snapshot["bodystructure"], None)
+        msg.set_sections(snapshot["sections"])
+        return msg
+
+    def set_sections(self, sections: Dict[str, bytes]) -> None:
+        """Übernimmt bereits geladene Abschnitte (z.B. aus einem Sammel-FETCH)."""
+        self._sections.update(sections)
+
+    def load_section(self, section: str) -> bytes:
+        if section not in self._sections:
+            if self._loader is None:
+                raise LookupError(f"Abschnitt {section} von UID {self.uid!r} nicht geladen")
+            self._sections.update(self._loader([section]))
+        return self._sections.get(section, b"")
+
+    def as_message(self) -> Message:
+        """Lädt die vollständige Nachricht (BODY.PEEK[]) und gibt sie als Message zurück."""
+        if self._full is None:
+            self._full = email.message_from_bytes(self.load_section(""))
+        return self._full
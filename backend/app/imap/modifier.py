@@ -1,35 +1,378 @@
 # modifier.py
-# Ändert Betreff/Label 
+# Ändert Betreff/Label: Betreff-Präfix, IMAP-Schlüsselwort oder Verschieben in einen Risiko-Ordner
 import imaplib
-from app.core.config import IMAP_HOST, IMAP_PORT, IMAP_USER, IMAP_PASSWORD, logger
-import email
-from typing import Union
+import re
+from email.header import Header
+from email.parser import BytesHeaderParser
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from app.analysis.parsed import decode_mime_header
+from app.core.config import IMAP_TAG_BATCH_SIZE, TAGGING_MODE, RISK_FOLDERS, logger
+from app.imap.pool import imap_pools, PooledIMAPConnection
+from app.imap.parser import parse_fetch_response
+from app.imap.keys import MessageKey, UidValidityError, check_uidvalidity
 
+_APPENDUID_RE = re.compile(rb"\[APPENDUID (\d+) ([\d:,]+)\]", re.IGNORECASE)
+_COPYUID_RE = re.compile(rb"\[COPYUID (\d+) ([\d:,]+) ([\d:,]+)\]", re.IGNORECASE)
+_HEADER_END_RE = re.compile(rb"\r?\n\r?\n")
+# Subject-Zeile inklusive gefalteter Folgezeilen
+_SUBJECT_RE = re.compile(rb"^subject:[^\n]*(?:\n[ \t][^\n]*)*", re.IGNORECASE | re.MULTILINE)
 
-def change_subject(uid: bytes, new_subject: str) -> bool:
+RISK_PREFIXES = {
+    "hoch": "[⚠️ Hochrisiko] ",
+    "mittel": "[Warnung] ",
+    "niedrig": "[Info] ",
+}
+
+
+# IMAP-Schlüsselwörter je Risikostufe (TAGGING_MODE=keyword/move); der Server muss
+# eigene Schlüsselwörter erlauben (PERMANENTFLAGS mit \\*)
+RISK_KEYWORDS = {
+    "hoch": "$SecureMailHigh",
+    "mittel": "$SecureMailMedium",
+    "niedrig": "$SecureMailLow",
+}
+
+
+def risk_prefix(risk: str) -> str:
+    """Betreff-Präfix zur Risikostufe (unbekannte Stufen wie "niedrig")."""
+    return RISK_PREFIXES.get(risk, RISK_PREFIXES["niedrig"])
+
+
+def has_risk_prefix(subject: str) -> bool:
+    return any((subject or "").startswith(prefix.strip()) for prefix in RISK_PREFIXES.values())
+
+
+def risk_keyword(risk: str) -> str:
+    """IMAP-Schlüsselwort zur Risikostufe (unbekannte Stufen wie "niedrig")."""
+    return RISK_KEYWORDS.get(risk, RISK_KEYWORDS["niedrig"])
+
+
+def existing_risk_keyword(flags) -> Optional[str]:
+    """Bereits gesetztes Risiko-Schlüsselwort einer Nachricht, sonst None."""
+    return next((keyword for keyword in RISK_KEYWORDS.values() if keyword in flags), None)
+
+
+class TagResult(NamedTuple):
+    key: MessageKey
+    success: bool
+    old_subject: Optional[str] = None
+    new_subject: Optional[str] = None
+    # Schlüssel der neu abgelegten bzw. verschobenen Nachricht, nur mit UIDPLUS bekannt;
+    # beim Schlüsselwort-Modus bleibt die Nachricht unverändert unter ihrem Schlüssel
+    new_key: Optional[MessageKey] = None
+    error: Optional[str] = None
+    # Gesetztes Schlüsselwort bzw. Zielordner
+    tag: Optional[str] = None
+
+    @property
+    def replaced(self) -> bool:
+        """Die ursprüngliche Nachricht existiert nach der Markierung nicht mehr unter ihrem Schlüssel."""
+        return self.success and self.new_key != self.key
+
+
+def _with_subject(raw_email: bytes, new_subject: str) -> bytes:
     """
-    Ändert den Betreff einer E-Mail per IMAP (Kopieren, Original löschen).
-    Gibt True bei Erfolg, False bei Fehler.
+    Ersetzt den Betreff direkt in den Rohbytes, ohne die Nachricht zu parsen und neu zu
+    serialisieren: nur der Header-Block wird angefasst, der Body bleibt byte-genau erhalten.
     """
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT)
-        mail.login(IMAP_USER, IMAP_PASSWORD)
-        mail.select('INBOX')
-        result, data = mail.uid('fetch', uid, '(RFC822)')
+    match = _HEADER_END_RE.search(raw_email)
+    end = match.start() if match else len(raw_email)
+    header, body = raw_email[:end], raw_email[end:]
+    linesep = "\r\n" if b"\r\n" in header else "\n"
+    # Nicht-ASCII-Betreffe werden nach RFC 2047 kodiert und gefaltet
+    encoded = b"Subject: " + Header(new_subject, header_name="Subject").encode(linesep=linesep).encode("ascii")
+    subject = _SUBJECT_RE.search(header)
+    if subject is None:
+        return header + linesep.encode() + encoded + body
+    if subject.group().endswith(b"\r"):
+        encoded += b"\r"
+    return header[:subject.start()] + encoded + header[subject.end():] + body
+
+
+def _expand_uid_set(uid_set: bytes) -> List[int]:
+    """Wandelt eine UID-Menge aus einer Serverantwort ("5:7,9") in eine Liste."""
+    uids: List[int] = []
+    for part in uid_set.decode().split(","):
+        first, _, last = part.partition(":")
+        uids.extend(range(int(first), int(last or first) + 1))
+    return uids
+
+
+def _appended_uids(data) -> List[int]:
+    """Liest die UIDs der neu abgelegten Nachrichten aus der APPENDUID-Antwort (UIDPLUS)."""
+    for line in data or []:
+        match = _APPENDUID_RE.search(line if isinstance(line, bytes) else b"")
+        if match:
+            return _expand_uid_set(match.group(2))
+    return []
+
+
+def _copied_uids(mail, data) -> Tuple[int, Dict[int, int]]:
+    """
+    Liest UIDVALIDITY des Zielordners und {alte UID: neue UID} aus der COPYUID-Antwort
+    (UIDPLUS). Bei MOVE kommt sie als ungetaggte OK-Antwort, bei COPY in der getaggten.
+    """
+    _, codes = mail.response('COPYUID')
+    lines = [b"[COPYUID " + code + b"]" for code in codes if isinstance(code, bytes)] + list(data or [])
+    for line in lines:
+        match = _COPYUID_RE.search(line if isinstance(line, bytes) else b"")
+        if match:
+            source, target = _expand_uid_set(match.group(2)), _expand_uid_set(match.group(3))
+            if len(source) == len(target):
+                return int(match.group(1)), dict(zip(source, target))
+    return 0, {}
+
+
+def _subject_of(raw_email: bytes) -> str:
+    """Dekodierter Betreff aus den Rohbytes (nur der Header-Block wird geparst)."""
+    return decode_mime_header(BytesHeaderParser().parsebytes(raw_email).get("Subject", "") or "")
+
+
+class _MultiAppend:
+    """
+    Liefert imaplib die Literale einer MULTIAPPEND-Anfrage (RFC 3502) nacheinander:
+    jedes Literal endet mit der Größenangabe des nächsten, das letzte schließt den Befehl ab.
+    """
+
+    def __init__(self, messages: List[bytes]):
+        self.messages = messages
+        self.next = 0
+
+    def process(self, continuation) -> bytes:
+        message = self.messages[self.next]
+        self.next += 1
+        if self.next < len(self.messages):
+            return message + b" {%d}" % len(self.messages[self.next])
+        return message
+
+
+def _append_messages(mail, mailbox: str, messages: List[bytes]) -> List[Tuple[bool, Optional[int]]]:
+    """
+    Legt die Nachrichten im Postfach ab und gibt je Nachricht (Erfolg, neue UID) zurück.
+    Mit MULTIAPPEND in einem einzigen, atomaren Befehl, sonst je Nachricht ein APPEND.
+    """
+    messages = [imaplib.MapCRLF.sub(imaplib.CRLF, message) for message in messages]
+    if len(messages) > 1 and "MULTIAPPEND" in mail.capabilities:
+        # imaplib kennt kein MULTIAPPEND; wie bei AUTHENTICATE liefert ein Callback die Literale
+        mail.literal = _MultiAppend(messages).process
+        result, data = mail._simple_command('APPEND', mailbox, '{%d}' % len(messages[0]))
         if result != 'OK':
-            logger.warning("IMAP fetch failed for UID %s: %s", uid, result)
-            mail.logout()
-            return False
-        raw_email = data[0][1]
-        msg = email.message_from_bytes(raw_email)
-        msg.replace_header('Subject', new_subject)
-        mail.append('INBOX', '', None, msg.as_bytes())
-        mail.uid('store', uid, '+FLAGS', '\\Deleted')
+            logger.warning("MULTIAPPEND in %s fehlgeschlagen: %s", mailbox, data)
+            return [(False, None)] * len(messages)
+        new_uids = _appended_uids(data)
+        if len(new_uids) != len(messages):
+            new_uids = [None] * len(messages)
+        return [(True, uid) for uid in new_uids]
+
+    appended: List[Tuple[bool, Optional[int]]] = []
+    for message in messages:
+        result, data = mail.append(mailbox, '', None, message)
+        new_uids = _appended_uids(data) if result == 'OK' else []
+        appended.append((result == 'OK', new_uids[0] if new_uids else None))
+    return appended
+
+
+def _delete_uids(mail, uid_set: str) -> None:
+    """Markiert die UIDs als gelöscht und entfernt nur diese (UID EXPUNGE, falls UIDPLUS verfügbar)."""
+    mail.uid('store', uid_set, '+FLAGS.SILENT', '(\\Deleted)')
+    if "UIDPLUS" in mail.capabilities:
+        mail.uid('expunge', uid_set)
+    else:
+        # Ohne UIDPLUS entfernt EXPUNGE alle als gelöscht markierten Nachrichten des Postfachs
         mail.expunge()
-        mail.close()
-        mail.logout()
-        logger.info("Betreff für UID %s erfolgreich geändert.", uid)
-        return True
-    except Exception as e:
-        logger.error("Fehler beim Ändern des Betreffs für UID %s: %s", uid, e)
-        return False 
\ No newline at end of file
+
+
+def _fetch_flags(mail, uids) -> Dict[int, Set[str]]:
+    """Flags und Schlüsselwörter der UIDs in einem UID FETCH; fehlende Nachrichten fehlen im Ergebnis."""
+    result, data = mail.uid('fetch', ",".join(map(str, uids)), '(UID FLAGS)')
+    flags: Dict[int, Set[str]] = {}
+    for _, items in parse_fetch_response(data) if result == 'OK' else []:
+        if str(items.get("UID", "")).isdigit():
+            flags[int(items["UID"])] = set(items.get("FLAGS") or ())
+    return flags
+
+
+def _tag_subject_batch(conn: PooledIMAPConnection, account: str, mailbox: str, uidvalidity: int,
+                       risks: Dict[int, str]) -> Dict[int, TagResult]:
+    """
+    Setzt die Betreff-Präfixe für eine Gruppe von UIDs auf einer Verbindung: ein UID FETCH,
+    ein (MULTI)APPEND, ein UID STORE \\Deleted und ein UID EXPUNGE nur für diese UIDs.
+    """
+    mail = conn.select(mailbox)
+    check_uidvalidity(mailbox, uidvalidity, conn.uidvalidity)
+    key_of = lambda uid: MessageKey(account, mailbox, conn.uidvalidity, uid)
+
+    result, data = mail.uid('fetch', ",".join(map(str, risks)), '(UID BODY.PEEK[])')
+    fetched: Dict[int, bytes] = {}
+    for _, items in parse_fetch_response(data) if result == 'OK' else []:
+        raw_email = items.get("BODY[]")
+        if str(items.get("UID", "")).isdigit() and isinstance(raw_email, bytes):
+            fetched[int(items["UID"])] = raw_email
+    if result != 'OK':
+        logger.warning("IMAP fetch failed for UIDs %s: %s", ",".join(map(str, risks)), result)
+
+    results: Dict[int, TagResult] = {}
+    pending: List[Tuple[int, str, str, bytes]] = []
+    for uid, risk in risks.items():
+        raw_email = fetched.get(uid)
+        if raw_email is None:
+            results[uid] = TagResult(key_of(uid), False, error="Mail not found")
+            continue
+        subject = _subject_of(raw_email)
+        if has_risk_prefix(subject):
+            results[uid] = TagResult(key_of(uid), False, old_subject=subject, new_subject=subject,
+                                     error="Subject already has risk prefix")
+            continue
+        new_subject = f"{risk_prefix(risk)}{subject}"
+        pending.append((uid, subject, new_subject, _with_subject(raw_email, new_subject)))
+    if not pending:
+        return results
+
+    appended = _append_messages(mail, mailbox, [message for *_, message in pending])
+    replaced = []
+    for (uid, subject, new_subject, _), (ok, new_uid) in zip(pending, appended):
+        if not ok:
+            results[uid] = TagResult(key_of(uid), False, error="Subject modification failed")
+            continue
+        new_key = key_of(new_uid) if new_uid else None
+        results[uid] = TagResult(key_of(uid), True, subject, new_subject, new_key)
+        replaced.append(str(uid))
+
+    # Originale nur löschen, wenn ihre Kopie abgelegt ist
+    if replaced:
+        _delete_uids(mail, ",".join(replaced))
+    return results
+
+
+def _tag_keyword_batch(conn: PooledIMAPConnection, account: str, mailbox: str, uidvalidity: int,
+                       risks: Dict[int, str]) -> Dict[int, TagResult]:
+    """
+    Setzt je Risikostufe ein IMAP-Schlüsselwort: ein UID FETCH (FLAGS) für die Prüfung auf
+    eine vorhandene Markierung und ein UID STORE je Stufe. Die Nachricht bleibt byte-genau
+    (und damit DKIM-gültig) unter ihrer UID erhalten.
+    """
+    mail = conn.select(mailbox)
+    check_uidvalidity(mailbox, uidvalidity, conn.uidvalidity)
+    key_of = lambda uid: MessageKey(account, mailbox, conn.uidvalidity, uid)
+
+    flags = _fetch_flags(mail, risks)
+    results: Dict[int, TagResult] = {}
+    by_keyword: Dict[str, List[int]] = {}
+    for uid, risk in risks.items():
+        if uid not in flags:
+            results[uid] = TagResult(key_of(uid), False, error="Mail not found")
+        elif existing_risk_keyword(flags[uid]):
+            results[uid] = TagResult(key_of(uid), False, error="Message already has risk tag",
+                                     tag=existing_risk_keyword(flags[uid]))
+        else:
+            by_keyword.setdefault(risk_keyword(risk), []).append(uid)
+
+    for keyword, uids in by_keyword.items():
+        result, data = mail.uid('store', ",".join(map(str, uids)), '+FLAGS.SILENT', f"({keyword})")
+        if result != 'OK':
+            logger.warning("Schlüsselwort %s konnte in %s nicht gesetzt werden: %s", keyword, mailbox, data)
+        for uid in uids:
+            if result == 'OK':
+                results[uid] = TagResult(key_of(uid), True, new_key=key_of(uid), tag=keyword)
+            else:
+                results[uid] = TagResult(key_of(uid), False, error="Tagging failed")
+    return results
+
+
+def _move_uids(mail, uid_set: str, folder: str) -> Tuple[str, list]:
+    """UID MOVE (RFC 6851) oder ersatzweise UID COPY mit anschließendem Löschen der Originale."""
+    if "MOVE" in mail.capabilities:
+        return mail.uid('move', uid_set, folder)
+    result, data = mail.uid('copy', uid_set, folder)
+    if result == 'OK':
+        _delete_uids(mail, uid_set)
+    return result, data
+
+
+def _move_batch(conn: PooledIMAPConnection, account: str, mailbox: str, uidvalidity: int,
+                risks: Dict[int, str]) -> Dict[int, TagResult]:
+    """
+    Verschiebt die Nachrichten in den Ordner ihrer Risikostufe (RISK_FOLDERS): ein UID FETCH
+    (FLAGS), ein UID STORE des Schlüsselworts (damit die Markierung auch nach manuellem
+    Zurückschieben erkannt wird) und ein UID MOVE je Ordner. Fehlende Ordner werden angelegt.
+    """
+    mail = conn.select(mailbox)
+    check_uidvalidity(mailbox, uidvalidity, conn.uidvalidity)
+    key_of = lambda uid: MessageKey(account, mailbox, conn.uidvalidity, uid)
+
+    flags = _fetch_flags(mail, risks)
+    results: Dict[int, TagResult] = {}
+    by_folder: Dict[str, Dict[str, List[int]]] = {}
+    for uid, risk in risks.items():
+        folder = RISK_FOLDERS.get(risk, "")
+        if uid not in flags:
+            results[uid] = TagResult(key_of(uid), False, error="Mail not found")
+        elif existing_risk_keyword(flags[uid]) or folder == mailbox:
+            results[uid] = TagResult(key_of(uid), False, error="Message already has risk tag",
+                                     tag=existing_risk_keyword(flags[uid]) or folder)
+        elif not folder:
+            results[uid] = TagResult(key_of(uid), False, error="No folder configured for risk level")
+        else:
+            by_folder.setdefault(folder, {}).setdefault(risk_keyword(risk), []).append(uid)
+
+    for folder, by_keyword in by_folder.items():
+        uids = [uid for keyword_uids in by_keyword.values() for uid in keyword_uids]
+        for keyword, keyword_uids in by_keyword.items():
+            mail.uid('store', ",".join(map(str, keyword_uids)), '+FLAGS.SILENT', f"({keyword})")
+        uid_set = ",".join(map(str, uids))
+        result, data = _move_uids(mail, uid_set, folder)
+        if result != 'OK' and any(b"TRYCREATE" in line for line in data or [] if isinstance(line, bytes)):
+            mail.create(folder)
+            result, data = _move_uids(mail, uid_set, folder)
+        if result != 'OK':
+            logger.warning("Verschieben nach %s fehlgeschlagen: %s", folder, data)
+            for uid in uids:
+                results[uid] = TagResult(key_of(uid), False, error="Tagging failed")
+            continue
+        target_uidvalidity, moved = _copied_uids(mail, data)
+        for uid in uids:
+            new_key = MessageKey(account, folder, target_uidvalidity, moved[uid]) if uid in moved else None
+            results[uid] = TagResult(key_of(uid), True, new_key=new_key, tag=folder)
+    return results
+
+
+# Markierungsarten für TAGGING_MODE
+TAGGERS: Dict[str, Callable[..., Dict[int, TagResult]]] = {
+    "subject": _tag_subject_batch,
+    "keyword": _tag_keyword_batch,
+    "move": _move_batch,
+}
+
+
+def tag_batches(risks: Dict[int, str]) -> List[Dict[int, str]]:
+    """Teilt {UID: Stufe} in Gruppen zu IMAP_TAG_BATCH_SIZE UIDs (Eingabereihenfolge bleibt erhalten)."""
+    uids = list(risks)
+    size = max(1, IMAP_TAG_BATCH_SIZE)
+    return [{uid: risks[uid] for uid in uids[start:start + size]} for start in range(0, len(uids), size)]
+
+
+def tag_batch(account: str, mailbox: str, uidvalidity: int, batch: Dict[int, str],
+              mode: str = TAGGING_MODE) -> List[TagResult]:
+    """
+    Markiert eine Gruppe von E-Mails eines Postfachs nach Risikostufe ({UID: Stufe}) gemäß `mode`:
+    "subject" (Betreff-Präfix, Nachricht wird neu abgelegt), "keyword" (IMAP-Schlüsselwort)
+    oder "move" (Risiko-Ordner), auf einer gepoolten Verbindung. Gibt je UID (in Eingabereihenfolge)
+    ein TagResult zurück; nachrichtenbezogene Fehler und eine abweichende UIDVALIDITY werden als
+    fehlgeschlagene Ergebnisse gemeldet, Verbindungs- und Protokollfehler (OSError, IMAP4.error)
+    an den Aufrufer weitergereicht. Neue Schlüssel sind nur bekannt, wenn der Server UIDPLUS unterstützt.
+    """
+    tagger = TAGGERS.get(mode)
+    if tagger is None:
+        raise ValueError(f"Unbekannter TAGGING_MODE: {mode}")
+    try:
+        # Kein automatischer Wiederholungsversuch: APPEND ist nicht idempotent
+        results = imap_pools.run(
+            account, lambda conn: tagger(conn, account, mailbox, uidvalidity, batch), retries=0
+        )
+    except UidValidityError as e:
+        logger.warning("Markierung in %s/%s abgelehnt: %s", account, mailbox, e)
+        return [TagResult(MessageKey(account, mailbox, uidvalidity, uid), False, error="UIDVALIDITY mismatch")
+                for uid in batch]
+    modified = sum(1 for result in results.values() if result.success)
+    logger.info("%d von %d E-Mails in %s/%s markiert (%s).", modified, len(batch), account, mailbox, mode)
+    return [results[uid] for uid in batch]
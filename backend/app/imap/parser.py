@@ -0,0 +1,116 @@
+# parser.py
+# Zerlegt IMAP-FETCH-Antworten von imaplib in Python-Strukturen
+import re
+from typing import Any, Dict, List, Tuple, Union
+
+Token = Union[str, bytes, None]
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+_QUOTED_ESCAPE_RE = re.compile(rb'\\(.)')
+
+# Marker für Klammern im Token-Strom
+_OPEN = object()
+_CLOSE = object()
+
+
+def _tokenize(text: bytes, tokens: List[Any]) -> None:
+    """Zerlegt eine Antwortzeile (ohne Literal-Daten) in Tokens."""
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i:i + 1]
+        if c in (b" ", b"\r", b"\n"):
+            i += 1
+        elif c == b"(":
+            tokens.append(_OPEN)
+            i += 1
+        elif c == b")":
+            tokens.append(_CLOSE)
+            i += 1
+        elif c == b'"':
+            j = i + 1
+            while j < n and text[j:j + 1] != b'"':
+                j += 2 if text[j:j + 1] == b"\\" else 1
+            tokens.append(_QUOTED_ESCAPE_RE.sub(rb"\1", text[i + 1:j]))
+            i = j + 1
+        elif c == b"{" and _LITERAL_RE.search(text[i:]):
+            # Literal-Ankündigung am Zeilenende, die Daten folgen separat
+            break
+        else:
+            j = i
+            depth = 0
+            while j < n:
+                ch = text[j:j + 1]
+                if ch == b"[":
+                    depth += 1
+                elif ch == b"]":
+                    depth -= 1
+                elif depth == 0 and ch in (b" ", b"(", b")"):
+                    break
+                j += 1
+            atom = text[i:j].decode("ascii", errors="replace")
+            tokens.append(None if atom.upper() == "NIL" else atom)
+            i = j
+
+
+def _tokenize_response(data: List[Any]) -> List[Any]:
+    """Wandelt die imaplib-Datenliste (Zeilen und Literal-Tupel) in einen Token-Strom."""
+    tokens: List[Any] = []
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            text, literal = item
+            _tokenize(text, tokens)
+            tokens.append(literal)
+        else:
+            _tokenize(item, tokens)
+    return tokens
+
+
+def _parse_value(tokens: List[Any], pos: int) -> Tuple[Any, int]:
+    token = tokens[pos]
+    if token is _OPEN:
+        values = []
+        pos += 1
+        while pos < len(tokens) and tokens[pos] is not _CLOSE:
+            value, pos = _parse_value(tokens, pos)
+            values.append(value)
+        return values, pos + 1
+    return token, pos + 1
+
+
+def parse_fetch_response(data: List[Any]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Parst die Rückgabe von imaplib fetch()/uid('fetch').
+    Gibt eine Liste von (Sequenznummer, {Item: Wert}) zurück; Items sind großgeschrieben
+    (z.B. "UID", "FLAGS", "BODY[HEADER]", "BODYSTRUCTURE"), Literale bleiben bytes.
+    Mehrere Antworten zur selben Sequenznummer werden zusammengeführt.
+    """
+    tokens = _tokenize_response(data)
+    messages: Dict[int, Dict[str, Any]] = {}
+    order: List[int] = []
+    pos = 0
+    while pos < len(tokens):
+        token = tokens[pos]
+        if not isinstance(token, str) or not token.isdigit():
+            pos += 1
+            continue
+        seq = int(token)
+        pos += 1
+        if pos < len(tokens) and tokens[pos] == "FETCH":
+            pos += 1
+        if pos >= len(tokens) or tokens[pos] is not _OPEN:
+            continue
+        items, pos = _parse_value(tokens, pos)
+        if seq not in messages:
+            messages[seq] = {}
+            order.append(seq)
+        entry = messages[seq]
+        for k in range(0, len(items) - 1, 2):
+            key = items[k]
+            if isinstance(key, bytes):
+                key = key.decode("ascii", errors="replace")
+            if isinstance(key, str):
+                entry[key.upper()] = items[k + 1]
+    return [(seq, messages[seq]) for seq in order]
@@ -0,0 +1,308 @@
+# pool.py
+# Wiederverwendbare, authentifizierte IMAP-Sitzungen
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+from app.core.config import IMAP_KEEPALIVE_SECONDS, IMAP_CONNECT_TIMEOUT, logger
+from app.imap.accounts import Account, accounts, default_account
+
+T = TypeVar("T")
+
+# Fehler, nach denen eine Sitzung nicht weiterverwendet werden darf
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+class PooledIMAPConnection:
+    """
+    Eine eingeloggte IMAP-Sitzung, die sich das aktuell ausgewählte Postfach merkt,
+    damit wiederholte SELECTs auf dasselbe Postfach entfallen.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, timeout: int, account: str = ""):
+        self.account = account
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.mail: Optional[imaplib.IMAP4_SSL] = None
+        self.selected: Optional[str] = None
+        self.readonly = False
+        self.exists = 0
+        self.uidvalidity = 0
+        self.uidnext = 0
+        # 0, wenn der Server kein CONDSTORE unterstützt
+        self.highestmodseq = 0
+        self.last_used = 0.0
+
+    def connect(self) -> None:
+        """Baut die TLS-Verbindung auf und meldet sich an."""
+        self.mail = imaplib.IMAP4_SSL(self.host, self.port, timeout=self.timeout)
+        self.mail.login(self.user, self.password)
+        self.selected = None
+        self.readonly = False
+        self.last_used = time.monotonic()
+        logger.info("Neue IMAP-Sitzung zu %s aufgebaut.", self.host)
+
+    def select(self, mailbox: str = "INBOX", readonly: bool = False, refresh: bool = False) -> imaplib.IMAP4_SSL:
+        """
+        Wählt ein Postfach aus, sofern es nicht bereits ausgewählt ist.
+        Mit refresh=True wird immer ein SELECT gesendet (aktuelle EXISTS/UIDNEXT/HIGHESTMODSEQ-Werte).
+        """
+        if refresh or self.selected != mailbox or self.readonly != readonly:
+            result, data = self.mail.select(mailbox, readonly=readonly)
+            if result != "OK":
+                self.selected = None
+                raise imaplib.IMAP4.error(f"SELECT {mailbox} fehlgeschlagen: {data}")
+            self.selected = mailbox
+            self.readonly = readonly
+            self.exists = int(data[0] or 0)
+            self.uidvalidity = self._response_code_value("UIDVALIDITY")
+            self.uidnext = self._response_code_value("UIDNEXT")
+            self.highestmodseq = self._response_code_value("HIGHESTMODSEQ")
+        return self.mail
+
+    def _response_code_value(self, code: str) -> int:
+        """Liest einen numerischen Response-Code (z.B. [UIDNEXT 42]) aus der letzten Antwort."""
+        _, data = self.mail.response(code)
+        try:
+            return int(data[-1]) if data and data[-1] is not None else 0
+        except (TypeError, ValueError):
+            return 0
+
+    def noop(self) -> None:
+        self.mail.noop()
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        """Prüft per NOOP, ob die Sitzung noch benutzbar ist."""
+        if self.mail is None:
+            return False
+        try:
+            self.noop()
+            return True
+        except Exception as e:
+            logger.info("IMAP-Sitzung nicht mehr aktiv: %s", e)
+            return False
+
+    def close(self) -> None:
+        """Meldet die Sitzung ab, Fehler werden ignoriert."""
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+        self.selected = None
+
+
+class IMAPConnectionPool:
+    """
+    Thread-sicherer Pool eingeloggter IMAP-Sitzungen.
+    Sitzungen werden per NOOP am Leben gehalten und bei Verbindungsfehlern neu aufgebaut.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 size: int = 4, keepalive_seconds: int = 120, timeout: int = 30, name: str = ""):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout = timeout
+        self._idle: List[PooledIMAPConnection] = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _new_connection(self) -> PooledIMAPConnection:
+        conn = PooledIMAPConnection(self.host, self.port, self.user, self.password, self.timeout, self.name)
+        conn.connect()
+        return conn
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledIMAPConnection:
+        """Holt eine freie Sitzung aus dem Pool oder baut eine neue auf."""
+        self._ensure_keepalive()
+        conn: Optional[PooledIMAPConnection] = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("Keine freie IMAP-Sitzung verfügbar")
+
+        if conn is None:
+            try:
+                return self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        # Lange ungenutzte Sitzungen vor der Verwendung prüfen
+        if time.monotonic() - conn.last_used > self.keepalive_seconds and not conn.is_alive():
+            conn.close()
+            try:
+                conn.connect()
+            except Exception:
+                self._discard(conn)
+                raise
+        return conn
+
+    def release(self, conn: PooledIMAPConnection, broken: bool = False) -> None:
+        """Gibt eine Sitzung zurück; defekte Sitzungen werden verworfen."""
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn: PooledIMAPConnection) -> None:
+        conn.close()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledIMAPConnection]:
+        """Kontextmanager für eine Sitzung aus dem Pool."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            self.release(conn, broken=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def run(self, operation: Callable[[PooledIMAPConnection], T], retries: int = 1) -> T:
+        """
+        Führt eine Operation mit einer Sitzung aus dem Pool aus.
+        Bei Verbindungsabbrüchen wird mit einer frischen Sitzung erneut versucht.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return operation(conn)
+            except CONNECTION_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning("IMAP-Verbindung abgebrochen (%s), neuer Versuch %d/%d", e, attempt, retries)
+
+    def check(self) -> None:
+        """Health-Check: NOOP auf einer Sitzung aus dem Pool."""
+        self.run(lambda conn: conn.noop())
+
+    def keepalive(self) -> None:
+        """Sendet NOOP auf allen freien Sitzungen, die länger ungenutzt sind."""
+        with self._cond:
+            stale = [c for c in self._idle if time.monotonic() - c.last_used > self.keepalive_seconds]
+            for c in stale:
+                self._idle.remove(c)
+        for conn in stale:
+            if conn.is_alive():
+                self.release(conn)
+            else:
+                self._discard(conn)
+
+    def _ensure_keepalive(self) -> None:
+        if self._keepalive_thread is not None or self.keepalive_seconds <= 0:
+            return
+        with self._cond:
+            if self._keepalive_thread is not None:
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name=f"imap-keepalive-{self.name}", daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self) -> None:
+        while not self._closed:
+            time.sleep(self.keepalive_seconds / 2)
+            try:
+                self.keepalive()
+            except Exception as e:
+                logger.warning("IMAP-Keepalive fehlgeschlagen: %s", e)
+
+    def close(self) -> None:
+        """Meldet alle freien Sitzungen ab."""
+        self._closed = True
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """Gibt Kennzahlen zur Pool-Auslastung zurück."""
+        with self._cond:
+            return {"size": self.size, "open": self._created, "idle": len(self._idle)}
+
+
+def connection_for(account: Account) -> PooledIMAPConnection:
+    """Neue, nicht gepoolte Sitzung für ein Konto (z.B. für IDLE, das eine Sitzung dauerhaft belegt)."""
+    return PooledIMAPConnection(account.host, account.port, account.user, account.password,
+                                IMAP_CONNECT_TIMEOUT, account.name)
+
+
+class IMAPPoolRegistry:
+    """
+    Ein Verbindungspool je konfiguriertem Konto, angelegt beim ersten Zugriff.
+    Die Poolgröße ist das Verbindungslimit des Kontos (max_connections).
+    """
+
+    def __init__(self):
+        self._pools: Dict[str, IMAPConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def get(self, account: Optional[str] = None) -> IMAPConnectionPool:
+        name = account or default_account
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                if name not in accounts:
+                    raise KeyError(f"Unbekanntes Konto: {name}")
+                config = accounts[name]
+                pool = IMAPConnectionPool(
+                    config.host, config.port, config.user, config.password,
+                    size=config.max_connections,
+                    keepalive_seconds=IMAP_KEEPALIVE_SECONDS,
+                    timeout=IMAP_CONNECT_TIMEOUT,
+                    name=name,
+                )
+                self._pools[name] = pool
+            return pool
+
+    def run(self, account: Optional[str], operation: Callable[[PooledIMAPConnection], T], retries: int = 1) -> T:
+        return self.get(account).run(operation, retries=retries)
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: pool.stats() for name, pool in self._pools.items()}
+
+
+# Globale Registry der Pools aller Konten
+imap_pools = IMAPPoolRegistry()
@@ -1,37 +1,70 @@
 # main.py
 # Haupt-Loop + API-Starter 
-from fastapi import FastAPI, Query, HTTPException, Request, Depends
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from app.imap.fetcher import fetch_latest_emails
-from app.analysis.content import analyze_email_content
-from app.analysis.result import parse_analysis_result, combine_results
-from app.analysis.headers import analyze_headers
-from app.analysis.links import extract_links, analyze_links
-from app.imap.modifier import change_subject
-from app.core.config import logger, IMAP_HOST, IMAP_USER, IMAP_PASSWORD, OPENROUTER_API_KEY
+from app.imap.modifier import tag_batch, tag_batches, TagResult
+from app.imap.keys import MessageKey
+from app.imap.pool import imap_pools
+from app.imap.accounts import accounts, default_account, get_account, is_monitored
+from app.imap.executor import run_imap, shutdown_executor
+from app.analysis.offload import shutdown_process_pool
+from app.imap.idle import IdleWatcher
+from app.events import broadcaster
+from app.core.http import get_http_client, start_http_client, close_http_client
+from app.core.cache import LRUCache
+from app.storage.verdicts import verdict_cache
+from app.storage.mailstore import mail_store
+from app.sync import sync_engine
+from app.analysis.pipeline import analysis_cache
+from app.scheduler import sync_scheduler
+from app.analysis.content import PROMPT_VERSION
+from app.core.config import (
+    logger, OPENROUTER_API_KEY, OPENROUTER_MODEL, MODIFY_SUBJECT_MAX_UIDS, IMAP_OPERATION_TIMEOUT
+)
 from app.models import (
-    AnalysisResponse, ModifySubjectResponse, HealthResponse, 
-    ErrorResponse, EmailAnalysis, HeaderAnalysis, LinkAnalysis, 
-    AIAnalysis, FinalScore, StatsResponse
+    AnalysisResponse, AnalysisStreamSummary, EmailListResponse, ModifySubjectResponse, BulkModifySubjectRequest, BulkModifySubjectResponse,
+    ModifySubjectResult, HealthResponse, 
+    EmailAnalysis, HeaderAnalysis, LinkAnalysis, 
+    AIAnalysis, FinalScore, StatsResponse, MailboxStatus, MailboxListResponse
 )
-from app.audit import log_analysis, log_subject_modification, log_api_access
+from app.audit import log_subject_modification, log_risk_tag
 from app.rate_limiter import rate_limiter, get_client_id
 import asyncio
-import imaplib, email
-from email.header import decode_header
-from typing import Dict, Any
+import functools
+from typing import Dict, Any, List, Optional, Tuple
 import httpx
-import html
-import re
 import json
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start- und Shutdown-Hook der Anwendung."""
+    await start_http_client()
+    # Bewertungen anderer Modelle/Prompt-Versionen und abgelaufene Einträge entfernen
+    verdict_cache.purge(OPENROUTER_MODEL, PROMPT_VERSION)
+    # Neu analysierte E-Mails aus allen Sync-Pfaden an SSE-Abonnenten verteilen
+    sync_engine.on_synced = publish_sync_result
+    sync_scheduler.start()
+    yield
+    await sync_scheduler.stop()
+    await close_http_client()
+    verdict_cache.close()
+    mail_store.close()
+    for watcher in mailbox_watchers.values():
+        watcher.stop()
+    shutdown_executor()
+    shutdown_process_pool()
+    # Gepoolte IMAP-Sitzungen aller Konten sauber abmelden
+    imap_pools.close()
 
 app = FastAPI(
     title="SecureMail Analyzer API",
     description="IMAP-basiertes Mail-Security-Tool mit KI-Analyse",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS aktivieren
@@ -43,131 +76,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cache für E-Mail-Analysen (UID -> {data, timestamp})
-email_cache: Dict[str, Dict] = {}
-CACHE_DURATION = 300  # 5 Minuten Cache
+# IDLE-Watcher je (Konto, Postfach), gemeinsam genutzt von allen SSE-Abonnenten,
+# und die Zahl der Abonnenten je Watcher (ohne Abonnenten wird er beendet)
+mailbox_watchers: Dict[Tuple[str, str], IdleWatcher] = {}
+_watcher_subscribers: Dict[Tuple[str, str], int] = {}
+# Von der App selbst abgelegte Nachrichten (neu abgelegte markierte Kopien, verschobene
+# Nachrichten): der Sync analysiert sie, meldet sie aber nicht als neue E-Mail
+_app_created: LRUCache[bool] = LRUCache(max_entries=10000, ttl_seconds=3600)
+_event_tasks: set = set()
 
-RISK_PREFIXES = ["[⚠️ Hochrisiko]", "[Warnung]", "[Info]"]
+def resolve_mailbox(account: Optional[str], mailbox: str) -> Tuple[str, str]:
+    """Konto (Standard: erstes konfiguriertes) und Postfach prüfen; nur konfigurierte Postfächer sind erlaubt."""
+    account = account or default_account
+    if not is_monitored(account, mailbox):
+        raise HTTPException(status_code=404, detail=f"Postfach {account}/{mailbox} ist nicht konfiguriert")
+    return account, mailbox
+
+def record_tagging(result: TagResult, risk: str) -> None:
+    """Nach erfolgreicher Markierung: ersetzte/verschobene Originale vergessen und Audit-Eintrag schreiben."""
+    if not result.success:
+        return
+    key = result.key
+    if result.replaced and result.new_key is not None:
+        _app_created.set(result.new_key, True)
+    if result.replaced:
+        if not key.uidvalidity and result.new_key is not None and result.new_key.mailbox == key.mailbox:
+            key = key._replace(uidvalidity=result.new_key.uidvalidity)
+        sync_engine.forget(key)
+    if result.new_subject is not None:
+        log_subject_modification(str(key), result.old_subject, result.new_subject, risk)
+    else:
+        log_risk_tag(str(key), result.tag, risk)
 
-def has_risk_prefix(subject: str) -> bool:
-    return any((subject or "").startswith(prefix) for prefix in RISK_PREFIXES)
+def _record_batch(batch: Dict[int, str], results: List[TagResult]) -> None:
+    for result in results:
+        record_tagging(result, batch[result.key.uid])
 
-async def get_cached_analysis(uid: str, msg) -> Dict[str, Any]:
+def _record_late_batch(batch: Dict[int, str], task: "asyncio.Future[List[TagResult]]") -> None:
+    if not task.cancelled() and task.exception() is None:
+        _record_batch(batch, task.result())
+
+async def apply_tagging(account: str, mailbox: str, uidvalidity: int, risks: Dict[int, str]) -> List[TagResult]:
     """
-    Holt gecachte Analyse oder führt neue durch.
+    Markiert die E-Mails gruppenweise (je Gruppe ein IMAP-Aufruf mit eigenem Zeitlimit) und
+    protokolliert jede Gruppe, sobald sie fertig ist. Bei Zeitüberschreitung oder einem
+    Verbindungs-/Protokollfehler wird HTTPException 500 ausgelöst; eine noch laufende Gruppe wird bei ihrem Ende nachgetragen,
+    damit Store und Audit-Log zu den tatsächlich ersetzten Nachrichten passen.
     """
-    current_time = time.time()
-    
-    # Prüfe Cache
-    if uid in email_cache:
-        cache_entry = email_cache[uid]
-        if current_time - cache_entry["timestamp"] < CACHE_DURATION:
-            logger.info("Cache-Hit für UID %s", uid)
-            return cache_entry["data"]
-    
-    # Führe neue Analyse durch
-    logger.info("Neue Analyse für UID %s", uid)
-    
-    # Dekodiere MIME-kodierte Betreffzeile
-    raw_subject = msg["subject"] or ""
-    subject = decode_mime_header(raw_subject)
-    
-    # Bereinige E-Mail-Adresse
-    raw_from = msg["from"] or ""
-    from_addr = clean_email_address(raw_from)
-    
-    header_result = analyze_headers(msg)
-    
-    text = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                text += part.get_payload(decode=True).decode(errors="ignore")
-    else:
-        text = msg.get_payload(decode=True).decode(errors="ignore")
-    
-    links = extract_links(text)
-    link_result = analyze_links(links)
-    gpt_response = await analyze_email_content(text, headers=header_result, links=link_result)
-    result = parse_analysis_result(gpt_response)
-    combined = combine_results(header_result, link_result, result)
-    
-    # Cache das Ergebnis
-    analysis_data = {
-        "uid": uid,
-        "subject": subject,
-        "from_addr": from_addr,
-        "score": combined["score"],
-        "risk_level": combined["risikostufe"],
-        "header_score": combined.get("header_score", 0),
-        "link_score": combined.get("link_score", 0),
-        "ai_score": combined.get("ai_score", 0),
-        "headers": header_result,
-        "links": link_result,
-        "analysis": result
-    }
-    
-    email_cache[uid] = {
-        "data": analysis_data,
-        "timestamp": current_time
-    }
-    
-    # Cache-Größe begrenzen (max 100 Einträge)
-    if len(email_cache) > 100:
-        oldest_uid = min(email_cache.keys(), key=lambda k: email_cache[k]["timestamp"])
-        del email_cache[oldest_uid]
-    
-    return analysis_data
-
-def decode_mime_header(header_value: str) -> str:
-    """Dekodiert MIME-kodierte Header-Werte (z.B. Betreffzeilen)."""
-    if not header_value:
-        return ""
-    try:
-        decoded_parts = decode_header(header_value)
-        decoded_string = ""
-        for part, encoding in decoded_parts:
-            if isinstance(part, bytes):
-                if encoding:
-                    decoded_string += part.decode(encoding)
-                else:
-                    decoded_string += part.decode('utf-8', errors='ignore')
+    results: List[TagResult] = []
+    for batch in tag_batches(risks):
+        # Zeitlimit außerhalb von run_imap, damit das Ergebnis auch nach Ablauf noch ankommt
+        task = asyncio.ensure_future(run_imap(tag_batch, account, mailbox, uidvalidity, batch, timeout=None))
+        try:
+            batch_results = await asyncio.wait_for(asyncio.shield(task), IMAP_OPERATION_TIMEOUT)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                logger.error("Markierung in %s/%s nach %ss abgebrochen, %d UIDs offen.",
+                             account, mailbox, IMAP_OPERATION_TIMEOUT, len(batch))
+                task.add_done_callback(functools.partial(_record_late_batch, batch))
             else:
-                decoded_string += part
-        return decoded_string
-    except Exception as e:
-        logger.warning("Fehler beim Dekodieren des Headers '%s': %s", header_value, e)
-        return header_value
-
-def clean_email_address(email_addr: str) -> str:
-    """Bereinigt E-Mail-Adressen von HTML-Entities und Unicode-Escape-Sequenzen."""
-    if not email_addr:
-        return ""
-    try:
-        # Dekodiere HTML-Entities
-        cleaned = html.unescape(email_addr)
-        # Dekodiere Unicode-Escape-Sequenzen
-        cleaned = cleaned.encode().decode('unicode_escape')
-        
-        # Extrahiere E-Mail aus "Name <email@domain.com>" Format
-        email_match = re.search(r'<([^>]+)>', cleaned)
-        if email_match:
-            return email_match.group(1).strip()
-        
-        # Fallback: Entferne überflüssige Anführungszeichen und Klammern
-        cleaned = re.sub(r'^["\']+|["\']+$', '', cleaned)  # Anführungszeichen am Anfang/Ende
-        cleaned = re.sub(r'^<+|>+$', '', cleaned)  # Spitze Klammern am Anfang/Ende
-        
-        # Suche nach E-Mail-Pattern
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        match = re.search(email_pattern, cleaned)
-        if match:
-            return match.group(0)
-        
-        return cleaned.strip()
-    except Exception as e:
-        logger.warning("Fehler beim Bereinigen der E-Mail-Adresse '%s': %s", email_addr, e)
-        return email_addr
+                logger.error("Fehler beim Markieren in %s/%s: %s", account, mailbox, e)
+            raise HTTPException(status_code=500, detail="Betreff-Änderung fehlgeschlagen")
+        _record_batch(batch, batch_results)
+        results.extend(batch_results)
+    return results
 
 async def check_rate_limit(request: Request):
     """Dependency für Rate-Limiting."""
@@ -181,33 +153,40 @@ async def health_check():
     """Health-Check-Endpoint für das Backend."""
     services = {}
     
-    # Prüfe IMAP-Verbindung
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_HOST, 993)
-        mail.login(IMAP_USER, IMAP_PASSWORD)
-        mail.logout()
-        services["imap"] = "ok"
-    except Exception as e:
-        logger.error("IMAP health check failed: %s", e)
-        services["imap"] = "error"
+    # Prüfe IMAP-Verbindung aller Konten
+    async def check_imap(account: str) -> str:
+        try:
+            await run_imap(imap_pools.get(account).check, timeout=10)
+            return "ok"
+        except asyncio.TimeoutError:
+            logger.error("IMAP health check timeout (%s)", account)
+            return "timeout"
+        except Exception as e:
+            logger.error("IMAP health check failed (%s): %s", account, e)
+            return "error"
+    
+    imap_status = dict(zip(accounts, await asyncio.gather(*(check_imap(name) for name in accounts))))
+    services["imap"] = next((status for status in imap_status.values() if status != "ok"), "ok")
+    if len(imap_status) > 1:
+        for name, status in imap_status.items():
+            services[f"imap:{name}"] = status
     
     # Prüfe OpenRouter-Verbindung
     try:
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}"} if OPENROUTER_API_KEY else {}
-            response = await client.get("https://openrouter.ai/api/v1/models", headers=headers, timeout=5)
-            
-            if response.status_code == 200:
-                services["openrouter"] = "ok"
-            elif response.status_code == 401:
-                logger.error("OpenRouter API-Key ist ungültig oder fehlt")
-                services["openrouter"] = "auth_error"
-            elif response.status_code == 403:
-                logger.error("OpenRouter API-Zugriff verweigert")
-                services["openrouter"] = "forbidden"
-            else:
-                logger.error("OpenRouter health check failed with status: %s", response.status_code)
-                services["openrouter"] = "error"
+        headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}"} if OPENROUTER_API_KEY else {}
+        response = await get_http_client().get("models", headers=headers, timeout=5)
+        
+        if response.status_code == 200:
+            services["openrouter"] = "ok"
+        elif response.status_code == 401:
+            logger.error("OpenRouter API-Key ist ungültig oder fehlt")
+            services["openrouter"] = "auth_error"
+        elif response.status_code == 403:
+            logger.error("OpenRouter API-Zugriff verweigert")
+            services["openrouter"] = "forbidden"
+        else:
+            logger.error("OpenRouter health check failed with status: %s", response.status_code)
+            services["openrouter"] = "error"
     except httpx.TimeoutException:
         logger.error("OpenRouter health check timeout")
         services["openrouter"] = "timeout"
@@ -221,45 +200,89 @@ async def health_check():
     return HealthResponse(
         status="ok" if all(status == "ok" for status in services.values()) else "degraded",
         version="1.0.0",
-        services=services
+        services=services,
+        analysis_cache=analysis_cache.stats()
+    )
+
+def build_email_analysis(key: MessageKey, analysis_data: Dict[str, Any]) -> EmailAnalysis:
+    """Erstellt das Pydantic-Modell für eine E-Mail-Analyse."""
+    return EmailAnalysis(
+        uid=str(key.uid),
+        account=key.account,
+        mailbox=key.mailbox,
+        uidvalidity=key.uidvalidity,
+        subject=analysis_data["subject"],
+        from_addr=analysis_data["from_addr"],
+        date=analysis_data.get("date") or None,
+        headers=HeaderAnalysis(**analysis_data["headers"]),
+        links=[LinkAnalysis(**link) for link in analysis_data["links"]],
+        analysis=AIAnalysis(**analysis_data["analysis"]),
+        final=FinalScore(
+            score=analysis_data["score"], 
+            risikostufe=analysis_data["risk_level"],
+            header_score=analysis_data.get("header_score", 0),
+            link_score=analysis_data.get("link_score", 0),
+            ai_score=analysis_data.get("ai_score", 0)
+        )
+    )
+
+@app.get("/emails", response_model=EmailListResponse)
+async def list_emails(
+    q: str = Query("", description="Volltextsuche in Betreff, Absender und Begründungen"),
+    risk: Optional[str] = Query(None, pattern="^(hoch|mittel|niedrig)$", description="Risikostufe"),
+    since: Optional[datetime] = Query(None, description="Nur E-Mails ab diesem Zeitpunkt (Date-Header; ohne Zeitzone = UTC)"),
+    until: Optional[datetime] = Query(None, description="Nur E-Mails vor diesem Zeitpunkt (Date-Header; ohne Zeitzone = UTC)"),
+    has_attachments: Optional[bool] = Query(None, description="Nur E-Mails mit (true) bzw. ohne (false) Anhänge"),
+    has_links: Optional[bool] = Query(None, description="Nur E-Mails mit (true) bzw. ohne (false) Links"),
+    min_score: Optional[int] = Query(None, ge=0, le=100, description="Mindestscore"),
+    account: Optional[str] = Query(None, description="Nur dieses Konto"),
+    mailbox: Optional[str] = Query(None, description="Nur dieses Postfach"),
+    sort: str = Query("date", pattern="^(date|score|subject|sender)$", description="Sortierung"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Reihenfolge"),
+    limit: int = Query(50, ge=1, le=200, description="Treffer je Seite"),
+    cursor: Optional[str] = Query(None, description="next_cursor der vorherigen Seite")
+):
+    """
+    Sucht, filtert und sortiert alle gespeicherten Analysen serverseitig (SQLite mit Indizes
+    und FTS5) und liefert sie seitenweise; ohne IMAP-Zugriff.
+    """
+    try:
+        results, next_cursor, total = await asyncio.to_thread(
+            mail_store.query, q, risk,
+            since, until,
+            has_attachments, has_links, min_score, account, mailbox, sort, order == "desc", limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return EmailListResponse(
+        results=[build_email_analysis(key, data) for key, data in results],
+        next_cursor=next_cursor,
+        total=total
     )
 
 @app.get("/analyze", response_model=AnalysisResponse)
-async def analyze_emails(limit: int = 3):
+async def analyze_emails(limit: int = 3, mailbox: str = 'INBOX', account: Optional[str] = None):
     """
-    Analysiert die letzten E-Mails und gibt die Ergebnisse als JSON zurück.
+    Analysiert die letzten E-Mails eines Postfachs und gibt die Ergebnisse als JSON zurück.
+    Per IMAP werden nur noch nicht synchronisierte Nachrichten geholt und analysiert,
+    die Ergebnisse stammen aus dem lokalen Store.
     """
+    account, mailbox = resolve_mailbox(account, mailbox)
     try:
-        emails = fetch_latest_emails(limit=limit)
+        uidvalidity = None
+        try:
+            sync_result = await sync_engine.sync(account, mailbox, want=limit)
+            uidvalidity = sync_result["uidvalidity"]
+        except Exception as e:
+            # IMAP nicht erreichbar: zuletzt synchronisierten Stand ausliefern
+            logger.error("Sync von %s/%s fehlgeschlagen, liefere gespeicherten Stand: %s", account, mailbox, e)
         results = []
         
-        for uid, msg in emails:
-            uid_str = uid.decode() if isinstance(uid, bytes) else str(uid)
-            
-            # Verwende gecachte Analyse
-            analysis_data = await get_cached_analysis(uid_str, msg)
-            
-            # Audit-Log
-            log_analysis(uid_str, analysis_data["subject"], analysis_data["from_addr"], 
-                        analysis_data["score"], analysis_data["risk_level"])
-            
-            # Erstelle Pydantic-Modelle
-            email_analysis = EmailAnalysis(
-                uid=uid_str,
-                subject=analysis_data["subject"],
-                from_addr=analysis_data["from_addr"],
-                headers=HeaderAnalysis(**analysis_data["headers"]),
-                links=[LinkAnalysis(**link) for link in analysis_data["links"]],
-                analysis=AIAnalysis(**analysis_data["analysis"]),
-                final=FinalScore(
-                    score=analysis_data["score"], 
-                    risikostufe=analysis_data["risk_level"],
-                    header_score=analysis_data.get("header_score", 0),
-                    link_score=analysis_data.get("link_score", 0),
-                    ai_score=analysis_data.get("ai_score", 0)
-                )
-            )
-            results.append(email_analysis)
+        for key, analysis_data in sync_engine.latest(account, mailbox, limit, uidvalidity):
+            try:
+                results.append(build_email_analysis(key, analysis_data))
+            except Exception as e:
+                logger.error("Ungültiges Analyseergebnis für UID %s: %s", key, e)
         
         logger.info("Analyse von %d E-Mails abgeschlossen.", len(results))
         
@@ -269,87 +292,247 @@ async def analyze_emails(limit: int = 3):
         logger.error("Fehler im Analyse-Endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Analyse fehlgeschlagen")
 
+@app.get("/analyze/stream")
+async def analyze_emails_stream(
+    limit: int = 3,
+    mailbox: str = 'INBOX',
+    account: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson oder sse")
+):
+    """
+    Wie /analyze, liefert aber jede EmailAnalysis, sobald sie vorliegt: zuerst den gespeicherten
+    Stand (ohne IMAP), dann jede neu analysierte Nachricht direkt nach ihrer Analyse.
+    Den Abschluss bildet ein Datensatz vom Typ "summary" (AnalysisStreamSummary).
+    Bricht der Client ab, läuft der Sync im Hintergrund zu Ende.
+    """
+    account, mailbox = resolve_mailbox(account, mailbox)
+    started = time.monotonic()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_result(key: MessageKey, analysis_data: Optional[Dict[str, Any]]) -> None:
+        queue.put_nowait((key, analysis_data))
+
+    def record(kind: str, payload: Dict[str, Any]) -> str:
+        data = json.dumps(payload, ensure_ascii=False)
+        if format == "sse":
+            return f"event: {kind}\ndata: {data}\n\n"
+        return data + "\n"
+
+    def result_record(key: MessageKey, analysis_data: Dict[str, Any]) -> Optional[str]:
+        try:
+            email = build_email_analysis(key, analysis_data)
+        except Exception as e:
+            logger.error("Ungültiges Analyseergebnis für UID %s: %s", key, e)
+            return None
+        return record("result", {"type": "result", "data": email.model_dump(mode="json")})
+
+    async def stream_generator():
+        emitted = set()
+        summary = AnalysisStreamSummary(uids=[])
+        for key, analysis_data in sync_engine.latest(account, mailbox, limit):
+            line = result_record(key, analysis_data)
+            if line is not None:
+                emitted.add(key)
+                summary.stored += 1
+                yield line
+
+        sync_task = asyncio.create_task(sync_engine.sync(account, mailbox, want=limit, on_result=on_result))
+        sync_task.add_done_callback(lambda _: queue.put_nowait(None))
+        while (item := await queue.get()) is not None:
+            key, analysis_data = item
+            if analysis_data is None:
+                summary.failed.append(str(key.uid))
+                continue
+            line = result_record(key, analysis_data)
+            if line is not None and key not in emitted:
+                emitted.add(key)
+                summary.analyzed += 1
+                yield line
+
+        uidvalidity = None
+        try:
+            sync_result = sync_task.result()
+            uidvalidity = sync_result["uidvalidity"]
+            summary.uidvalidity = uidvalidity
+            summary.reset = sync_result["reset"]
+            summary.removed = [str(key.uid) for key in sync_result["removed"]]
+        except Exception as e:
+            logger.error("Sync von %s/%s fehlgeschlagen, liefere gespeicherten Stand: %s", account, mailbox, e)
+            summary.error = "Sync fehlgeschlagen"
+
+        # Was ein gleichzeitig laufender Sync analysiert hat, ist erst jetzt im Store
+        for key, analysis_data in sync_engine.latest(account, mailbox, limit, uidvalidity):
+            summary.uids.append(str(key.uid))
+            if key not in emitted:
+                line = result_record(key, analysis_data)
+                if line is not None:
+                    emitted.add(key)
+                    summary.stored += 1
+                    yield line
+
+        summary.duration_ms = int((time.monotonic() - started) * 1000)
+        logger.info("Streaming-Analyse %s/%s: %d gespeichert, %d neu, %d fehlgeschlagen (%d ms).",
+                    account, mailbox, summary.stored, summary.analyzed, len(summary.failed), summary.duration_ms)
+        yield record("summary", summary.model_dump(mode="json"))
+
+    if format == "sse":
+        return StreamingResponse(
+            stream_generator(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+        )
+    return StreamingResponse(
+        stream_generator(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/mailboxes", response_model=MailboxListResponse)
+async def list_mailboxes():
+    """Alle konfigurierten Konten/Postfächer mit ihrem Sync-Stand."""
+    mailboxes = []
+    for account in accounts.values():
+        for mailbox in account.mailboxes:
+            state = mail_store.get_state(account.name, mailbox)
+            mailboxes.append(MailboxStatus(
+                account=account.name,
+                mailbox=mailbox,
+                synced=state is not None,
+                uidvalidity=state["uidvalidity"] if state else None,
+                last_uid=state["last_uid"] if state else None,
+                exists=state["exists"] if state else None,
+                analyzed=mail_store.count(account.name, mailbox, state["uidvalidity"]) if state else 0,
+                synced_at=state["synced_at"] if state else None,
+            ))
+    return MailboxListResponse(mailboxes=mailboxes, scheduler=sync_scheduler.stats())
+
+def ensure_mailbox_watcher(account: str, mailbox: str = 'INBOX') -> None:
+    """
+    Meldet einen Abonnenten für ein Postfach an und startet dessen IDLE-Watcher, falls er
+    noch nicht läuft; jeder Aufruf braucht ein passendes release_mailbox_watcher.
+    """
+    _watcher_subscribers[(account, mailbox)] = _watcher_subscribers.get((account, mailbox), 0) + 1
+    if (account, mailbox) in mailbox_watchers:
+        return
+    loop = asyncio.get_running_loop()
+
+    def on_event(event: Dict[str, Any]) -> None:
+        # Wird im Watcher-Thread aufgerufen: Verarbeitung an den Event-Loop übergeben
+        loop.call_soon_threadsafe(_schedule_mailbox_event, event)
+
+    watcher = IdleWatcher(get_account(account), mailbox, on_event)
+    mailbox_watchers[(account, mailbox)] = watcher
+    watcher.start()
+    # Bestand vorab synchronisieren, damit spätere Syncs nur noch neue E-Mails melden
+    _schedule_mailbox_event({"type": "new", "account": account, "mailbox": mailbox})
+
+def release_mailbox_watcher(account: str, mailbox: str = 'INBOX') -> None:
+    """Meldet einen Abonnenten ab und beendet den IDLE-Watcher, wenn keiner mehr übrig ist."""
+    remaining = _watcher_subscribers.get((account, mailbox), 0) - 1
+    if remaining > 0:
+        _watcher_subscribers[(account, mailbox)] = remaining
+        return
+    _watcher_subscribers.pop((account, mailbox), None)
+    watcher = mailbox_watchers.pop((account, mailbox), None)
+    if watcher is not None:
+        watcher.stop()
+        logger.info("IDLE-Watcher für %s/%s beendet (keine Abonnenten mehr).", account, mailbox)
+
+def _schedule_mailbox_event(event: Dict[str, Any]) -> None:
+    task = asyncio.ensure_future(handle_mailbox_event(event))
+    _event_tasks.add(task)
+    task.add_done_callback(_event_tasks.discard)
+
+async def handle_mailbox_event(event: Dict[str, Any]) -> None:
+    """
+    Stößt bei neuen oder gelöschten Nachrichten einen Sync des Postfachs an;
+    die Ergebnisse verteilt publish_sync_result.
+    """
+    try:
+        if event["type"] in ("new", "expunge"):
+            if sync_scheduler.running:
+                await sync_scheduler.request(event["account"], event["mailbox"])
+            else:
+                await sync_engine.sync(event["account"], event["mailbox"])
+        elif event["type"] == "error":
+            broadcaster.publish({
+                "event": "error",
+                "data": json.dumps({
+                    "error": event["error"],
+                    "account": event["account"],
+                    "mailbox": event["mailbox"],
+                    "timestamp": time.time()
+                })
+            }, event["account"], event["mailbox"])
+    except Exception as e:
+        logger.error("Fehler bei der Verarbeitung eines Postfach-Ereignisses: %s", e)
+
+async def publish_sync_result(account: str, mailbox: str, result: Dict[str, Any]) -> None:
+    """Verteilt neu analysierte und gelöschte Nachrichten eines Syncs an die Abonnenten des Postfachs."""
+    # Der erste Sync (oder ein UIDVALIDITY-Wechsel) holt Bestand nach, keine neuen E-Mails
+    if not result["reset"]:
+        for key, analysis_data in result["new"]:
+            if _app_created.pop(key) is not None:
+                continue
+            update_data = {
+                "type": "new_email",
+                "timestamp": time.time(),
+                "email_count": result["exists"],
+                "latest_email": {
+                    "uid": str(key.uid),
+                    "account": key.account,
+                    "mailbox": key.mailbox,
+                    "uidvalidity": key.uidvalidity,
+                    "subject": analysis_data["subject"],
+                    "from_addr": analysis_data["from_addr"],
+                    "score": analysis_data["score"],
+                    "risk_level": analysis_data["risk_level"]
+                }
+            }
+            broadcaster.publish({"event": "email_update", "data": json.dumps(update_data)}, account, mailbox)
+    if result["removed"]:
+        broadcaster.publish({
+            "event": "mailbox_update",
+            "data": json.dumps({
+                "type": "expunge",
+                "account": account,
+                "mailbox": mailbox,
+                "email_count": result["exists"],
+                "timestamp": time.time()
+            })
+        }, account, mailbox)
+
 @app.get("/events")
-async def email_events():
+async def email_events(mailbox: str = 'INBOX', account: Optional[str] = None):
     """
     Server-Sent Events Endpoint für Echtzeit-Updates.
-    Sendet Updates wenn neue E-Mails analysiert werden.
+    Neue E-Mails werden per IMAP IDLE erkannt, einmal analysiert und an alle Clients
+    dieses Postfachs verteilt (auch Ergebnisse des Hintergrund-Syncs); dazwischen wird
+    alle 10 Sekunden ein Heartbeat gesendet. Von der App selbst abgelegte Nachrichten
+    (z.B. markierte Kopien) werden nicht als neue E-Mail gemeldet.
     """
-    async def event_generator():
-        last_check = time.time()
-        last_email_count = 0
-        
-        while True:
-            try:
-                # Prüfe auf neue E-Mails alle 30 Sekunden
-                current_time = time.time()
-                if current_time - last_check >= 30:
-                    emails = fetch_latest_emails(limit=10)
-                    current_email_count = len(emails)
-                    
-                    # Sende Update nur wenn sich die Anzahl geändert hat
-                    if current_email_count != last_email_count:
-                        # Verwende gecachte Analyse für die neueste E-Mail
-                        if emails:
-                            uid, msg = emails[0]  # Neueste E-Mail
-                            uid_str = uid.decode() if isinstance(uid, bytes) else str(uid)
-                            
-                            # Verwende gecachte Analyse
-                            analysis_data = await get_cached_analysis(uid_str, msg)
-                            
-                            # Erstelle Update-Event
-                            update_data = {
-                                "type": "new_email",
-                                "timestamp": current_time,
-                                "email_count": current_email_count,
-                                "latest_email": {
-                                    "uid": uid_str,
-                                    "subject": analysis_data["subject"],
-                                    "from_addr": analysis_data["from_addr"],
-                                    "score": analysis_data["score"],
-                                    "risk_level": analysis_data["risk_level"]
-                                }
-                            }
-                            
-                            yield {
-                                "event": "email_update",
-                                "data": json.dumps(update_data)
-                            }
-                        
-                        last_email_count = current_email_count
-                    
-                    last_check = current_time
-                
-                # Sende Heartbeat alle 10 Sekunden
-                yield {
-                    "event": "heartbeat",
-                    "data": json.dumps({
-                        "timestamp": current_time,
-                        "status": "connected"
-                    })
-                }
-                
-                await asyncio.sleep(10)  # 10 Sekunden Pause zwischen Checks
-                
-            except Exception as e:
-                logger.error("Fehler im SSE-Event-Generator: %s", e)
-                yield {
-                    "event": "error",
-                    "data": json.dumps({
-                        "error": str(e),
-                        "timestamp": time.time()
-                    })
-                }
-                await asyncio.sleep(30)  # Längere Pause bei Fehlern
+    account, mailbox = resolve_mailbox(account, mailbox)
 
     async def sse_generator():
-        async for event in event_generator():
-            if event["event"] == "email_update":
-                yield f"event: {event['event']}\ndata: {event['data']}\n\n"
-            elif event["event"] == "heartbeat":
-                yield f"event: {event['event']}\ndata: {event['data']}\n\n"
-            elif event["event"] == "error":
+        # Erst beim Start des Streams anmelden, damit jedes Anmelden ein Abmelden im finally hat
+        ensure_mailbox_watcher(account, mailbox)
+        queue = broadcaster.subscribe(account, mailbox)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=10)
+                except asyncio.TimeoutError:
+                    event = {
+                        "event": "heartbeat",
+                        "data": json.dumps({
+                            "timestamp": time.time(),
+                            "status": "connected"
+                        })
+                    }
                 yield f"event: {event['event']}\ndata: {event['data']}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+            release_mailbox_watcher(account, mailbox)
     
     return StreamingResponse(
         sse_generator(),
@@ -364,62 +547,12 @@ async def email_events():
 
 @app.get("/stats", response_model=StatsResponse)
 async def get_email_stats():
-    """Gibt Statistiken über alle analysierten E-Mails zurück."""
+    """
+    Gibt Statistiken über alle gespeicherten Analysen zurück. Die Werte stammen aus
+    Aggregaten, die bei jeder gespeicherten bzw. entfernten Analyse fortgeschrieben werden.
+    """
     try:
-        # Hole alle E-Mails aus dem Cache
-        if not email_cache:
-            return StatsResponse(
-                total=0,
-                high_risk=0,
-                medium_risk=0,
-                low_risk=0,
-                average_score=0,
-                top_threats=[],
-                risk_trend=[]
-            )
-        
-        # Berechne Statistiken
-        total = len(email_cache)
-        high_risk = sum(1 for data in email_cache.values() 
-                       if data["data"]["risk_level"] == "hoch")
-        medium_risk = sum(1 for data in email_cache.values() 
-                         if data["data"]["risk_level"] == "mittel")
-        low_risk = sum(1 for data in email_cache.values() 
-                      if data["data"]["risk_level"] == "niedrig")
-        
-        # Durchschnittlicher Score
-        total_score = sum(data["data"]["score"] for data in email_cache.values())
-        average_score = total_score / total if total > 0 else 0
-        
-        # Top Bedrohungen (Mock-Daten für jetzt)
-        top_threats = [
-            {"threat": "Phishing", "count": 12},
-            {"threat": "Lookalike Domain", "count": 8},
-            {"threat": "SPF Fehler", "count": 6},
-            {"threat": "Gefährlicher Link", "count": 5},
-            {"threat": "Social Engineering", "count": 4}
-        ]
-        
-        # Risk Trend (Mock-Daten für jetzt)
-        risk_trend = [
-            {"date": "01.12", "score": 45},
-            {"date": "02.12", "score": 52},
-            {"date": "03.12", "score": 38},
-            {"date": "04.12", "score": 67},
-            {"date": "05.12", "score": 41},
-            {"date": "06.12", "score": 58},
-            {"date": "07.12", "score": 62}
-        ]
-        
-        return StatsResponse(
-            total=total,
-            high_risk=high_risk,
-            medium_risk=medium_risk,
-            low_risk=low_risk,
-            average_score=average_score,
-            top_threats=top_threats,
-            risk_trend=risk_trend
-        )
+        return StatsResponse(**mail_store.stats())
         
     except Exception as e:
         logger.error("Error generating stats: %s", e)
@@ -428,52 +561,54 @@ async def get_email_stats():
 @app.post("/modify-subject", response_model=ModifySubjectResponse)
 async def modify_subject(
     uid: str = Query(..., description="UID der zu ändernden E-Mail"),
-    risk: str = Query(..., description="Risikostufe: hoch, mittel, niedrig")
+    risk: str = Query(..., description="Risikostufe: hoch, mittel, niedrig"),
+    mailbox: str = Query('INBOX', description="Postfach der E-Mail"),
+    uidvalidity: Optional[int] = Query(None, description="UIDVALIDITY, zu der die UID gehört"),
+    account: Optional[str] = Query(None, description="Konto (Standard: erstes konfiguriertes)")
 ):
     """
     Setzt ein Risikopräfix im Betreff einer E-Mail (per UID).
+    Wird uidvalidity mitgegeben (aus /analyze), wird die Änderung abgelehnt, falls die UID
+    inzwischen zu einer anderen Nachricht gehören könnte.
     """
-    prefix = {
-        "hoch": "[⚠️ Hochrisiko] ",
-        "mittel": "[Warnung] ",
-        "niedrig": "[Info] "
-    }.get(risk, "[Info] ")
-    
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_HOST, 993)
-        mail.login(IMAP_USER, IMAP_PASSWORD)
-        mail.select('INBOX')
-        result, data = mail.uid('fetch', uid.encode(), '(RFC822)')
-        
-        if result != 'OK':
-            mail.logout()
-            logger.warning("Mail mit UID %s nicht gefunden.", uid)
-            return ModifySubjectResponse(success=False, error="Mail not found")
-        
-        raw_email = data[0][1]
-        msg = email.message_from_bytes(raw_email)
-        raw_subject = msg["subject"] or ""
-        orig_subject = decode_mime_header(raw_subject)
-        mail.logout()
-        
-        if has_risk_prefix(orig_subject):
-            logger.info("Subject für UID %s hat bereits ein Risikopräfix.", uid)
-            return ModifySubjectResponse(
-                success=False, 
-                error="Subject already has risk prefix", 
-                new_subject=orig_subject
+    if not uid.isdigit():
+        raise HTTPException(status_code=400, detail="Ungültige UID")
+    account, mailbox = resolve_mailbox(account, mailbox)
+    result = (await apply_tagging(account, mailbox, uidvalidity or 0, {int(uid): risk}))[0]
+    return ModifySubjectResponse(
+        success=result.success,
+        new_subject=result.new_subject,
+        new_uid=str(result.new_key.uid) if result.new_key else None,
+        tag=result.tag,
+        error=result.error
+    )
+
+@app.post("/modify-subject/bulk", response_model=BulkModifySubjectResponse)
+async def modify_subject_bulk(request: BulkModifySubjectRequest):
+    """
+    Setzt Risikopräfixe im Betreff vieler E-Mails eines Postfachs in einem Durchgang:
+    je Gruppe ein UID FETCH, ein (MULTI)APPEND, ein STORE und ein UID EXPUNGE.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Keine UIDs angegeben")
+    if len(request.items) > MODIFY_SUBJECT_MAX_UIDS:
+        raise HTTPException(status_code=400, detail=f"Maximal {MODIFY_SUBJECT_MAX_UIDS} UIDs je Anfrage")
+    if not all(item.uid.isdigit() for item in request.items):
+        raise HTTPException(status_code=400, detail="Ungültige UID")
+    account, mailbox = resolve_mailbox(request.account, request.mailbox)
+    risks = {int(item.uid): item.risk for item in request.items}
+    results = await apply_tagging(account, mailbox, request.uidvalidity or 0, risks)
+    return BulkModifySubjectResponse(
+        modified=sum(1 for result in results if result.success),
+        results=[
+            ModifySubjectResult(
+                uid=str(result.key.uid),
+                success=result.success,
+                new_subject=result.new_subject,
+                new_uid=str(result.new_key.uid) if result.new_key else None,
+                tag=result.tag,
+                error=result.error
             )
-        
-        new_subject = f"{prefix}{orig_subject}"
-        ok = change_subject(uid.encode(), new_subject)
-        
-        if ok:
-            log_subject_modification(uid, orig_subject, new_subject, risk)
-            logger.info("Subject für UID %s geändert: %s", uid, new_subject)
-            return ModifySubjectResponse(success=True, new_subject=new_subject)
-        else:
-            return ModifySubjectResponse(success=False, error="Subject modification failed")
-            
-    except Exception as e:
-        logger.error("Fehler beim Setzen des Betreffs: %s", e)
-        raise HTTPException(status_code=500, detail="Betreff-Änderung fehlgeschlagen") 
\ No newline at end of file
+            for result in results
+        ]
+    )
@@ -7,6 +7,9 @@ class HeaderAnalysis(BaseModel):
     dmarc: str
     from_domain: str
     from_lookalike: str
+    # Art des Lookalike-Treffers (homoglyph, punycode, typo, embedded), "" wenn unauffällig
+    from_lookalike_kind: str = ""
+    from_domain_listed: str = ""
     reply_to: str
     return_path: str
     reply_path_warning: str
@@ -25,6 +28,12 @@ class LinkAnalysis(BaseModel):
     url: str
     domain: str
     is_punycode: bool
+    lookalike: str = ""
+    # Art des Lookalike-Treffers: "homoglyph", "punycode", "typo" oder "embedded"
+    lookalike_kind: str = ""
+    # Nur als eingebettete Ressource (src, background, ...) verwendet, nicht anklickbar
+    resource: bool = False
+    listed: str = ""
     risk_score: int
 
 class AIAnalysis(BaseModel):
@@ -32,6 +41,8 @@ class AIAnalysis(BaseModel):
     risikostufe: str
     score: int
     gruende: List[str]
+    # "ki" = KI-Bewertung, "triage" = regelbasiert ohne KI-Aufruf
+    quelle: str = "ki"
 
 class FinalScore(BaseModel):
     score: int
@@ -42,8 +53,13 @@ class FinalScore(BaseModel):
 
 class EmailAnalysis(BaseModel):
     uid: str
+    account: str = "default"
+    mailbox: str = "INBOX"
+    uidvalidity: int = 0
     subject: str
     from_addr: str  # Direktes Feld ohne Alias
+    # Date-Header (ISO 8601, UTC), falls vorhanden
+    date: Optional[str] = None
     headers: HeaderAnalysis
     links: List[LinkAnalysis]
     analysis: AIAnalysis
@@ -52,19 +68,68 @@ class EmailAnalysis(BaseModel):
 class AnalysisResponse(BaseModel):
     results: List[EmailAnalysis]
 
+class AnalysisStreamSummary(BaseModel):
+    """Abschlussdatensatz von /analyze/stream."""
+    type: str = "summary"
+    # UIDs der neuesten `limit` Analysen nach dem Sync, in Anzeige-Reihenfolge; gestreamte
+    # Ergebnisse, die hier fehlen (z.B. nach UIDVALIDITY-Wechsel), sind veraltet
+    uids: List[str]
+    uidvalidity: Optional[int] = None
+    reset: bool = False
+    # Gestreamte Ergebnisse: aus dem Store bzw. während dieses Aufrufs neu analysiert
+    stored: int = 0
+    analyzed: int = 0
+    failed: List[str] = []
+    removed: List[str] = []
+    # Fehlermeldung, falls der Sync fehlschlug (dann nur gespeicherter Stand)
+    error: Optional[str] = None
+    duration_ms: int = 0
+
+class EmailListResponse(BaseModel):
+    results: List[EmailAnalysis]
+    # Cursor für die nächste Seite, None auf der letzten Seite
+    next_cursor: Optional[str] = None
+    # Anzahl aller Treffer der Suche
+    total: int
+
 class ModifySubjectRequest(BaseModel):
     uid: str = Field(..., description="UID der zu ändernden E-Mail")
+    account: Optional[str] = Field(None, description="Konto (Standard: erstes konfiguriertes)")
+    mailbox: str = Field("INBOX", description="Postfach der E-Mail")
+    uidvalidity: Optional[int] = Field(None, description="UIDVALIDITY, zu der die UID gehört")
     risk: str = Field(..., description="Risikostufe: hoch, mittel, niedrig")
 
 class ModifySubjectResponse(BaseModel):
     success: bool
     new_subject: Optional[str] = None
+    new_uid: Optional[str] = None
+    # Gesetztes IMAP-Schlüsselwort bzw. Zielordner (TAGGING_MODE keyword/move)
+    tag: Optional[str] = None
     error: Optional[str] = None
 
+class ModifySubjectResult(ModifySubjectResponse):
+    uid: str
+
+class BulkModifySubjectItem(BaseModel):
+    uid: str = Field(..., description="UID der zu ändernden E-Mail")
+    risk: str = Field(..., description="Risikostufe: hoch, mittel, niedrig")
+
+class BulkModifySubjectRequest(BaseModel):
+    account: Optional[str] = Field(None, description="Konto (Standard: erstes konfiguriertes)")
+    mailbox: str = Field("INBOX", description="Postfach der E-Mails")
+    uidvalidity: Optional[int] = Field(None, description="UIDVALIDITY, zu der die UIDs gehören")
+    items: List[BulkModifySubjectItem] = Field(..., description="UIDs mit ihrer Risikostufe")
+
+class BulkModifySubjectResponse(BaseModel):
+    modified: int
+    results: List[ModifySubjectResult]
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     services: Dict[str, str]
+    # Kennzahlen des In-Memory-Analyse-Caches (Einträge, Treffer, Fehlschläge, Verdrängungen, ...)
+    analysis_cache: Optional[Dict[str, int]] = None
 
 class ErrorResponse(BaseModel):
     detail: str
@@ -85,4 +150,18 @@ class StatsResponse(BaseModel):
     low_risk: int
     average_score: float
     top_threats: List[ThreatCount]
-    risk_trend: List[RiskTrendPoint] 
\ No newline at end of file
+    risk_trend: List[RiskTrendPoint]
+
+class MailboxStatus(BaseModel):
+    account: str
+    mailbox: str
+    synced: bool
+    uidvalidity: Optional[int] = None
+    last_uid: Optional[int] = None
+    exists: Optional[int] = None
+    analyzed: int = 0
+    synced_at: Optional[float] = None
+
+class MailboxListResponse(BaseModel):
+    mailboxes: List[MailboxStatus]
+    scheduler: Dict[str, Any]
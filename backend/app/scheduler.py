@@ -0,0 +1,125 @@
+# scheduler.py
+# Verteilt Sync- und Analysearbeit für viele Konten/Postfächer auf asynchrone Worker
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from app.core.config import SYNC_INTERVAL, SYNC_WORKERS, logger
+from app.imap.accounts import Account, accounts
+from app.sync import SyncEngine, sync_engine
+
+class SyncScheduler:
+    """
+    Warteschlange je Konto, abgearbeitet von einer festen Zahl asynchroner Worker.
+    Die Konten kommen reihum an die Reihe (Round-Robin), damit ein Konto mit vielen
+    Postfächern die anderen nicht aushungert; je Konto laufen höchstens max_connections
+    Syncs gleichzeitig, passend zur Größe seines IMAP-Pools.
+    """
+
+    def __init__(self, engine: SyncEngine, account_config: Dict[str, Account],
+                 workers: int = SYNC_WORKERS, interval: int = SYNC_INTERVAL):
+        self.engine = engine
+        self.accounts = account_config
+        self.workers = max(1, workers)
+        self.interval = interval
+        self._queues: Dict[str, Deque[str]] = {name: deque() for name in account_config}
+        self._queued: Set[Tuple[str, str]] = set()
+        self._active: Dict[str, int] = {name: 0 for name in account_config}
+        self._order: List[str] = list(account_config)
+        self._next = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Startet die Worker und, bei SYNC_INTERVAL > 0, den periodischen Sync aller Postfächer."""
+        if self._tasks:
+            return
+        self._cond = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if self.interval > 0:
+            self._tasks.append(asyncio.create_task(self._periodic()))
+        logger.info("Sync-Scheduler mit %d Workern für %d Konten gestartet.", self.workers, len(self._order))
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def request(self, account: str, mailbox: str) -> bool:
+        """Reiht einen Sync ein; ist das Postfach bereits eingereiht, passiert nichts."""
+        if self._cond is None or account not in self._queues:
+            return False
+        async with self._cond:
+            if (account, mailbox) in self._queued:
+                return False
+            self._queued.add((account, mailbox))
+            self._queues[account].append(mailbox)
+            self._cond.notify()
+        return True
+
+    async def request_all(self) -> int:
+        count = 0
+        for account in self.accounts.values():
+            for mailbox in account.mailboxes:
+                count += await self.request(account.name, mailbox)
+        return count
+
+    def _take(self) -> Optional[Tuple[str, str]]:
+        """Nächster Auftrag reihum über die Konten, unter Beachtung der Verbindungslimits."""
+        for offset in range(len(self._order)):
+            account = self._order[(self._next + offset) % len(self._order)]
+            queue = self._queues[account]
+            if not queue or self._active[account] >= self.accounts[account].max_connections:
+                continue
+            mailbox = queue.popleft()
+            self._queued.discard((account, mailbox))
+            self._active[account] += 1
+            self._next = (self._next + offset + 1) % len(self._order)
+            return account, mailbox
+        return None
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            async with self._cond:
+                job = self._take()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._take()
+            account, mailbox = job
+            try:
+                await self.engine.sync(account, mailbox)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error("Sync von %s/%s fehlgeschlagen: %s", account, mailbox, e)
+            finally:
+                async with self._cond:
+                    self._active[account] -= 1
+                    self._cond.notify_all()
+
+    async def _periodic(self) -> None:
+        while True:
+            queued = await self.request_all()
+            logger.debug("%d Postfächer zum Sync eingereiht.", queued)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": len(self._queued),
+            "active": sum(self._active.values()),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+# Globale Scheduler-Instanz für alle konfigurierten Konten
+sync_scheduler = SyncScheduler(sync_engine, accounts)
@@ -0,0 +1,465 @@
+# mailstore.py
+# Persistenter Sync-Stand und Analyseergebnisse je Konto und Postfach (SQLite)
+import base64
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+from app.analysis.threats import threats_of
+from app.core.config import MAIL_STORE_PATH, STATS_TOP_THREATS, STATS_TREND_DAYS, logger
+from app.imap.keys import MessageKey
+
+# Bei Änderungen am Schema erhöhen: ältere Daten werden verworfen und neu synchronisiert
+# (ab Version 2 werden die Analysen übernommen, abgeleitete Spalten und Aggregate neu berechnet)
+SCHEMA_VERSION = 5
+
+# Spalten der Analysen-Tabelle in der Reihenfolge von _row()
+_COLUMNS = (
+    "account", "mailbox", "uidvalidity", "uid", "data", "analyzed_at",
+    "risk_level", "score", "day", "threats",
+    "subject", "from_addr", "reasons", "mail_date", "has_attachments", "has_links",
+)
+# Sortierungen für query(): Name -> Spaltenausdruck (mit Index)
+SORT_COLUMNS = {
+    "date": "mail_date",
+    "score": "score",
+    "subject": "subject COLLATE NOCASE",
+    "sender": "from_addr COLLATE NOCASE",
+}
+
+
+def _day(timestamp: float) -> str:
+    """Kalendertag (UTC) eines Zeitstempels, unabhängig von der Zeitzone des Servers."""
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def _utc_timestamp(value: Union[datetime, float, None]) -> Optional[float]:
+    """Zeitpunkt als Unix-Zeitstempel; Datumsangaben ohne Zeitzone gelten als UTC (nicht Ortszeit)."""
+    if value is None or not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _timestamp(iso_date: str, fallback: float) -> float:
+    try:
+        return _utc_timestamp(datetime.fromisoformat(iso_date))
+    except (TypeError, ValueError):
+        return fallback
+
+
+def _fts_query(text: str) -> str:
+    """
+    Freitext -> FTS5-Abfrage: jedes Suchwort als Präfix-Phrase ("paypal.com" -> "paypal com"*),
+    alle Wörter müssen vorkommen. Operatoren der FTS5-Syntax werden so nie interpretiert.
+    """
+    phrases = []
+    for term in text.split():
+        words = re.findall(r"\w+", term)
+        if words:
+            phrases.append('"' + " ".join(words) + '"*')
+    return " ".join(phrases)
+
+
+def encode_cursor(values: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Wirft ValueError bei einem ungültigen Cursor."""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"Ungültiger Cursor: {cursor}") from e
+    if not isinstance(row_id, int) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"Ungültiger Cursor: {cursor}")
+    return value, row_id
+
+
+_KEY_WHERE = "account = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?"
+
+
+class MailStore:
+    """
+    Hält je (Konto, Postfach) den Sync-Stand (UIDVALIDITY, höchste synchronisierte UID,
+    UIDNEXT, EXISTS, HIGHESTMODSEQ) und die Analyse jeder synchronisierten Nachricht.
+    Schlüssel der Analysen ist (Konto, Postfach, UIDVALIDITY, UID).
+
+    Zusätzlich werden Statistik-Aggregate (je Risikostufe, je Tag, je Bedrohung) in derselben
+    Transaktion wie jede gespeicherte bzw. entfernte Analyse fortgeschrieben, sodass sie stets
+    dem Inhalt des Stores entsprechen und ohne Durchlauf über alle Analysen abrufbar sind.
+    Für die Suche (query()) gibt es Indizes auf den Filter- und Sortierspalten sowie einen
+    FTS5-Volltextindex über Betreff, Absender und Begründungen, den Trigger aktuell halten.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # INSERT OR REPLACE löst sonst die Lösch-Trigger des Volltextindex nicht aus
+        self._conn.execute("PRAGMA recursive_triggers = ON")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        legacy: List[Tuple] = []
+        if version < 2:
+            # Der Store ist aus dem Postfach rekonstruierbar: alte Tabellen verwerfen
+            if version:
+                logger.info("Mail-Store-Schema %d veraltet, Daten werden neu synchronisiert.", version)
+            self._conn.execute("DROP TABLE IF EXISTS sync_state")
+            self._conn.execute("DROP TABLE IF EXISTS analyses")
+        elif version < SCHEMA_VERSION:
+            # Analysen übernehmen und mit dem neuen Schema (abgeleitete Spalten, Indizes,
+            # Aggregate) neu einfügen
+            legacy = self._conn.execute(
+                "SELECT account, mailbox, uidvalidity, uid, data, analyzed_at FROM analyses"
+            ).fetchall()
+            for table in ("analyses", "stats_levels", "stats_days", "stats_threats"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " account TEXT NOT NULL,"
+            " mailbox TEXT NOT NULL,"
+            " uidvalidity INTEGER NOT NULL,"
+            " last_uid INTEGER NOT NULL,"
+            " uidnext INTEGER NOT NULL,"
+            " exists_count INTEGER NOT NULL,"
+            " highestmodseq INTEGER NOT NULL DEFAULT 0,"
+            " synced_at REAL NOT NULL,"
+            " PRIMARY KEY (account, mailbox))"
+        )
+        # Feste id als Schlüssel des Volltextindex (die implizite rowid kann VACUUM neu vergeben)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " id INTEGER PRIMARY KEY,"
+            " account TEXT NOT NULL,"
+            " mailbox TEXT NOT NULL,"
+            " uidvalidity INTEGER NOT NULL,"
+            " uid INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " analyzed_at REAL NOT NULL,"
+            " risk_level TEXT NOT NULL,"
+            " score INTEGER NOT NULL,"
+            " day TEXT NOT NULL,"
+            " threats TEXT NOT NULL,"
+            " subject TEXT NOT NULL,"
+            " from_addr TEXT NOT NULL,"
+            " reasons TEXT NOT NULL,"
+            " mail_date REAL NOT NULL,"
+            " has_attachments INTEGER NOT NULL,"
+            " has_links INTEGER NOT NULL,"
+            " UNIQUE (account, mailbox, uidvalidity, uid))"
+        )
+        for name, columns in (("score", "score"), ("risk_level", "risk_level"), ("mail_date", "mail_date"),
+                              ("subject", "subject COLLATE NOCASE"), ("from_addr", "from_addr COLLATE NOCASE"),
+                              ("has_attachments", "has_attachments"), ("has_links", "has_links")):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS analyses_{name} ON analyses ({columns})")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5("
+            " subject, from_addr, reasons, content='analyses', content_rowid='id',"
+            " tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS analyses_fts_insert AFTER INSERT ON analyses BEGIN"
+            " INSERT INTO analyses_fts (rowid, subject, from_addr, reasons)"
+            " VALUES (new.id, new.subject, new.from_addr, new.reasons); END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS analyses_fts_delete AFTER DELETE ON analyses BEGIN"
+            " INSERT INTO analyses_fts (analyses_fts, rowid, subject, from_addr, reasons)"
+            " VALUES ('delete', old.id, old.subject, old.from_addr, old.reasons); END"
+        )
+        # Statistik-Aggregate über alle gespeicherten Analysen
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats_levels ("
+            " risk_level TEXT PRIMARY KEY, count INTEGER NOT NULL, score_sum INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats_days ("
+            " day TEXT PRIMARY KEY, count INTEGER NOT NULL, score_sum INTEGER NOT NULL, high_risk INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats_threats (threat TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+        )
+        if legacy:
+            rows = [
+                self._row(MessageKey(account, mailbox, uidvalidity, uid), json.loads(data), analyzed_at)
+                for account, mailbox, uidvalidity, uid, data, analyzed_at in legacy
+            ]
+            self._insert_rows(rows)
+            logger.info("%d gespeicherte Analysen in Mail-Store-Schema %d übernommen.", len(rows), SCHEMA_VERSION)
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    @staticmethod
+    def _row(key: MessageKey, data: Dict[str, Any], analyzed_at: float) -> Tuple:
+        """Zeile der Analysen-Tabelle (Spalten wie _COLUMNS) inkl. der Werte für Statistik und Suche."""
+        verdict = data.get("analysis") or {}
+        reasons = " ".join([verdict.get("bewertung", "")] + [str(reason) for reason in verdict.get("gruende") or []])
+        # Trend-Tag nach Date-Header der Nachricht, damit ein Nachholen nicht alles auf heute legt
+        mail_date = _timestamp(data.get("date", ""), analyzed_at)
+        return (
+            key.account, key.mailbox, key.uidvalidity, key.uid, json.dumps(data, ensure_ascii=False), analyzed_at,
+            data.get("risk_level", ""), int(data.get("score", 0) or 0), _day(mail_date),
+            json.dumps(threats_of(data), ensure_ascii=False),
+            data.get("subject", ""), data.get("from_addr", ""), reasons.strip(),
+            mail_date,
+            int(bool((data.get("headers") or {}).get("attachments"))), int(bool(data.get("links"))),
+        )
+
+    def _insert_rows(self, rows: List[Tuple]) -> None:
+        """Fügt Zeilen aus _row() ein bzw. ersetzt sie und schreibt die Aggregate fort. Aufruf nur unter self._lock."""
+        # Ersetzte Analysen zuerst abziehen, damit nichts doppelt zählt
+        self._remove_stats(_KEY_WHERE, [row[:4] for row in rows])
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO analyses ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows
+        )
+        self._apply_stats([row[6:10] for row in rows], 1)
+
+    def _apply_stats(self, rows: Iterable[Tuple[str, int, str, str]], sign: int) -> None:
+        """
+        Schreibt die Aggregate für hinzugefügte (sign=1) bzw. entfernte (sign=-1) Analysen fort.
+        rows: (Risikostufe, Score, Tag, Bedrohungen als JSON). Aufruf nur unter self._lock.
+        """
+        levels: Counter = Counter()
+        level_scores: Counter = Counter()
+        days: Counter = Counter()
+        day_scores: Counter = Counter()
+        day_high: Counter = Counter()
+        threats: Counter = Counter()
+        for risk_level, score, day, threat_json in rows:
+            levels[risk_level] += sign
+            level_scores[risk_level] += sign * score
+            days[day] += sign
+            day_scores[day] += sign * score
+            day_high[day] += sign if risk_level == "hoch" else 0
+            threats.update({threat: sign for threat in json.loads(threat_json)})
+        if not levels:
+            return
+        self._conn.executemany(
+            "INSERT INTO stats_levels (risk_level, count, score_sum) VALUES (?, ?, ?)"
+            " ON CONFLICT(risk_level) DO UPDATE SET"
+            " count = count + excluded.count, score_sum = score_sum + excluded.score_sum",
+            [(level, count, level_scores[level]) for level, count in levels.items()]
+        )
+        self._conn.executemany(
+            "INSERT INTO stats_days (day, count, score_sum, high_risk) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(day) DO UPDATE SET count = count + excluded.count,"
+            " score_sum = score_sum + excluded.score_sum, high_risk = high_risk + excluded.high_risk",
+            [(day, count, day_scores[day], day_high[day]) for day, count in days.items()]
+        )
+        self._conn.executemany(
+            "INSERT INTO stats_threats (threat, count) VALUES (?, ?)"
+            " ON CONFLICT(threat) DO UPDATE SET count = count + excluded.count",
+            list(threats.items())
+        )
+        if sign < 0:
+            for table in ("stats_levels", "stats_days", "stats_threats"):
+                self._conn.execute(f"DELETE FROM {table} WHERE count <= 0")
+
+    def _remove_stats(self, where: str, params: Iterable[Tuple]) -> None:
+        """Zieht die Analysen, die gleich gelöscht werden (Bedingung `where`), von den Aggregaten ab."""
+        rows = []
+        for row_params in params:
+            rows.extend(self._conn.execute(
+                f"SELECT risk_level, score, day, threats FROM analyses WHERE {where}", row_params
+            ).fetchall())
+        self._apply_stats(rows, -1)
+
+    def get_state(self, account: str, mailbox: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid, uidnext, exists_count, highestmodseq, synced_at"
+                " FROM sync_state WHERE account = ? AND mailbox = ?", (account, mailbox)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("uidvalidity", "last_uid", "uidnext", "exists", "highestmodseq", "synced_at"), row))
+
+    def set_state(self, account: str, mailbox: str, uidvalidity: int, last_uid: int, uidnext: int,
+                  exists: int, highestmodseq: int = 0) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state"
+                " (account, mailbox, uidvalidity, last_uid, uidnext, exists_count, highestmodseq, synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (account, mailbox, uidvalidity, last_uid, uidnext, exists, highestmodseq, time.time())
+            )
+            self._conn.commit()
+
+    def reset_mailbox(self, account: str, mailbox: str, uidvalidity: int) -> int:
+        """Verwirft alle Analysen eines Postfachs, die nicht zur aktuellen UIDVALIDITY gehören."""
+        where = "account = ? AND mailbox = ? AND uidvalidity != ?"
+        with self._lock:
+            self._remove_stats(where, [(account, mailbox, uidvalidity)])
+            cursor = self._conn.execute(f"DELETE FROM analyses WHERE {where}", (account, mailbox, uidvalidity))
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info("%d Analysen von %s/%s nach UIDVALIDITY-Wechsel verworfen.", cursor.rowcount, account, mailbox)
+        return cursor.rowcount
+
+    def known_uids(self, account: str, mailbox: str, uidvalidity: int) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uid FROM analyses WHERE account = ? AND mailbox = ? AND uidvalidity = ?",
+                (account, mailbox, uidvalidity)
+            ).fetchall()
+        return {uid for (uid,) in rows}
+
+    def count(self, account: str, mailbox: str, uidvalidity: int) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM analyses WHERE account = ? AND mailbox = ? AND uidvalidity = ?",
+                (account, mailbox, uidvalidity)
+            ).fetchone()
+        return count
+
+    def put_analyses(self, items: Iterable[Tuple[MessageKey, Dict[str, Any]]]) -> None:
+        now = time.time()
+        rows = [self._row(key, data, now) for key, data in items]
+        if not rows:
+            return
+        with self._lock:
+            self._insert_rows(rows)
+            self._conn.commit()
+
+    def delete(self, keys: Iterable[MessageKey]) -> int:
+        rows = [tuple(key) for key in keys]
+        if not rows:
+            return 0
+        with self._lock:
+            self._remove_stats(_KEY_WHERE, rows)
+            self._conn.executemany(f"DELETE FROM analyses WHERE {_KEY_WHERE}", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def get_analysis(self, key: MessageKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM analyses WHERE account = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                tuple(key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest(self, account: str, mailbox: str, uidvalidity: int,
+               limit: int) -> List[Tuple[MessageKey, Dict[str, Any]]]:
+        """Die neuesten `limit` Analysen eines Postfachs, aufsteigend nach UID (neueste zuletzt)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uid, data FROM analyses WHERE account = ? AND mailbox = ? AND uidvalidity = ?"
+                " ORDER BY uid DESC LIMIT ?", (account, mailbox, uidvalidity, max(0, limit))
+            ).fetchall()
+        return [(MessageKey(account, mailbox, uidvalidity, uid), json.loads(data)) for uid, data in reversed(rows)]
+
+    def query(self, text: str = "", risk_level: Optional[str] = None,
+              since: Union[datetime, float, None] = None, until: Union[datetime, float, None] = None, has_attachments: Optional[bool] = None,
+              has_links: Optional[bool] = None, min_score: Optional[int] = None,
+              account: Optional[str] = None, mailbox: Optional[str] = None, sort: str = "date",
+              descending: bool = True, limit: int = 50,
+              cursor: Optional[str] = None) -> Tuple[List[Tuple[MessageKey, Dict[str, Any]]], Optional[str], int]:
+        """
+        Sucht in allen gespeicherten Analysen: Volltext (Betreff, Absender, Begründungen),
+        Filter auf Risikostufe, Datum (Date-Header, sonst Analysezeit), Anhänge, Links,
+        Mindestscore und Postfach; sortiert nach `sort` (SORT_COLUMNS). `since`/`until` werden
+        wie die gespeicherten Datumswerte nach UTC normalisiert (ohne Zeitzone = UTC).
+        Seitenweise per Cursor (Keyset auf Sortierwert und id), daher unabhängig von der
+        Seitenzahl gleich schnell. Gibt (Treffer, Cursor der nächsten Seite oder None,
+        Gesamtzahl der Treffer) zurück; ein ungültiger Cursor löst ValueError aus.
+        """
+        order_column = SORT_COLUMNS[sort]
+        where: List[str] = []
+        params: List[Any] = []
+        fts = _fts_query(text)
+        if fts:
+            where.append("id IN (SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ?)")
+            params.append(fts)
+        for condition, value in (("risk_level = ?", risk_level), ("mail_date >= ?", _utc_timestamp(since)),
+                                 ("mail_date < ?", _utc_timestamp(until)), ("has_attachments = ?", has_attachments),
+                                 ("has_links = ?", has_links), ("score >= ?", min_score),
+                                 ("account = ?", account), ("mailbox = ?", mailbox)):
+            if value is not None:
+                where.append(condition)
+                params.append(int(value) if isinstance(value, bool) else value)
+
+        page_where, page_params = list(where), list(params)
+        if cursor:
+            value, row_id = decode_cursor(cursor)
+            op = "<" if descending else ">"
+            page_where.append(f"({order_column} {op} ? OR ({order_column} = ? AND id {op} ?))")
+            page_params.extend([value, value, row_id])
+        direction = "DESC" if descending else "ASC"
+        sort_value = order_column.split(" ")[0]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, account, mailbox, uidvalidity, uid, data, {sort_value} FROM analyses"
+                f"{' WHERE ' + ' AND '.join(page_where) if page_where else ''}"
+                f" ORDER BY {order_column} {direction}, id {direction} LIMIT ?", page_params + [limit + 1]
+            ).fetchall()
+            (total,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM analyses{' WHERE ' + ' AND '.join(where) if where else ''}", params
+            ).fetchone()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor((rows[-1][6], rows[-1][0]))
+        results = [
+            (MessageKey(account, mailbox, uidvalidity, uid), json.loads(data))
+            for _, account, mailbox, uidvalidity, uid, data, _ in rows
+        ]
+        return results, next_cursor, total
+
+    def stats(self, trend_days: int = STATS_TREND_DAYS, top_threats: int = STATS_TOP_THREATS) -> Dict[str, Any]:
+        """
+        Statistik über alle gespeicherten Analysen aus den Aggregaten: Anzahl je Risikostufe,
+        Durchschnittsscore, häufigste Bedrohungen und Durchschnittsscore der letzten
+        `trend_days` Tage (nach Datum der Nachricht in UTC, sonst Analysedatum; Tage ohne
+        Analysen mit Score 0).
+        """
+        first_day = datetime.now(timezone.utc).date() - timedelta(days=max(1, trend_days) - 1)
+        with self._lock:
+            levels = {
+                level: (count, score_sum)
+                for level, count, score_sum in self._conn.execute(
+                    "SELECT risk_level, count, score_sum FROM stats_levels"
+                )
+            }
+            threats = self._conn.execute(
+                "SELECT threat, count FROM stats_threats ORDER BY count DESC, threat LIMIT ?", (top_threats,)
+            ).fetchall()
+            days = {
+                day: (count, score_sum)
+                for day, count, score_sum in self._conn.execute(
+                    "SELECT day, count, score_sum FROM stats_days WHERE day >= ?", (first_day.isoformat(),)
+                )
+            }
+        total = sum(count for count, _ in levels.values())
+        score_sum = sum(score for _, score in levels.values())
+        trend = []
+        for offset in range(max(1, trend_days)):
+            day = first_day + timedelta(days=offset)
+            count, day_score = days.get(day.isoformat(), (0, 0))
+            trend.append({"date": day.strftime("%d.%m"), "score": round(day_score / count) if count else 0})
+        return {
+            "total": total,
+            "high_risk": levels.get("hoch", (0, 0))[0],
+            "medium_risk": levels.get("mittel", (0, 0))[0],
+            "low_risk": levels.get("niedrig", (0, 0))[0],
+            "average_score": score_sum / total if total else 0,
+            "top_threats": [{"threat": threat, "count": count} for threat, count in threats],
+            "risk_trend": trend,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Globale Store-Instanz
+mail_store = MailStore(MAIL_STORE_PATH)
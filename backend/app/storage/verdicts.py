@@ -0,0 +1,91 @@
+# verdicts.py
+# Persistenter, inhaltsadressierter Cache für KI-Bewertungen (SQLite)
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+from app.core.config import VERDICT_CACHE_PATH, VERDICT_CACHE_TTL_DAYS, logger
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_context(context: str) -> str:
+    """Normalisiert den KI-Kontext, damit inhaltsgleiche Mails denselben Schlüssel erhalten."""
+    normalized = unicodedata.normalize("NFKC", context or "")
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def verdict_key(context: str) -> str:
+    """SHA-256 über den normalisierten Kontext (Text + Header- und Link-Infos)."""
+    return hashlib.sha256(normalize_context(context).encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Speichert geparste KI-Ergebnisse je Kontext-Hash zusammen mit Modell und Prompt-Version.
+    Einträge eines anderen Modells oder einer anderen Prompt-Version gelten als Fehltreffer.
+    """
+
+    def __init__(self, path: str, ttl_days: int = 30):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, model, prompt_version, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            result, row_model, row_version, created_at = row
+            if row_model != model or row_version != prompt_version or time.time() - created_at > self.ttl_seconds:
+                return None
+            self._conn.execute("UPDATE verdicts SET hits = hits + 1 WHERE key = ?", (key,))
+            self._conn.commit()
+        return json.loads(result)
+
+    def put(self, key: str, result: Dict[str, Any], model: str, prompt_version: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, model, prompt_version, result, created_at, hits)"
+                " VALUES (?, ?, ?, ?, ?, 0)",
+                (key, model, prompt_version, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def purge(self, model: str, prompt_version: str) -> int:
+        """Löscht abgelaufene Einträge und solche anderer Modelle/Prompt-Versionen."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM verdicts WHERE model != ? OR prompt_version != ? OR created_at < ?",
+                (model, prompt_version, time.time() - self.ttl_seconds)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info("%d veraltete KI-Bewertungen aus dem Cache entfernt.", cursor.rowcount)
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Globale Cache-Instanz
+verdict_cache = VerdictCache(VERDICT_CACHE_PATH, ttl_days=VERDICT_CACHE_TTL_DAYS)
@@ -0,0 +1,119 @@
+# sync.py
+# Inkrementeller Postfach-Sync: nur neue Nachrichten holen, einmal analysieren, lokal speichern
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.analysis.pipeline import ResultCallback, analysis_cache, analyze_messages
+from app.audit import log_analysis
+from app.core.config import logger
+from app.imap.executor import run_imap
+from app.imap.fetcher import fetch_changes
+from app.imap.keys import MessageKey
+from app.storage.mailstore import MailStore, mail_store
+
+# Wird nach jedem Sync mit (Konto, Postfach, Ergebnis) aufgerufen, z.B. für SSE-Updates
+SyncCallback = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+
+class SyncEngine:
+    """
+    Gleicht Postfächer mit dem lokalen MailStore ab. Je Postfach läuft höchstens ein Sync
+    gleichzeitig; weitere Aufrufer warten auf dessen Ende und finden dann den aktuellen Stand vor.
+    Der Aufwand pro Sync ist proportional zur Zahl neuer (bzw. gelöschter) Nachrichten.
+    """
+
+    def __init__(self, store: MailStore):
+        self.store = store
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.on_synced: Optional[SyncCallback] = None
+
+    def _lock(self, account: str, mailbox: str) -> asyncio.Lock:
+        if (account, mailbox) not in self._locks:
+            self._locks[(account, mailbox)] = asyncio.Lock()
+        return self._locks[(account, mailbox)]
+
+    async def sync(self, account: str, mailbox: str = 'INBOX', want: int = 0,
+                   on_result: Optional[ResultCallback] = None) -> Dict[str, Any]:
+        """
+        Synchronisiert ein Postfach und stellt sicher, dass (soweit vorhanden) die neuesten
+        `want` Nachrichten analysiert im Store liegen. `on_result` erhält jede neue Analyse,
+        sobald sie fertig ist (vor dem Speichern).
+        Gibt {"uidvalidity", "reset", "new": [(MessageKey, Analyse)], "removed": [MessageKey], "exists"} zurück.
+        """
+        async with self._lock(account, mailbox):
+            state = self.store.get_state(account, mailbox)
+            known = self.store.known_uids(account, mailbox, state["uidvalidity"]) if state else set()
+            changes = await run_imap(fetch_changes, mailbox, state, known, want, account=account)
+            uidvalidity = changes["uidvalidity"]
+
+            if changes["reset"]:
+                if state is not None:
+                    logger.warning("UIDVALIDITY von %s/%s geändert (%s -> %s), Sync beginnt neu.",
+                                   account, mailbox, state["uidvalidity"], uidvalidity)
+                self.store.reset_mailbox(account, mailbox, uidvalidity)
+
+            if changes["removed"]:
+                self.store.delete(changes["removed"])
+                for key in changes["removed"]:
+                    analysis_cache.pop(key)
+                logger.info("%d gelöschte Nachrichten aus %s/%s entfernt.", len(changes["removed"]), account, mailbox)
+
+            new: List[Tuple[MessageKey, Dict[str, Any]]] = []
+            failed: List[int] = []
+            for key, analysis_data in await analyze_messages(changes["messages"], on_result):
+                if analysis_data is None:
+                    failed.append(key.uid)
+                    continue
+                new.append((key, analysis_data))
+                log_analysis(str(key), analysis_data["subject"], analysis_data["from_addr"],
+                             analysis_data["score"], analysis_data["risk_level"])
+            self.store.put_analyses(new)
+
+            last_uid = changes["last_uid"]
+            uidnext = changes["uidnext"]
+            previous_last = 0 if changes["reset"] else state["last_uid"]
+            failed_new = [uid for uid in failed if uid > previous_last]
+            highestmodseq = changes["highestmodseq"]
+            if failed:
+                # Fehlgeschlagene Nachrichten beim nächsten Sync erneut versuchen; ohne
+                # HIGHESTMODSEQ sucht er wieder über die UIDs statt per CHANGEDSINCE
+                last_uid = min(failed_new) - 1 if failed_new else last_uid
+                uidnext = 0
+                highestmodseq = 0
+            self.store.set_state(account, mailbox, uidvalidity, last_uid, uidnext,
+                                 changes["exists"], highestmodseq)
+
+            if new or changes["removed"]:
+                logger.info("Sync %s/%s: %d neu analysiert, %d entfernt.",
+                            account, mailbox, len(new), len(changes["removed"]))
+            result = {
+                "uidvalidity": uidvalidity,
+                "reset": changes["reset"],
+                "new": new,
+                "removed": changes["removed"],
+                "exists": changes["exists"],
+            }
+        if self.on_synced is not None:
+            try:
+                await self.on_synced(account, mailbox, result)
+            except Exception as e:
+                logger.error("Fehler im Sync-Callback für %s/%s: %s", account, mailbox, e)
+        return result
+
+    def latest(self, account: str, mailbox: str, limit: int,
+               uidvalidity: Optional[int] = None) -> List[Tuple[MessageKey, Dict[str, Any]]]:
+        """Die neuesten synchronisierten Analysen eines Postfachs (ohne IMAP-Zugriff)."""
+        if uidvalidity is None:
+            state = self.store.get_state(account, mailbox)
+            if state is None:
+                return []
+            uidvalidity = state["uidvalidity"]
+        return self.store.latest(account, mailbox, uidvalidity, limit)
+
+    def forget(self, key: MessageKey) -> None:
+        """Entfernt eine Nachricht, die die Anwendung selbst ersetzt oder gelöscht hat."""
+        self.store.delete([key])
+        analysis_cache.pop(key)
+
+
+# Globale Sync-Instanz
+sync_engine = SyncEngine(mail_store)
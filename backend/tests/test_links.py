@@ -0,0 +1,74 @@
+# test_links.py
+# Link-Extraktion und -Bewertung
+import time
+
+import pytest
+
+from app.analysis.links import analyze_links, extract_link_targets, extract_links
+from app.analysis.result import MAX_RISKY_LINK_PENALTY, combine_results
+from app.core.config import MAX_LINKS_PER_MESSAGE
+
+NEWSLETTER = """
+<link href="https://fonts.googleapis.com/css?family=Roboto" rel="stylesheet">
+<img src="https://s3.amazonaws.com/bucket/header.png">
+<img src="https://paypal-cdn.example.net/logo.png">
+<a href="https://shop.example.com/angebot">Zum Angebot</a>
+"""
+
+
+def _by_url(links):
+    return {link["url"]: link for link in links}
+
+
+def test_resources_are_separated_from_clickable_links():
+    links, resources = extract_link_targets("", [NEWSLETTER])
+    assert resources == {"https://s3.amazonaws.com/bucket/header.png", "https://paypal-cdn.example.net/logo.png"}
+    assert "https://shop.example.com/angebot" in links
+
+
+def test_lookalike_only_applies_to_clickable_links():
+    html = NEWSLETTER + '<a href="https://paypal-login.net/konto">Konto prüfen</a>'
+    result = _by_url(analyze_links(*extract_link_targets("", [html])))
+    assert result["https://paypal-login.net/konto"]["lookalike"]
+    resource = result["https://paypal-cdn.example.net/logo.png"]
+    assert resource["resource"] and not resource["lookalike"] and resource["risk_score"] == 0
+    assert not any(link["lookalike"] for url, link in result.items() if "paypal-login" not in url)
+
+
+def test_resource_clicked_elsewhere_is_not_a_resource():
+    html = '<img src="https://paypal-login.net/a.png"><a href="https://paypal-login.net/a.png">x</a>'
+    links, resources = extract_link_targets("", [html])
+    assert links == ["https://paypal-login.net/a.png"] and not resources
+
+
+def test_risky_link_penalty_is_capped():
+    result = combine_results({}, [{"risk_score": 80}] * 20, {"score": 0})
+    assert result["link_score"] == -5 - MAX_RISKY_LINK_PENALTY
+
+
+# Rund 5 MB Text, der naive URL-Regexe quadratisch bzw. mit Backtracking laufen lässt
+SIZE = 5 * 1024 * 1024
+ADVERSARIAL_BODIES = {
+    "slashes": "/" * SIZE,
+    "www": "www." * (SIZE // 4),
+    "unclosed_tags": '<a href="https://' * (SIZE // 17),
+    "mixed": ("http://" + "/" * 500 + " www." + "a" * 500 + " <img src='//") * (SIZE // 1520),
+}
+
+
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL_BODIES))
+def test_adversarial_body_is_scanned_in_linear_time(name):
+    body = ADVERSARIAL_BODIES[name]
+    start = time.perf_counter()
+    links, _ = extract_link_targets(body, [body])
+    assert time.perf_counter() - start < 5
+    assert len(links) <= MAX_LINKS_PER_MESSAGE
+
+
+def test_link_count_is_capped_on_large_body():
+    body = " ".join(f"https://host{i}.example.com/pfad" for i in range(SIZE // 36))
+    start = time.perf_counter()
+    links = extract_links(body, [f"<p>{body}</p>"])
+    assert time.perf_counter() - start < 5
+    assert len(links) == MAX_LINKS_PER_MESSAGE
+    assert links[0] == "https://host0.example.com/pfad"
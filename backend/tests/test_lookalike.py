@@ -0,0 +1,57 @@
+# test_lookalike.py
+# Lookalike-Erkennung: echte Imitationen werden erkannt, legitime Marken-Domains nicht
+import pytest
+from app.analysis.lookalike import (
+    BRAND_OWNED_DOMAINS, HIGH_CONFIDENCE_KINDS, KIND_EMBEDDED, KNOWN_BRANDS, LookalikeIndex
+)
+
+index = LookalikeIndex(KNOWN_BRANDS, BRAND_OWNED_DOMAINS)
+
+
+@pytest.mark.parametrize("domain", [
+    "fonts.googleapis.com", "s3.amazonaws.com", "paypalobjects.com", "login.microsoftonline.com",
+    "google.de", "apple.de", "amazon.fr", "pineapple.com", "cdn.dhl.com", "ups.example.com",
+    "paypal.com", "www.paypal.com", "mail.t-online.de", "example.com",
+])
+def test_benign_domains(domain):
+    assert index.classify(domain) == ("", "")
+
+
+@pytest.mark.parametrize("domain", [
+    "paypa1.com", "xn--pypal-4ve.com", "gооgle.de", "micorsoft.com", "amazom.de", "paypall.com",
+])
+def test_high_confidence_lookalikes(domain):
+    kind, reason = index.classify(domain)
+    assert kind in HIGH_CONFIDENCE_KINDS
+    assert reason
+
+
+@pytest.mark.parametrize("domain", [
+    "paypal-login.net", "paypal.com.evil.de", "paypal-secure.evil.de", "dhl-paket.de",
+    "deutschebank-online.de", "ups.com.example.net",
+])
+def test_embedded_brands(domain):
+    assert index.classify(domain)[0] == KIND_EMBEDDED
+
+
+@pytest.mark.parametrize("domain", [
+    # Distanz 1 zu kurzen Markennamen (apple, dhl, ups): eigenständige Domains
+    "apply.com", "ample.com", "appel.com", "dhi.de", "ups1.com",
+    # Distanz 1 nur in der Endung
+    "paypal.co", "microsoft.cm",
+])
+def test_no_typo_for_short_names_or_other_endings(domain):
+    assert index.classify(domain)[0] not in HIGH_CONFIDENCE_KINDS
+
+
+def test_short_names_from_brand_file_get_no_typo_search():
+    # Große Markenlisten enthalten viele kurze Namen, deren Varianten echte Domains sind
+    brands = LookalikeIndex(["adobe.com", "intel.com", "sparkasse.de"])
+    assert brands.classify("abode.com") == ("", "")
+    assert brands.classify("intal.com") == ("", "")
+    assert brands.classify("sparkase.de")[0] in HIGH_CONFIDENCE_KINDS
+
+
+def test_check_keeps_boolean_interface():
+    assert index.check("paypa1.com")[0] is True
+    assert index.check("fonts.googleapis.com") == (False, "")
@@ -0,0 +1,40 @@
+# test_tagging.py
+# Fehlerbehandlung beim Markieren von E-Mails (Betreff, Schlüsselwort, Ordner)
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.imap.keys import UidValidityError
+from app.imap.pool import imap_pools
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _failing_pool(error):
+    def run(*args, **kwargs):
+        raise error
+    return run
+
+
+def test_bulk_connection_error_is_server_error(client, monkeypatch):
+    monkeypatch.setattr(imap_pools, "run", _failing_pool(OSError("Verbindung getrennt")))
+    response = client.post("/modify-subject/bulk", json={"items": [{"uid": "5", "risk": "hoch"}]})
+    assert response.status_code == 500
+
+
+def test_bulk_uidvalidity_mismatch_is_reported_per_uid(client, monkeypatch):
+    monkeypatch.setattr(imap_pools, "run", _failing_pool(UidValidityError("INBOX", 1, 2)))
+    response = client.post("/modify-subject/bulk", json={"uidvalidity": 1, "items": [{"uid": "5", "risk": "hoch"}]})
+    assert response.status_code == 200
+    assert response.json()["modified"] == 0
+    assert response.json()["results"][0]["error"] == "UIDVALIDITY mismatch"
+
+
+def test_single_connection_error_is_server_error(client, monkeypatch):
+    monkeypatch.setattr(imap_pools, "run", _failing_pool(OSError("Verbindung getrennt")))
+    response = client.post("/modify-subject", params={"uid": "5", "risk": "hoch"})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Betreff-Änderung fehlgeschlagen"
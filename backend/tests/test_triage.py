@@ -0,0 +1,59 @@
+# test_triage.py
+# Regelbasierte Vorab-Bewertung
+from app.analysis.domains import domain_intel
+from app.analysis.links import analyze_links, extract_link_targets
+from app.analysis.triage import triage
+
+NEWSLETTER = """
+<link href="https://fonts.googleapis.com/css?family=Roboto" rel="stylesheet">
+<img src="https://s3.amazonaws.com/newsletter/header.png">
+<a href="https://d1234.cloudfront.net/angebot">Zum Angebot</a>
+<a href="https://www.amazon.fr/dp/123">Produkt</a>
+"""
+
+# DMARC fail (30) und gefährlicher Anhang (50): erst ein Link-Lookalike (40) erreicht die Schwelle
+SUSPICIOUS_HEADERS = {"dmarc": "fail", "dangerous_attachments": ["rechnung.exe"]}
+
+
+def _links(html):
+    return analyze_links(*extract_link_targets("", [html]))
+
+
+def test_benign_newsletter_links_do_not_short_circuit():
+    links = _links(NEWSLETTER)
+    assert not any(link["lookalike"] for link in links)
+    assert triage(SUSPICIOUS_HEADERS, links) is None
+
+
+def test_embedded_brand_is_no_triage_signal():
+    links = _links('<a href="https://paypal-login.net/">x</a>')
+    assert links[0]["lookalike"]
+    assert triage(SUSPICIOUS_HEADERS, links) is None
+
+
+def test_homoglyph_link_is_a_triage_signal():
+    links = _links('<a href="https://paypa1.com/login">x</a>')
+    verdict = triage(SUSPICIOUS_HEADERS, links)
+    assert verdict["bewertung"] == "Phishing"
+    assert any("paypa1.com" in reason for reason in verdict["gruende"])
+
+
+def _sender_headers(domain):
+    """Absender-Felder wie in analyze_headers, dazu ein gefährlicher Anhang (50)."""
+    verdict = domain_intel.verdict(domain)
+    return {
+        "from_domain": domain,
+        "from_lookalike": verdict.lookalike or "ok",
+        "from_lookalike_kind": verdict.lookalike_kind,
+        "dangerous_attachments": ["rechnung.exe"],
+    }
+
+
+def test_embedded_brand_sender_is_no_triage_signal():
+    headers = _sender_headers("apple-news.example.org")
+    assert headers["from_lookalike_kind"] == "embedded"
+    assert triage(headers, []) is None
+
+
+def test_homoglyph_sender_is_a_triage_signal():
+    assert triage(_sender_headers("paypa1.com"), [])["bewertung"] == "Phishing"
@@ -1,25 +1,37 @@
 import { useState, useEffect } from 'react'
 import { apiService } from '../services/api'
-import { AnalysisResponse, HealthResponse } from '../types/api'
+import { AnalysisResponse, EmailAnalysis, HealthResponse } from '../types/api'
 
 export function useEmailAnalysis(limit: number = 10) {
   const [data, setData] = useState<AnalysisResponse | null>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
+  const [streaming, setStreaming] = useState(false)
 
+  // Ergebnisse werden angezeigt, sobald sie eintreffen; die Zusammenfassung legt die
+  // endgültige Auswahl und Reihenfolge fest
   const fetchData = async () => {
+    const received = new Map<string, EmailAnalysis>()
+    const show = (uids: string[]) =>
+      setData({ results: uids.map(uid => received.get(uid)).filter((e): e is EmailAnalysis => !!e) })
     try {
       setLoading(true)
+      setStreaming(true)
       setError(null)
-      console.log('Fetching email analysis with limit:', limit)
-      const result = await apiService.getEmailAnalysis(limit)
-      console.log('Received email analysis:', result)
-      setData(result)
+      console.log('Streaming email analysis with limit:', limit)
+      const summary = await apiService.streamEmailAnalysis(limit, email => {
+        received.set(email.uid, email)
+        show(Array.from(received.keys()).sort((a, b) => Number(a) - Number(b)))
+        setLoading(false)
+      })
+      console.log('Email analysis stream finished:', summary)
+      show(summary.uids)
     } catch (err) {
       console.error('Error fetching email analysis:', err)
       setError(err instanceof Error ? err.message : 'Unknown error occurred')
     } finally {
       setLoading(false)
+      setStreaming(false)
     }
   }
 
@@ -32,7 +44,7 @@ export function useEmailAnalysis(limit: number = 10) {
     fetchData()
   }
 
-  return { data, loading, error, refetch }
+  return { data, loading, error, refetch, streaming }
 }
 
 export function useHealthCheck() {
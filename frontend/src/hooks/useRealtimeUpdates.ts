@@ -7,6 +7,9 @@ export interface EmailUpdate {
   email_count: number
   latest_email: {
     uid: string
+    account: string
+    mailbox: string
+    uidvalidity: number
     subject: string
     from_addr: string
     score: number
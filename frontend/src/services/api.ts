@@ -1,5 +1,10 @@
 import { 
   AnalysisResponse, 
+  AnalysisStreamRecord,
+  AnalysisStreamSummary,
+  EmailAnalysis,
+  EmailListResponse,
+  EmailQuery,
   ModifySubjectResponse, 
   HealthResponse 
 } from '../types/api'
@@ -40,9 +45,55 @@ class ApiService {
     return this.request<AnalysisResponse>(`/analyze?limit=${limit}&t=${timestamp}`)
   }
 
+  // Stream email analysis (NDJSON): each result as soon as it is ready, then a summary
+  async streamEmailAnalysis(
+    limit: number,
+    onResult: (email: EmailAnalysis) => void
+  ): Promise<AnalysisStreamSummary> {
+    const response = await fetch(`${API_BASE}/analyze/stream?limit=${limit}&t=${new Date().getTime()}`, {
+      headers: { 'Cache-Control': 'no-cache' }
+    })
+    if (!response.ok || !response.body) {
+      throw new Error(`API request failed: ${response.status} ${response.statusText}`)
+    }
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    while (true) {
+      const { done, value } = await reader.read()
+      buffer += decoder.decode(value, { stream: !done })
+      const lines = buffer.split('\n')
+      buffer = done ? '' : lines.pop() || ''
+      for (const line of lines) {
+        if (!line.trim()) continue
+        const record = JSON.parse(line) as AnalysisStreamRecord
+        if (record.type === 'summary') return record
+        onResult(record.data)
+      }
+      if (done) break
+    }
+    throw new Error('Analysis stream ended without summary')
+  }
+
+  // Search analyzed emails server-side (filter, sort, cursor pagination)
+  async searchEmails(query: EmailQuery): Promise<EmailListResponse> {
+    const params = new URLSearchParams()
+    Object.entries(query).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') params.set(key, String(value))
+    })
+    return this.request<EmailListResponse>(`/emails?${params}`)
+  }
+
   // Modify email subject
-  async modifySubject(uid: string, risk: 'hoch' | 'mittel' | 'niedrig'): Promise<ModifySubjectResponse> {
-    return this.request<ModifySubjectResponse>(`/modify-subject?uid=${uid}&risk=${risk}`, {
+  async modifySubject(
+    uid: string,
+    risk: 'hoch' | 'mittel' | 'niedrig',
+    mailbox: string = 'INBOX',
+    uidvalidity?: number
+  ): Promise<ModifySubjectResponse> {
+    const params = new URLSearchParams({ uid, risk, mailbox })
+    if (uidvalidity) params.set('uidvalidity', String(uidvalidity))
+    return this.request<ModifySubjectResponse>(`/modify-subject?${params}`, {
       method: 'POST',
     })
   }
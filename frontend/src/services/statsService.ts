@@ -1,5 +1,3 @@
-import { EmailAnalysis } from '../types/api';
-
 export interface EmailStats {
   total: number;
   highRisk: number;
@@ -21,8 +19,17 @@ class StatsService {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       
+      // Der Server liefert die Werte aus persistierten Aggregaten über alle Analysen
       const data = await response.json();
-      return data;
+      return {
+        total: data.total,
+        highRisk: data.high_risk,
+        mediumRisk: data.medium_risk,
+        lowRisk: data.low_risk,
+        averageScore: data.average_score,
+        topThreats: data.top_threats,
+        riskTrend: data.risk_trend
+      };
     } catch (error) {
       console.error('Error fetching email stats:', error);
       // Return mock data for development
@@ -30,135 +37,6 @@ class StatsService {
     }
   }
 
-  async getStatsFromEmails(emails: EmailAnalysis[]): Promise<EmailStats> {
-    if (emails.length === 0) {
-      return {
-        total: 0,
-        highRisk: 0,
-        mediumRisk: 0,
-        lowRisk: 0,
-        averageScore: 0,
-        topThreats: [],
-        riskTrend: []
-      };
-    }
-
-    // Calculate risk distribution based on FINAL scores only
-    const highRisk = emails.filter(email => 
-      email.final.risikostufe === 'hoch'
-    ).length;
-    
-    const mediumRisk = emails.filter(email => 
-      email.final.risikostufe === 'mittel'
-    ).length;
-    
-    const lowRisk = emails.filter(email => 
-      email.final.risikostufe === 'niedrig'
-    ).length;
-
-    // Calculate average score
-    const totalScore = emails.reduce((sum, email) => sum + email.final.score, 0);
-    const averageScore = totalScore / emails.length;
-
-    // Extract top threats from AI analysis
-    const threatCounts: { [key: string]: number } = {};
-    emails.forEach(email => {
-      email.analysis.gruende.forEach((grund: string) => {
-        // Extract threat type from reason
-        const threat = this.extractThreatType(grund);
-        if (threat) {
-          threatCounts[threat] = (threatCounts[threat] || 0) + 1;
-        }
-      });
-    });
-
-    const topThreats = Object.entries(threatCounts)
-      .map(([threat, count]) => ({ threat, count }))
-      .sort((a, b) => b.count - a.count)
-      .slice(0, 10);
-
-    // Generate mock trend data (7 days)
-    const riskTrend = this.generateTrendData(emails);
-
-    return {
-      total: emails.length,
-      highRisk,
-      mediumRisk,
-      lowRisk,
-      averageScore,
-      topThreats,
-      riskTrend
-    };
-  }
-
-  private extractThreatType(grund: string): string {
-    const threatPatterns = [
-      { pattern: /phishing/i, name: 'Phishing' },
-      { pattern: /spam/i, name: 'Spam' },
-      { pattern: /malware/i, name: 'Malware' },
-      { pattern: /ransomware/i, name: 'Ransomware' },
-      { pattern: /betrug/i, name: 'Betrug' },
-      { pattern: /datenklau/i, name: 'Datenklau' },
-      { pattern: /social engineering/i, name: 'Social Engineering' },
-      { pattern: /lookalike/i, name: 'Lookalike Domain' },
-      { pattern: /spf/i, name: 'SPF Fehler' },
-      { pattern: /dkim/i, name: 'DKIM Fehler' },
-      { pattern: /dmarc/i, name: 'DMARC Fehler' },
-      { pattern: /anhang/i, name: 'Gefährlicher Anhang' },
-      { pattern: /link/i, name: 'Gefährlicher Link' },
-      { pattern: /geld/i, name: 'Geldanfrage' },
-      { pattern: /druck/i, name: 'Druckausübung' }
-    ];
-
-    for (const { pattern, name } of threatPatterns) {
-      if (pattern.test(grund)) {
-        return name;
-      }
-    }
-
-    return 'Sonstige Bedrohung';
-  }
-
-  private generateTrendData(emails: EmailAnalysis[]): Array<{ date: string; score: number }> {
-    const trend = [];
-    const today = new Date();
-    
-    // If we have emails, show actual data
-    if (emails.length > 0) {
-      // For now, show the same average score for all days since we don't have daily data
-      const averageScore = emails.reduce((sum, email) => sum + email.final.score, 0) / emails.length;
-      
-      for (let i = 6; i >= 0; i--) {
-        const date = new Date(today);
-        date.setDate(date.getDate() - i);
-        
-        trend.push({
-          date: date.toLocaleDateString('de-DE', { 
-            day: '2-digit', 
-            month: '2-digit' 
-          }),
-          score: Math.round(averageScore)
-        });
-      }
-    } else {
-      // If no emails, show empty trend
-      for (let i = 6; i >= 0; i--) {
-        const date = new Date(today);
-        date.setDate(date.getDate() - i);
-        
-        trend.push({
-          date: date.toLocaleDateString('de-DE', { 
-            day: '2-digit', 
-            month: '2-digit' 
-          }),
-          score: 0
-        });
-      }
-    }
-    
-    return trend;
-  }
-
   private getMockStats(): EmailStats {
     return {
       total: 42,
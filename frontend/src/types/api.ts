@@ -6,6 +6,8 @@ export interface HeaderAnalysis {
   dmarc: string
   from_domain: string
   from_lookalike: string
+  from_lookalike_kind?: string
+  from_domain_listed?: string
   reply_to: string
   return_path: string
   reply_path_warning: string
@@ -25,6 +27,10 @@ export interface LinkAnalysis {
   url: string
   domain: string
   is_punycode: boolean
+  lookalike?: string
+  lookalike_kind?: string
+  resource?: boolean
+  listed?: string
   risk_score: number
 }
 
@@ -33,6 +39,7 @@ export interface AIAnalysis {
   risikostufe: string
   score: number
   gruende: string[]
+  quelle?: 'ki' | 'triage'
 }
 
 export interface FinalScore {
@@ -45,8 +52,12 @@ export interface FinalScore {
 
 export interface EmailAnalysis {
   uid: string
+  account: string
+  mailbox: string
+  uidvalidity: number
   subject: string
   from_addr: string
+  date?: string | null
   headers: HeaderAnalysis
   links: LinkAnalysis[]
   analysis: AIAnalysis
@@ -57,9 +68,49 @@ export interface AnalysisResponse {
   results: EmailAnalysis[]
 }
 
+// Abschlussdatensatz von /analyze/stream
+export interface AnalysisStreamSummary {
+  type: 'summary'
+  uids: string[]
+  uidvalidity?: number | null
+  reset: boolean
+  stored: number
+  analyzed: number
+  failed: string[]
+  removed: string[]
+  error?: string | null
+  duration_ms: number
+}
+
+export type AnalysisStreamRecord =
+  | { type: 'result'; data: EmailAnalysis }
+  | AnalysisStreamSummary
+
+export interface EmailQuery {
+  q?: string
+  risk?: 'hoch' | 'mittel' | 'niedrig'
+  since?: string
+  until?: string
+  has_attachments?: boolean
+  has_links?: boolean
+  min_score?: number
+  sort?: 'date' | 'score' | 'subject' | 'sender'
+  order?: 'asc' | 'desc'
+  limit?: number
+  cursor?: string
+}
+
+export interface EmailListResponse {
+  results: EmailAnalysis[]
+  next_cursor?: string | null
+  total: number
+}
+
 export interface ModifySubjectResponse {
   success: boolean
   new_subject?: string
+  new_uid?: string
+  tag?: string
   error?: string
 }
 
@@ -67,4 +118,5 @@ export interface HealthResponse {
   status: string
   version: string
   services: Record<string, string>
+  analysis_cache?: Record<string, number>
 } 
\ No newline at end of file
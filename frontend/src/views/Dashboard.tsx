@@ -1,7 +1,8 @@
-import React, { useEffect, useState, useMemo, useRef, useCallback } from 'react'
+import React, { useEffect, useState, useRef, useCallback } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { useEmailAnalysis } from '../hooks/useApi'
-import { EmailAnalysis } from '../types/api'
+import { EmailAnalysis, EmailQuery } from '../types/api'
+import { apiService } from '../services/api'
 import EmailSearch, { SearchFilters } from '../components/EmailSearch'
 import RealtimeStatus from '../components/RealtimeStatus'
 import DashboardStats from '../components/DashboardStats'
@@ -10,9 +11,12 @@ import { useRealtimeUpdates } from '../hooks/useRealtimeUpdates'
 import { statsService, EmailStats } from '../services/statsService'
 import './Dashboard.css'
 
+// Einträge je Seite der E-Mail-Liste
+const PAGE_SIZE = 50
+
 const Dashboard: React.FC = () => {
   const navigate = useNavigate()
-  const { data, loading, error, refetch } = useEmailAnalysis(10)
+  const { data, loading, error, refetch, streaming } = useEmailAnalysis(10)
   const { lastUpdate } = useRealtimeUpdates()
   const lastUpdateRef = useRef<string | null>(null)
   const [shouldRefresh, setShouldRefresh] = useState(false)
@@ -28,6 +32,10 @@ const Dashboard: React.FC = () => {
   const [stats, setStats] = useState<EmailStats | null>(null)
   const [statsLoading, setStatsLoading] = useState(true)
   const [healthData, setHealthData] = useState<any>(null)
+  const [filteredEmails, setFilteredEmails] = useState<EmailAnalysis[]>([])
+  const [filteredTotal, setFilteredTotal] = useState(0)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [searchLoading, setSearchLoading] = useState(false)
 
 
 
@@ -75,84 +83,68 @@ const Dashboard: React.FC = () => {
     return text.substring(0, maxLength) + '...';
   }
 
-  // Filter emails based on search filters
-  const filteredEmails = useMemo(() => {
-    if (!data?.results) return []
-    
-    let filtered = data.results.filter((email: EmailAnalysis) => {
-      // Search query filter
-      if (searchFilters.query) {
-        const queryLower = searchFilters.query.toLowerCase()
-        const subjectMatch = email.subject.toLowerCase().includes(queryLower)
-        const senderMatch = email.from_addr.toLowerCase().includes(queryLower)
-        if (!subjectMatch && !senderMatch) {
-          return false
+  // Suchparameter für /emails aus den Filtern der Oberfläche
+  const buildQuery = useCallback((filters: SearchFilters): EmailQuery => {
+    const riskMap = { high: 'hoch', medium: 'mittel', low: 'niedrig' } as const
+    const rangeDays = { today: 0, week: 7, month: 30 } as const
+    let since: string | undefined
+    if (filters.dateRange !== 'all') {
+      const start = new Date()
+      start.setHours(0, 0, 0, 0)
+      start.setDate(start.getDate() - rangeDays[filters.dateRange])
+      since = start.toISOString()
+    }
+    return {
+      q: filters.query.trim() || undefined,
+      risk: filters.riskLevel === 'all' ? undefined : riskMap[filters.riskLevel],
+      since,
+      has_attachments: filters.hasAttachments || undefined,
+      has_links: filters.hasLinks || undefined,
+      sort: filters.sortBy,
+      order: filters.sortOrder,
+      limit: PAGE_SIZE
+    }
+  }, [])
+
+  // Gefilterte Liste serverseitig laden (neu bei Filteränderung und nach jeder Analyse-Runde)
+  useEffect(() => {
+    if (streaming) return
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      setSearchLoading(true)
+      try {
+        const page = await apiService.searchEmails(buildQuery(searchFilters))
+        if (!cancelled) {
+          setFilteredEmails(page.results)
+          setNextCursor(page.next_cursor || null)
+          setFilteredTotal(page.total)
         }
+      } catch (error) {
+        console.error('Error searching emails:', error)
+      } finally {
+        if (!cancelled) setSearchLoading(false)
       }
-      
-      // Risk level filter
-      if (searchFilters.riskLevel !== 'all') {
-        const emailRisk = email.final.risikostufe.toLowerCase()
-        if (searchFilters.riskLevel === 'high' && emailRisk !== 'hoch') return false
-        if (searchFilters.riskLevel === 'medium' && emailRisk !== 'mittel') return false
-        if (searchFilters.riskLevel === 'low' && emailRisk !== 'niedrig') return false
-      }
-      
-      // Date range filter - simplified for now
-      if (searchFilters.dateRange !== 'all') {
-        // Skip date filtering for now as date field is not available
-        return true
-      }
-      
-      // Has attachments filter
-      if (searchFilters.hasAttachments && (!email.headers.attachments || email.headers.attachments.length === 0)) {
-        return false
-      }
-      
-      // Has links filter - simplified for now
-      if (searchFilters.hasLinks) {
-        // Skip this filter for now as content is not available
-        return true
-      }
-      
-      return true
-    })
-    
-    // Sort emails
-    filtered.sort((a, b) => {
-      let aValue: any, bValue: any
-      
-      switch (searchFilters.sortBy) {
-        case 'date':
-          // Use a fallback for date sorting
-          aValue = a.uid
-          bValue = b.uid
-          break
-        case 'score':
-          aValue = a.final.score
-          bValue = b.final.score
-          break
-        case 'subject':
-          aValue = a.subject.toLowerCase()
-          bValue = b.subject.toLowerCase()
-          break
-        case 'sender':
-          aValue = a.from_addr.toLowerCase()
-          bValue = b.from_addr.toLowerCase()
-          break
-        default:
-          return 0
-      }
-      
-      if (searchFilters.sortOrder === 'asc') {
-        return aValue > bValue ? 1 : -1
-      } else {
-        return aValue < bValue ? 1 : -1
-      }
-    })
-    
-    return filtered
-  }, [data?.results, searchFilters])
+    }, searchFilters.query ? 300 : 0)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [searchFilters, data?.results, streaming, buildQuery])
+
+  // Nächste Seite anhängen
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setSearchLoading(true)
+    try {
+      const page = await apiService.searchEmails({ ...buildQuery(searchFilters), cursor: nextCursor })
+      setFilteredEmails(prev => [...prev, ...page.results])
+      setNextCursor(page.next_cursor || null)
+    } catch (error) {
+      console.error('Error loading more emails:', error)
+    } finally {
+      setSearchLoading(false)
+    }
+  }
 
   // Markiere Refresh wenn neue E-Mail empfangen wird
   useEffect(() => {
@@ -180,10 +172,10 @@ const Dashboard: React.FC = () => {
   // Load statistics when emails change
   useEffect(() => {
     const loadStats = async () => {
-      if (data?.results) {
+      if (data?.results && !streaming) {
         setStatsLoading(true)
         try {
-          const emailStats = await statsService.getStatsFromEmails(data.results)
+          const emailStats = await statsService.getEmailStats()
           setStats(emailStats)
         } catch (error) {
           console.error('Error loading stats:', error)
@@ -194,7 +186,7 @@ const Dashboard: React.FC = () => {
     }
 
     loadStats()
-  }, [data?.results])
+  }, [data?.results, streaming])
 
   // Load health data
   useEffect(() => {
@@ -259,8 +251,8 @@ const Dashboard: React.FC = () => {
       
       <EmailSearch 
         onFiltersChange={setSearchFilters}
-        totalEmails={data?.results?.length || 0}
-        filteredCount={filteredEmails.length}
+        totalEmails={stats?.total ?? data?.results?.length ?? 0}
+        filteredCount={filteredTotal}
       />
       
       <div className="email-list">
@@ -315,6 +307,11 @@ const Dashboard: React.FC = () => {
             </div>
           ))
         )}
+        {nextCursor && (
+          <button className="load-more" onClick={loadMore} disabled={searchLoading}>
+            {searchLoading ? 'Lädt...' : 'Mehr laden'}
+          </button>
+        )}
       </div>
     </div>
   )
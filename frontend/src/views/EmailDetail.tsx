@@ -157,6 +157,7 @@ const EmailDetail: React.FC = () => {
           <div className="ai-content">
             <div className="ai-bewertung">
               <h3>Bewertung: {email.analysis.bewertung}</h3>
+              {email.analysis.quelle === 'triage' && <p>Regelbasierte Bewertung (ohne KI-Aufruf)</p>}
             </div>
             <div className="ai-gruende">
               <h3>Gründe für die Bewertung:</h3>
@@ -229,6 +230,8 @@ const EmailDetail: React.FC = () => {
                   <div className="link-details">
                     <span>Domain: {link.domain}</span>
                     <span>Punycode: {link.is_punycode ? '⚠️ Ja' : '✅ Nein'}</span>
+                    {link.lookalike && <span>⚠️ {link.lookalike}</span>}
+                    {link.listed === 'blocklist' && <span>⛔ Blocklist</span>}
                     <span>Risk Score: {link.risk_score}/100</span>
                   </div>
                 </div>